@@ -0,0 +1,201 @@
+"""Bloom filters and the "ever seen" listing index built on them."""
+
+from __future__ import annotations
+
+import hashlib
+import math
+from array import array
+from typing import Iterable, Sequence
+
+from app.metrics import seen_index_bytes, seen_index_lookups_total
+from app.state import StateStore
+
+# Listings the first layer of a filter is sized for; later layers double it,
+# so a filter never needs to know how many items it will hold up front.
+DEFAULT_CAPACITY = 100_000
+# Smallest first layer of a search's seen index (about 1.2 KB). Larger
+# histories get a first layer twice their stored size when the index loads.
+MIN_SEEN_CAPACITY = 1_000
+# False positive rate of the first layer. Each further layer halves it, which
+# keeps the rate of the whole filter below twice this.
+DEFAULT_ERROR_RATE = 0.01
+
+
+def _hash(item: int) -> tuple[int, int]:
+    """Return the two 64-bit hashes bit positions are derived from."""
+
+    digest = hashlib.blake2b(
+        item.to_bytes(8, "little", signed=True), digest_size=16
+    ).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(
+        digest[8:], "little"
+    ) | 1
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over integer ids.
+
+    Sized for ``capacity`` items at a false positive rate of ``error_rate``;
+    adding more items than that raises the rate. Items are hashed once with
+    BLAKE2b and the bit positions derived by double hashing.
+    """
+
+    __slots__ = ("bits", "capacity", "count", "error_rate", "hashes", "size")
+
+    def __init__(self, capacity: int, error_rate: float) -> None:
+        if capacity < 1:
+            raise ValueError(f"capacity must be positive: {capacity}")
+        if not 0 < error_rate < 1:
+            raise ValueError(f"error_rate must be between 0 and 1: {error_rate}")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def add(self, item: int) -> bool:
+        """Add ``item``; returns whether it was (probably) new."""
+
+        return self._add(*_hash(item))
+
+    def __contains__(self, item: int) -> bool:
+        return self._contains(*_hash(item))
+
+    def _add(self, first: int, step: int) -> bool:
+        bits, size = self.bits, self.size
+        new = False
+        for i in range(self.hashes):
+            position = (first + i * step) % size
+            mask = 1 << (position & 7)
+            if not bits[position >> 3] & mask:
+                bits[position >> 3] |= mask
+                new = True
+        self.count += new
+        return new
+
+    def _contains(self, first: int, step: int) -> bool:
+        bits, size = self.bits, self.size
+        for i in range(self.hashes):
+            position = (first + i * step) % size
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.bits)
+
+
+class ScalableBloomFilter:
+    """Bloom filter that adds a larger, stricter layer whenever one fills up.
+
+    Layer ``n`` holds ``capacity * 2**n`` items at ``error_rate / 2**n``, so
+    memory grows with the number of items while the overall false positive
+    rate stays below ``2 * error_rate``.
+    """
+
+    def __init__(
+        self,
+        capacity: int = DEFAULT_CAPACITY,
+        error_rate: float = DEFAULT_ERROR_RATE,
+    ) -> None:
+        self.layers = [BloomFilter(capacity, error_rate)]
+
+    def add(self, item: int) -> bool:
+        """Add ``item``; returns whether it was (probably) new."""
+
+        hashed = _hash(item)
+        if self._contains(hashed):
+            return False
+        layer = self.layers[-1]
+        if layer.count >= layer.capacity:
+            layer = BloomFilter(layer.capacity * 2, layer.error_rate / 2)
+            self.layers.append(layer)
+        return layer._add(*hashed)
+
+    def __contains__(self, item: int) -> bool:
+        return self._contains(_hash(item))
+
+    def _contains(self, hashed: tuple[int, int]) -> bool:
+        # The newest layer is the largest, so it is the likeliest to match.
+        return any(layer._contains(*hashed) for layer in reversed(self.layers))
+
+    def __len__(self) -> int:
+        return sum(layer.count for layer in self.layers)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(layer.nbytes for layer in self.layers)
+
+
+class SeenListingIndex:
+    """Every listing id a search has ever recorded, for spotting re-listings.
+
+    The ids themselves are kept in the state store (``seen_listings``), which
+    retention never prunes. A :class:`ScalableBloomFilter` built from them on
+    first use answers most lookups from memory: ids it has never seen are new
+    for certain, and only its positive answers are confirmed in the store.
+
+    The filter itself is not persisted: it is rebuilt from every stored id
+    the first time it is used after a start, which takes time and, while it
+    loads, 8 bytes per id in proportion to the search's whole history. It is
+    sized from the number of stored ids, at least ``capacity``, so small
+    searches keep small filters, and gains layers as the search grows.
+    """
+
+    def __init__(
+        self,
+        state_store: StateStore,
+        *,
+        capacity: int = MIN_SEEN_CAPACITY,
+        error_rate: float = DEFAULT_ERROR_RATE,
+    ) -> None:
+        self.state_store = state_store
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filter: ScalableBloomFilter | None = None
+
+    def _load(self) -> ScalableBloomFilter:
+        if self._filter is None:
+            # Sizing the first layer for twice the stored ids keeps a rebuilt
+            # filter to a single layer, which halves the cost of each lookup.
+            stored = array("q", self.state_store.iterate_seen_listing_ids())
+            bloom = ScalableBloomFilter(
+                max(self.capacity, 2 * len(stored)), self.error_rate
+            )
+            for number in stored:
+                bloom.add(number)
+            self._filter = bloom
+            seen_index_bytes.inc(bloom.nbytes)
+        return self._filter
+
+    def unseen(self, listing_ids: Sequence[int]) -> list[int]:
+        """Return the ids in ``listing_ids`` this search has never recorded."""
+
+        bloom = self._load()
+        candidates = [number for number in listing_ids if number in bloom]
+        seen_index_lookups_total.labels(result="new").inc(
+            len(listing_ids) - len(candidates)
+        )
+        if not candidates:
+            return list(listing_ids)
+        seen = self.state_store.get_seen_listing_ids(candidates)
+        seen_index_lookups_total.labels(result="seen").inc(len(seen))
+        seen_index_lookups_total.labels(result="false_positive").inc(
+            len(candidates) - len(seen)
+        )
+        return [number for number in listing_ids if number not in seen]
+
+    def add(self, listing_ids: Iterable[int]) -> None:
+        """Record ``listing_ids`` as seen."""
+
+        values = list(listing_ids)
+        if not values:
+            return
+        bloom = self._load()
+        size = bloom.nbytes
+        for number in values:
+            bloom.add(number)
+        seen_index_bytes.inc(bloom.nbytes - size)
+        self.state_store.add_seen_listing_ids(values)
@@ -11,11 +11,39 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 DEFAULT_PAYLOAD_FILE = "data/payload.json"
 DEFAULT_POLL_INTERVAL = 60
 MIN_POLL_INTERVAL = 10
+DEFAULT_LISTING_CONCURRENCY = 4
+DEFAULT_SCHEDULER_WORKERS = 4
+CRAWL_MODES = ("full", "delta")
+STATE_BACKENDS = ("duckdb", "sqlite", "memory")
 DEFAULT_STATE_FILE = "data/state.duckdb"
+DEFAULT_SQLITE_STATE_FILE = "data/state.sqlite3"
+STATE_DURABILITY_MODES = ("always", "notify", "interval")
+DEFAULT_STATE_FLUSH_INTERVAL = 30.0
+MIN_STATE_FLUSH_INTERVAL = 1.0
+DEFAULT_HISTORY_RETENTION_DAYS = 90
+NOTIFICATION_METHODS = ("ntfy", "telegram", "webhook")
+DEFAULT_NOTIFICATION_TIMEOUT = 10.0
+MIN_NOTIFICATION_TIMEOUT = 1.0
+DEFAULT_NOTIFICATION_RETRIES = 3
+DEFAULT_NOTIFICATION_WORKERS = 2
+DEFAULT_NOTIFICATION_QUEUE_SIZE = 100
+DEFAULT_DIGEST_MAX_LISTINGS = 50
+DEFAULT_MAINTENANCE_INTERVAL = 6 * 60 * 60.0
+MIN_MAINTENANCE_INTERVAL = 60.0
 
 logger = logging.getLogger(__name__)
 
 
+def split_setting(value: str | None) -> list[str]:
+    """Split a comma-separated setting into its items, dropping blanks and repeats."""
+
+    if not value:
+        return []
+    return list(
+        dict.fromkeys(item.strip() for item in value.split(",") if item.strip())
+    )
+
+
 def _coerce_path_value(value: Path | str | None, default: str) -> Path:
     if value is None:
         return Path(default)
@@ -68,11 +96,53 @@ class MonitorSettings(BaseSettings):
         case_sensitive=False,
     )
 
-    # Notification method: 'ntfy' or 'telegram'
+    # Notification methods: any of 'ntfy', 'telegram' and 'webhook', comma-separated
     notification_method: str = Field(
         default="ntfy",
         validation_alias=AliasChoices("P24_NOTIFICATION_METHOD"),
     )
+    notification_timeout: float = Field(
+        default=DEFAULT_NOTIFICATION_TIMEOUT,
+        validation_alias=AliasChoices("P24_NOTIFICATION_TIMEOUT"),
+    )
+    notification_retries: int = Field(
+        default=DEFAULT_NOTIFICATION_RETRIES,
+        validation_alias=AliasChoices("P24_NOTIFICATION_RETRIES"),
+    )
+    notification_workers: int = Field(
+        default=DEFAULT_NOTIFICATION_WORKERS,
+        validation_alias=AliasChoices("P24_NOTIFICATION_WORKERS"),
+    )
+    notification_queue_size: int = Field(
+        default=DEFAULT_NOTIFICATION_QUEUE_SIZE,
+        validation_alias=AliasChoices("P24_NOTIFICATION_QUEUE_SIZE"),
+    )
+    notification_outbox: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("P24_NOTIFICATION_OUTBOX"),
+    )
+    # Seconds new listings are collected into one digest; 0 notifies every poll
+    notification_digest_window: float = Field(
+        default=0.0,
+        validation_alias=AliasChoices("P24_NOTIFICATION_DIGEST_WINDOW"),
+    )
+    notification_digest_max_listings: int = Field(
+        default=DEFAULT_DIGEST_MAX_LISTINGS,
+        validation_alias=AliasChoices("P24_NOTIFICATION_DIGEST_MAX_LISTINGS"),
+    )
+    # Per-method send timeouts; unset ones use notification_timeout
+    ntfy_timeout: float | None = Field(
+        default=None,
+        validation_alias=AliasChoices("P24_NTFY_TIMEOUT"),
+    )
+    telegram_timeout: float | None = Field(
+        default=None,
+        validation_alias=AliasChoices("P24_TELEGRAM_TIMEOUT"),
+    )
+    webhook_timeout: float | None = Field(
+        default=None,
+        validation_alias=AliasChoices("P24_WEBHOOK_TIMEOUT"),
+    )
 
     # Ntfy settings
     ntfy_server: str = Field(
@@ -94,6 +164,12 @@ class MonitorSettings(BaseSettings):
         validation_alias=AliasChoices("TELEGRAM_CHAT_ID"),
     )
 
+    # Webhook settings (optional)
+    webhook_url: str | None = Field(
+        default=None,
+        validation_alias=AliasChoices("P24_WEBHOOK_URL"),
+    )
+
     payload_file: Path = Field(
         default=Path(DEFAULT_PAYLOAD_FILE),
         validation_alias=AliasChoices("P24_PAYLOAD_FILE"),
@@ -102,6 +178,14 @@ class MonitorSettings(BaseSettings):
         default=DEFAULT_POLL_INTERVAL,
         validation_alias=AliasChoices("P24_POLL_INTERVAL"),
     )
+    searches: str | None = Field(
+        default=None,
+        validation_alias=AliasChoices("P24_SEARCHES"),
+    )
+    scheduler_workers: int = Field(
+        default=DEFAULT_SCHEDULER_WORKERS,
+        validation_alias=AliasChoices("P24_SCHEDULER_WORKERS"),
+    )
     location_name: str = Field(
         default="Stellenbosch",
         validation_alias=AliasChoices("P24_LOCATION_NAME"),
@@ -110,14 +194,79 @@ class MonitorSettings(BaseSettings):
         default=False,
         validation_alias=AliasChoices("P24_RUN_ONCE"),
     )
+    crawl_mode: str = Field(
+        default="full",
+        validation_alias=AliasChoices("P24_CRAWL_MODE"),
+    )
+    delta_margin_pages: int = Field(
+        default=1,
+        validation_alias=AliasChoices("P24_DELTA_MARGIN_PAGES"),
+    )
+    adaptive_verification: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("P24_ADAPTIVE_VERIFICATION"),
+    )
+    notify_relisted: bool = Field(
+        default=False,
+        validation_alias=AliasChoices("P24_NOTIFY_RELISTED"),
+    )
     log_level: str = Field(
         default="INFO",
         validation_alias=AliasChoices("P24_LOG_LEVEL"),
     )
+    state_backend: str = Field(
+        default="duckdb",
+        validation_alias=AliasChoices("P24_STATE_BACKEND"),
+    )
     state_file: Path = Field(
         default=Path(DEFAULT_STATE_FILE),
         validation_alias=AliasChoices("P24_STATE_FILE"),
     )
+    # When buffered state is flushed: notify, interval or always. Only each
+    # search's latest snapshot is flushed, so listing_history skips the polls
+    # in between; use always to record every poll
+    state_durability: str = Field(
+        default="notify",
+        validation_alias=AliasChoices("P24_STATE_DURABILITY"),
+    )
+    state_flush_interval: float = Field(
+        default=DEFAULT_STATE_FLUSH_INTERVAL,
+        validation_alias=AliasChoices("P24_STATE_FLUSH_INTERVAL"),
+    )
+    history_retention_days: int = Field(
+        default=DEFAULT_HISTORY_RETENTION_DAYS,
+        validation_alias=AliasChoices("P24_HISTORY_RETENTION_DAYS"),
+    )
+    maintenance_interval: float = Field(
+        default=DEFAULT_MAINTENANCE_INTERVAL,
+        validation_alias=AliasChoices("P24_MAINTENANCE_INTERVAL"),
+    )
+    listing_concurrency: int = Field(
+        default=DEFAULT_LISTING_CONCURRENCY,
+        validation_alias=AliasChoices("P24_LISTING_CONCURRENCY"),
+    )
+
+    # Shared HTTP client settings
+    http_pool_connections: int = Field(
+        default=10,
+        validation_alias=AliasChoices("P24_HTTP_POOL_CONNECTIONS"),
+    )
+    http_pool_maxsize: int = Field(
+        default=10,
+        validation_alias=AliasChoices("P24_HTTP_POOL_MAXSIZE"),
+    )
+    http_timeout: float = Field(
+        default=15.0,
+        validation_alias=AliasChoices("P24_HTTP_TIMEOUT"),
+    )
+    http_cache_enabled: bool = Field(
+        default=True,
+        validation_alias=AliasChoices("P24_HTTP_CACHE_ENABLED"),
+    )
+    http_cache_max_mb: int = Field(
+        default=64,
+        validation_alias=AliasChoices("P24_HTTP_CACHE_MAX_MB"),
+    )
 
     # Metrics server settings
     metrics_enabled: bool = Field(
@@ -146,6 +295,198 @@ class MonitorSettings(BaseSettings):
             return MIN_POLL_INTERVAL
         return value
 
+    @field_validator("notification_timeout", mode="after")
+    @classmethod
+    def _enforce_notification_timeout(cls, value: float) -> float:
+        if value < MIN_NOTIFICATION_TIMEOUT:
+            logger.warning(
+                "P24_NOTIFICATION_TIMEOUT=%s is too low. Using %s seconds instead.",
+                value,
+                MIN_NOTIFICATION_TIMEOUT,
+            )
+            return MIN_NOTIFICATION_TIMEOUT
+        return value
+
+    @field_validator("ntfy_timeout", mode="after")
+    @classmethod
+    def _enforce_ntfy_timeout(cls, value: float | None) -> float | None:
+        if value is not None and value < MIN_NOTIFICATION_TIMEOUT:
+            logger.warning(
+                "P24_NTFY_TIMEOUT=%s is too low. Using %s seconds instead.",
+                value,
+                MIN_NOTIFICATION_TIMEOUT,
+            )
+            return MIN_NOTIFICATION_TIMEOUT
+        return value
+
+    @field_validator("telegram_timeout", mode="after")
+    @classmethod
+    def _enforce_telegram_timeout(cls, value: float | None) -> float | None:
+        if value is not None and value < MIN_NOTIFICATION_TIMEOUT:
+            logger.warning(
+                "P24_TELEGRAM_TIMEOUT=%s is too low. Using %s seconds instead.",
+                value,
+                MIN_NOTIFICATION_TIMEOUT,
+            )
+            return MIN_NOTIFICATION_TIMEOUT
+        return value
+
+    @field_validator("webhook_timeout", mode="after")
+    @classmethod
+    def _enforce_webhook_timeout(cls, value: float | None) -> float | None:
+        if value is not None and value < MIN_NOTIFICATION_TIMEOUT:
+            logger.warning(
+                "P24_WEBHOOK_TIMEOUT=%s is too low. Using %s seconds instead.",
+                value,
+                MIN_NOTIFICATION_TIMEOUT,
+            )
+            return MIN_NOTIFICATION_TIMEOUT
+        return value
+
+    @field_validator("notification_retries", mode="after")
+    @classmethod
+    def _enforce_notification_retries(cls, value: int) -> int:
+        if value < 0:
+            logger.warning(
+                "P24_NOTIFICATION_RETRIES=%s is negative. Using 0 instead.",
+                value,
+            )
+            return 0
+        return value
+
+    @field_validator("notification_workers", mode="after")
+    @classmethod
+    def _enforce_notification_workers(cls, value: int) -> int:
+        if value < 1:
+            logger.warning(
+                "P24_NOTIFICATION_WORKERS=%s is too low. Using 1 instead.",
+                value,
+            )
+            return 1
+        return value
+
+    @field_validator("notification_queue_size", mode="after")
+    @classmethod
+    def _enforce_notification_queue_size(cls, value: int) -> int:
+        if value < 1:
+            logger.warning(
+                "P24_NOTIFICATION_QUEUE_SIZE=%s is too low. Using 1 instead.",
+                value,
+            )
+            return 1
+        return value
+
+    @field_validator("notification_digest_window", mode="after")
+    @classmethod
+    def _enforce_notification_digest_window(cls, value: float) -> float:
+        if value < 0:
+            logger.warning(
+                "P24_NOTIFICATION_DIGEST_WINDOW=%s is negative. Using 0 instead.",
+                value,
+            )
+            return 0.0
+        return value
+
+    @field_validator("notification_digest_max_listings", mode="after")
+    @classmethod
+    def _enforce_notification_digest_max_listings(cls, value: int) -> int:
+        if value < 1:
+            logger.warning(
+                "P24_NOTIFICATION_DIGEST_MAX_LISTINGS=%s is too low. Using 1 instead.",
+                value,
+            )
+            return 1
+        return value
+
+    @field_validator("state_flush_interval", mode="after")
+    @classmethod
+    def _enforce_state_flush_interval(cls, value: float) -> float:
+        if value < MIN_STATE_FLUSH_INTERVAL:
+            logger.warning(
+                "P24_STATE_FLUSH_INTERVAL=%s is too low. Using %s seconds instead.",
+                value,
+                MIN_STATE_FLUSH_INTERVAL,
+            )
+            return MIN_STATE_FLUSH_INTERVAL
+        return value
+
+    @field_validator("history_retention_days", mode="after")
+    @classmethod
+    def _enforce_history_retention_days(cls, value: int) -> int:
+        if value < 0:
+            logger.warning(
+                "P24_HISTORY_RETENTION_DAYS=%s is negative. Keeping history forever.",
+                value,
+            )
+            return 0
+        return value
+
+    @field_validator("maintenance_interval", mode="after")
+    @classmethod
+    def _enforce_maintenance_interval(cls, value: float) -> float:
+        if 0 < value < MIN_MAINTENANCE_INTERVAL:
+            logger.warning(
+                "P24_MAINTENANCE_INTERVAL=%s is too low. Using %s seconds instead.",
+                value,
+                MIN_MAINTENANCE_INTERVAL,
+            )
+            return MIN_MAINTENANCE_INTERVAL
+        return max(0.0, value)
+
+    @field_validator("listing_concurrency", mode="after")
+    @classmethod
+    def _enforce_listing_concurrency(cls, value: int) -> int:
+        if value < 1:
+            logger.warning(
+                "P24_LISTING_CONCURRENCY=%s is too low. Using 1 instead.",
+                value,
+            )
+            return 1
+        return value
+
+    @field_validator("scheduler_workers", mode="after")
+    @classmethod
+    def _enforce_scheduler_workers(cls, value: int) -> int:
+        if value < 1:
+            logger.warning(
+                "P24_SCHEDULER_WORKERS=%s is too low. Using 1 instead.",
+                value,
+            )
+            return 1
+        return value
+
+    @field_validator("crawl_mode", mode="after")
+    @classmethod
+    def _validate_crawl_mode(cls, value: str) -> str:
+        value = value.strip().lower()
+        if value not in CRAWL_MODES:
+            raise ValueError(
+                f"Invalid crawl mode: {value}. Must be one of {', '.join(CRAWL_MODES)}"
+            )
+        return value
+
+    @field_validator("state_backend", mode="after")
+    @classmethod
+    def _validate_state_backend(cls, value: str) -> str:
+        value = value.strip().lower()
+        if value not in STATE_BACKENDS:
+            raise ValueError(
+                f"Invalid state backend: {value}. "
+                f"Must be one of {', '.join(STATE_BACKENDS)}"
+            )
+        return value
+
+    @field_validator("state_durability", mode="after")
+    @classmethod
+    def _validate_state_durability(cls, value: str) -> str:
+        value = value.strip().lower()
+        if value not in STATE_DURABILITY_MODES:
+            raise ValueError(
+                f"Invalid state durability: {value}. "
+                f"Must be one of {', '.join(STATE_DURABILITY_MODES)}"
+            )
+        return value
+
     @field_validator("log_level", mode="after")
     @classmethod
     def _normalise_log_level(cls, value: str) -> str:
@@ -156,29 +497,64 @@ class MonitorSettings(BaseSettings):
     def _coerce_state_file(cls, value: Path | str | None) -> Path:
         return _coerce_path_value(value, DEFAULT_STATE_FILE)
 
+    @model_validator(mode="after")
+    def _default_sqlite_state_file(self) -> "MonitorSettings":
+        """Keep SQLite state apart from a DuckDB file at the default path."""
+        if self.state_backend == "sqlite" and "state_file" not in self.model_fields_set:
+            self.state_file = Path(DEFAULT_SQLITE_STATE_FILE)
+        return self
+
     @model_validator(mode="after")
     def _validate_notification_settings(self) -> "MonitorSettings":
-        """Validate that required fields are present based on notification method."""
-        method = self.notification_method.lower()
+        """Validate that required fields are present for each notification method."""
+        methods = self.notification_methods
+        if not methods:
+            raise ValueError("P24_NOTIFICATION_METHOD must name a notification method")
 
-        if method == "ntfy":
-            if not self.ntfy_topic:
+        for method in methods:
+            if method == "ntfy":
+                if not self.ntfy_topics:
+                    raise ValueError(
+                        "NTFY_TOPIC is required when using ntfy notification method"
+                    )
+            elif method == "telegram":
+                if not self.telegram_token:
+                    raise ValueError(
+                        "TELEGRAM_TOKEN is required when using telegram "
+                        "notification method"
+                    )
+                if not self.telegram_chat_ids:
+                    raise ValueError(
+                        "TELEGRAM_CHAT_ID is required when using telegram "
+                        "notification method"
+                    )
+            elif method == "webhook":
+                if not self.webhook_urls:
+                    raise ValueError(
+                        "P24_WEBHOOK_URL is required when using webhook "
+                        "notification method"
+                    )
+            else:
                 raise ValueError(
-                    "NTFY_TOPIC is required when using ntfy notification method"
+                    f"Invalid notification method: {method}. "
+                    f"Must be one of {', '.join(NOTIFICATION_METHODS)}"
                 )
-        elif method == "telegram":
-            if not self.telegram_token:
-                raise ValueError(
-                    "TELEGRAM_TOKEN is required when using telegram notification method"
-                )
-            if not self.telegram_chat_id:
-                raise ValueError(
-                    "TELEGRAM_CHAT_ID is required when using telegram "
-                    "notification method"
-                )
-        else:
-            raise ValueError(
-                f"Invalid notification method: {method}. Must be 'ntfy' or 'telegram'"
-            )
 
         return self
+
+    @property
+    def notification_methods(self) -> list[str]:
+        """The methods named by ``P24_NOTIFICATION_METHOD``, lower-cased."""
+        return split_setting(self.notification_method.lower())
+
+    @property
+    def ntfy_topics(self) -> list[str]:
+        return split_setting(self.ntfy_topic)
+
+    @property
+    def telegram_chat_ids(self) -> list[str]:
+        return split_setting(self.telegram_chat_id)
+
+    @property
+    def webhook_urls(self) -> list[str]:
+        return split_setting(self.webhook_url)
@@ -0,0 +1,92 @@
+"""Coalesce the new listings of several polls into one notification."""
+
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Sequence
+
+from app.state import PendingDigest
+
+
+@dataclass(frozen=True, slots=True)
+class Digest:
+    """New listings collected over a digest window."""
+
+    # Property count of the last poll in the window.
+    count: int
+    listing_ids: list[int]
+    polls: int
+
+
+@dataclass(slots=True)
+class ListingDigest:
+    """Collect a search's new listings until the digest window closes.
+
+    The window opens with the first count increase after the last digest and
+    closes ``window`` seconds later, or as soon as ``max_listings`` new
+    listings are waiting, so a busy search sends one message per window
+    instead of one per poll. The clock is wall time so a window stored with
+    :meth:`pending_state` keeps its age across a restart.
+    """
+
+    window: float
+    max_listings: int
+    clock: Callable[[], float] = time.time
+    count: int | None = None
+    listing_ids: list[int] = field(default_factory=list)
+    polls: int = 0
+    opened_at: float | None = None
+
+    @property
+    def pending(self) -> bool:
+        return self.opened_at is not None
+
+    def add(self, count: int, listing_ids: Sequence[int]) -> None:
+        """Add a poll's count increase and the listings it found."""
+
+        if self.opened_at is None:
+            self.opened_at = self.clock()
+        self.count = count
+        self.listing_ids.extend(listing_ids)
+        self.polls += 1
+
+    def close_reason(self) -> str | None:
+        """Return why the window should close now (``size`` or ``window``)."""
+
+        if self.opened_at is None:
+            return None
+        if len(self.listing_ids) >= self.max_listings:
+            return "size"
+        if self.clock() - self.opened_at >= self.window:
+            return "window"
+        return None
+
+    def take(self) -> Digest | None:
+        """Return the collected listings and open a new window."""
+
+        if self.count is None:
+            return None
+        digest = Digest(self.count, self.listing_ids, self.polls)
+        self.count = None
+        self.listing_ids = []
+        self.polls = 0
+        self.opened_at = None
+        return digest
+
+    def pending_state(self) -> PendingDigest | None:
+        """Return the open window for the state store, ``None`` if none is open."""
+
+        if self.count is None or self.opened_at is None:
+            return None
+        return PendingDigest(
+            self.count, list(self.listing_ids), self.polls, self.opened_at
+        )
+
+    def restore(self, pending: PendingDigest) -> None:
+        """Reopen a window stored by :meth:`pending_state`."""
+
+        self.count = pending.count
+        self.listing_ids = list(pending.listing_ids)
+        self.polls = pending.polls
+        self.opened_at = pending.opened_at
@@ -0,0 +1,194 @@
+"""Size-bounded on-disk HTTP response cache for listing pages."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+
+from app.metrics import (
+    http_cache_bytes_saved_total,
+    http_cache_hits_total,
+    http_cache_misses_total,
+)
+
+DEFAULT_CACHE_DIRNAME = "http-cache"
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class CachedResponse:
+    """Stored body and validators for a URL."""
+
+    url: str
+    body: bytes
+    digest: str
+    etag: str | None = None
+    last_modified: str | None = None
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers: dict[str, str] = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+def content_digest(body: bytes) -> str:
+    return hashlib.sha256(body).hexdigest()
+
+
+class ResponseCache:
+    """Store response bodies and validators on disk with LRU eviction.
+
+    Each URL is kept as a ``<key>.body`` file plus a ``<key>.json`` metadata
+    file. Recency is tracked in memory and mirrored to the metadata file's
+    modification time, so the eviction order survives restarts. Verified page
+    results are memoised in memory per body digest, letting unchanged pages skip
+    parsing entirely.
+    """
+
+    def __init__(self, directory: Path, max_bytes: int = DEFAULT_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: OrderedDict[str, int] = OrderedDict()
+        self._total_bytes = 0
+        self._verified: dict[str, tuple[str, frozenset[int], tuple[str, ...]]] = {}
+        self._load_index()
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def _key(self, url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _paths(self, key: str) -> tuple[Path, Path]:
+        return self.directory / f"{key}.body", self.directory / f"{key}.json"
+
+    def _load_index(self) -> None:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        entries: list[tuple[float, str, int]] = []
+        for meta_path in self.directory.glob("*.json"):
+            body_path = meta_path.with_suffix(".body")
+            try:
+                entries.append(
+                    (
+                        meta_path.stat().st_mtime,
+                        meta_path.stem,
+                        body_path.stat().st_size,
+                    )
+                )
+            except FileNotFoundError:
+                meta_path.unlink(missing_ok=True)
+        for _, key, size in sorted(entries):
+            self._sizes[key] = size
+            self._total_bytes += size
+        self._evict()
+
+    def lookup(self, url: str) -> CachedResponse | None:
+        key = self._key(url)
+        body_path, meta_path = self._paths(key)
+        with self._lock:
+            if key not in self._sizes:
+                return None
+            try:
+                metadata = json.loads(meta_path.read_text(encoding="utf-8"))
+                body = body_path.read_bytes()
+                os.utime(meta_path)
+            except (OSError, ValueError):
+                logger.warning("Discarding unreadable cache entry for %s", url)
+                self._remove(key)
+                return None
+            self._sizes.move_to_end(key)
+
+        return CachedResponse(
+            url=url,
+            body=body,
+            digest=metadata["digest"],
+            etag=metadata.get("etag"),
+            last_modified=metadata.get("last_modified"),
+        )
+
+    def store(
+        self,
+        url: str,
+        body: bytes,
+        *,
+        digest: str | None = None,
+        etag: str | None = None,
+        last_modified: str | None = None,
+    ) -> None:
+        if len(body) > self.max_bytes:
+            return
+
+        key = self._key(url)
+        body_path, meta_path = self._paths(key)
+        metadata = {
+            "url": url,
+            "digest": digest or content_digest(body),
+            "etag": etag,
+            "last_modified": last_modified,
+        }
+        with self._lock:
+            _atomic_write(body_path, body)
+            _atomic_write(meta_path, json.dumps(metadata).encode("utf-8"))
+            self._total_bytes += len(body) - self._sizes.get(key, 0)
+            self._sizes[key] = len(body)
+            self._sizes.move_to_end(key)
+            self._evict()
+
+    def verified_result(
+        self, url: str, digest: str
+    ) -> tuple[frozenset[int], tuple[str, ...]] | None:
+        """Return the memoised verified listings for ``url`` at ``digest``."""
+
+        with self._lock:
+            entry = self._verified.get(url)
+        if entry is None or entry[0] != digest:
+            return None
+        return entry[1], entry[2]
+
+    def remember_verified(
+        self,
+        url: str,
+        digest: str,
+        numbers: frozenset[int],
+        urls: tuple[str, ...],
+    ) -> None:
+        with self._lock:
+            self._verified[url] = (digest, numbers, urls)
+
+    def record_hit(self, kind: str, bytes_saved: int = 0) -> None:
+        http_cache_hits_total.labels(kind=kind).inc()
+        if bytes_saved:
+            http_cache_bytes_saved_total.inc(bytes_saved)
+
+    def record_miss(self) -> None:
+        http_cache_misses_total.inc()
+
+    def _evict(self) -> None:
+        while self._sizes and self._total_bytes > self.max_bytes:
+            key = next(iter(self._sizes))
+            logger.debug("Evicting cache entry %s", key)
+            self._remove(key)
+
+    def _remove(self, key: str) -> None:
+        self._total_bytes -= self._sizes.pop(key, 0)
+        for path in self._paths(key):
+            path.unlink(missing_ok=True)
+
+
+def _atomic_write(path: Path, data: bytes) -> None:
+    tmp_path = path.with_name(f"{path.name}.tmp")
+    tmp_path.write_bytes(data)
+    tmp_path.replace(path)
@@ -0,0 +1,128 @@
+"""Process-wide HTTP client with per-host keep-alive connection pools."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from typing import Any
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+from app.metrics import http_connections_opened_total, http_requests_total
+
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 10
+DEFAULT_TIMEOUT = 15.0
+ACCEPT_ENCODING = "gzip, deflate"
+
+logger = logging.getLogger(__name__)
+
+
+class _CountingHTTPConnectionPool(HTTPConnectionPool):
+    def _new_conn(self) -> Any:
+        http_connections_opened_total.labels(host=self.host).inc()
+        logger.debug("Opening new connection to %s", self.host)
+        return super()._new_conn()
+
+
+class _CountingHTTPSConnectionPool(HTTPSConnectionPool):
+    def _new_conn(self) -> Any:
+        http_connections_opened_total.labels(host=self.host).inc()
+        logger.debug("Opening new connection to %s", self.host)
+        return super()._new_conn()
+
+
+class _CountingHTTPAdapter(HTTPAdapter):
+    """HTTP adapter that records requests and newly opened connections.
+
+    Connection reuse is the difference between requests sent and connections
+    opened for a host.
+    """
+
+    def init_poolmanager(self, *args: Any, **kwargs: Any) -> None:
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _CountingHTTPConnectionPool,
+            "https": _CountingHTTPSConnectionPool,
+        }
+
+    def send(
+        self, request: requests.PreparedRequest, *args: Any, **kwargs: Any
+    ) -> requests.Response:
+        host = urlsplit(request.url or "").hostname or "unknown"
+        http_requests_total.labels(host=host).inc()
+        return super().send(request, *args, **kwargs)
+
+
+class HttpClient:
+    """Shared ``requests`` session with sized keep-alive pools and a timeout."""
+
+    def __init__(
+        self,
+        *,
+        pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+    ) -> None:
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+        adapter = _CountingHTTPAdapter(
+            pool_connections=pool_connections,
+            pool_maxsize=pool_maxsize,
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def request(self, method: str, url: str, **kwargs: Any) -> requests.Response:
+        kwargs.setdefault("timeout", self.timeout)
+        return self.session.request(method, url, **kwargs)
+
+    def get(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs: Any) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def close(self) -> None:
+        self.session.close()
+
+
+_client: HttpClient | None = None
+_client_lock = threading.Lock()
+
+
+def configure_http_client(
+    *,
+    pool_connections: int = DEFAULT_POOL_CONNECTIONS,
+    pool_maxsize: int = DEFAULT_POOL_MAXSIZE,
+    timeout: float = DEFAULT_TIMEOUT,
+) -> HttpClient:
+    """Replace the process-wide HTTP client with one using the given limits."""
+
+    global _client
+
+    client = HttpClient(
+        pool_connections=pool_connections,
+        pool_maxsize=pool_maxsize,
+        timeout=timeout,
+    )
+    with _client_lock:
+        previous, _client = _client, client
+    if previous is not None:
+        previous.close()
+    return client
+
+
+def get_http_client() -> HttpClient:
+    """Return the process-wide HTTP client, creating a default one if needed."""
+
+    global _client
+
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient()
+        return _client
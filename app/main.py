@@ -4,96 +4,70 @@ from __future__ import annotations
 
 import json
 import logging
+import signal
 import sys
 import time
-from pathlib import Path
-from typing import Mapping
+from contextlib import contextmanager
+from datetime import timedelta
+from typing import Iterator, Mapping, Sequence
 
 import requests
 from pydantic import ValidationError
 
+from app.bloom import SeenListingIndex
 from app.config import MonitorSettings
+from app.digest import Digest, ListingDigest
+from app.http_cache import DEFAULT_CACHE_DIRNAME, ResponseCache
+from app.http_client import configure_http_client, get_http_client
 from app.logger import configure_logging
+from app.maintenance import StateMaintenance
 from app.metrics import (
     app_info,
     fetch_errors_total,
     listings_new_total,
-    notifications_sent_total,
+    notification_digests_total,
+    notification_polls_coalesced_total,
     poll_duration_seconds,
     property_count_changes,
     property_count_gauge,
 )
-from app.ntfy import send_message as send_ntfy_message
-from app.property24 import ListingTracker, fetch_listing_urls
+from app.notifications import Notifier, create_notifier
+from app.property24 import (
+    ListingTracker,
+    ListingVerifier,
+    SearchPlan,
+    fetch_listing_urls,
+    fetch_recent_listing_urls,
+    iter_listing_pages,
+)
+from app.scheduler import SearchScheduler
+from app.searches import SearchConfig, load_search_payload, load_searches
 from app.server import start_metrics_server
-from app.state import DuckDBStateStore
-from app.telegram import send_message as send_telegram_message
+from app.state import StateStore, open_state_store
+from app.state_cache import CachedStateStore
 
 PROPERTY_COUNTER_URL = "https://www.property24.com/search/counter"
-TELEGRAM_SEND_MESSAGE_URL = "https://api.telegram.org/bot{token}/sendMessage"
+COUNTER_TIMEOUT = 10
+# Listing URLs shown in the notification of a single poll.
+MAX_DISPLAY_LISTINGS = 10
 
 logger = logging.getLogger(__name__)
 
 
-def send_notification(settings: MonitorSettings, message: str) -> None:
-    """Send a notification using the configured notification method."""
-    method = settings.notification_method.lower()
-
-    try:
-        if method == "ntfy":
-            send_ntfy_message(
-                server=settings.ntfy_server,
-                topic=settings.ntfy_topic or "",
-                message=message,
-            )
-        elif method == "telegram":
-            send_telegram_message(
-                token=settings.telegram_token or "",
-                chat_id=settings.telegram_chat_id or "",
-                text=message,
-            )
-        else:
-            logger.error("Unknown notification method: %s", method)
-            notifications_sent_total.labels(method=method, status="error").inc()
-            return
-
-        notifications_sent_total.labels(method=method, status="success").inc()
-    except Exception as exc:
-        notifications_sent_total.labels(method=method, status="failed").inc()
-        raise exc
-
-
-def load_search_payload(path: Path) -> Mapping[str, object]:
-    """Load the search payload from disk."""
-
-    try:
-        with path.open(encoding="utf-8") as payload_file:
-            payload = json.load(payload_file)
-    except FileNotFoundError as exc:
-        raise RuntimeError(f"Payload file not found: {path}") from exc
-    except json.JSONDecodeError as exc:
-        raise RuntimeError(f"Invalid JSON content in payload file: {path}") from exc
-
-    if not isinstance(payload, dict):
-        raise RuntimeError("Payload file must contain a JSON object")
-
-    return payload
-
-
 def fetch_property_count(
     payload: Mapping[str, object],
 ) -> int:
     """Call the Property24 counter endpoint and return the current listing count."""
 
     body = json.dumps(payload).encode("utf-8")
-    req = requests.post(
-        PROPERTY_COUNTER_URL,
-        data=body,
-        headers={"Content-Type": "application/json"},
-        timeout=10,
-    )
 
     try:
+        req = get_http_client().post(
+            PROPERTY_COUNTER_URL,
+            data=body,
+            headers={"Content-Type": "application/json"},
+            timeout=COUNTER_TIMEOUT,
+        )
         data = req.json()
     except requests.RequestException as exc:
         fetch_errors_total.labels(error_type="request_failed").inc()
@@ -106,144 +80,506 @@ def fetch_property_count(
         raise RuntimeError("Property count missing in response") from exc
 
 
-def monitor_property_count(
+def crawl_listings(
     settings: MonitorSettings,
-    payload: Mapping[str, object],
-) -> None:
-    """Monitor the property count and notify when new listings appear."""
+    plan: SearchPlan,
+    tracker: ListingTracker,
+    *,
+    previous_count: int,
+    current_count: int,
+    verifier: ListingVerifier | None = None,
+    cache: ResponseCache | None = None,
+) -> tuple[int, list[int]]:
+    """Crawl listings after a count change and record them.
+
+    Returns the number of crawled listings and the newly added listing ids. Full crawls
+    are consumed page by page, so new listings are detected as soon as each page
+    is verified. The notification still waits for the whole crawl: it is
+    stored in the outbox in the same transaction as the listing diff, which is
+    only complete once every page is recorded. In delta mode an increase only
+    fetches the newest pages; decreases and empty baselines fall back to a
+    full crawl so removed listings are pruned.
+    """
+
+    if settings.crawl_mode == "delta" and current_count > previous_count:
+        known_ids = tracker.load_previous_ids()
+        if known_ids:
+            listing_urls = fetch_recent_listing_urls(
+                plan,
+                delta=current_count - previous_count,
+                known_ids=known_ids,
+                margin_pages=settings.delta_margin_pages,
+                max_concurrency=settings.listing_concurrency,
+                verifier=verifier,
+                cache=cache,
+            )
+            return len(listing_urls), tracker.record_recent(listing_urls)
+
+    pages = iter_listing_pages(
+        plan,
+        count=current_count,
+        max_concurrency=settings.listing_concurrency,
+        verifier=verifier,
+        cache=cache,
+    )
+    listing_count = 0
+    newly_added_ids: list[int] = []
+    for listing_page, new_ids in tracker.record_pages(pages):
+        listing_count += len(listing_page.urls)
+        if new_ids:
+            logger.debug(
+                "Page %s has %s new listings (%.2fs)",
+                listing_page.page,
+                len(new_ids),
+                listing_page.elapsed,
+            )
+            newly_added_ids.extend(new_ids)
+    return listing_count, newly_added_ids
+
+
+class SearchMonitor:
+    """Poll one search and notify when new listings appear.
+
+    Each call to :meth:`poll` fetches the property count once and, when it
+    changed, crawls and records the listings. Notifications are handed to the
+    notifier, so their delivery never delays the next poll. Several monitors
+    can share one state file (scoped by search id), one response cache and one
+    notifier. With a digest window, count increases are collected and
+    announced together once the window closes.
+    """
+
+    def __init__(
+        self,
+        settings: MonitorSettings,
+        plan: SearchPlan,
+        state_store: StateStore,
+        *,
+        location_name: str,
+        notifier: Notifier,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        self.settings = settings
+        self.plan = plan
+        self.location_name = location_name
+        self.state_store = state_store
+        self.notifier = notifier
+        self.cache = cache
+        self.tracker = ListingTracker(
+            state_store=state_store,
+            seen_index=(
+                None if settings.notify_relisted else SeenListingIndex(state_store)
+            ),
+        )
+        self.verifier = (
+            ListingVerifier(state_store=state_store)
+            if settings.adaptive_verification
+            else None
+        )
+        self.digest = (
+            ListingDigest(
+                settings.notification_digest_window,
+                settings.notification_digest_max_listings,
+            )
+            if settings.notification_digest_window
+            else None
+        )
+        pending_digest = state_store.get_pending_digest()
+        if pending_digest is not None:
+            if self.digest is not None:
+                # Listings collected before a restart are still announced.
+                self.digest.restore(pending_digest)
+            else:
+                logger.warning(
+                    "Dropping the open digest of %s: the digest window is off",
+                    location_name,
+                )
+                state_store.set_pending_digest(None)
+        self.previous_count: int | None = state_store.get_property_count()
+
+        logger.info(
+            "Starting monitor for %s (previous count: %s)",
+            location_name,
+            self.previous_count,
+        )
+
+        # Initialize property count gauge
+        if self.previous_count is not None:
+            property_count_gauge.labels(location=location_name).set(self.previous_count)
+
+    def poll(self) -> None:
+        current_count = self.fetch_count()
+        if current_count is None:
+            return
+        message = self.handle_count(current_count)
+        if message is not None:
+            self.notify(message)
 
-    state_store = DuckDBStateStore(path=settings.state_file)
-    state_store.ensure_file()
+    def fetch_count(self) -> int | None:
+        """Fetch the current property count, or ``None`` if the request failed."""
 
-    previous_count = state_store.get_property_count()
-    tracker = ListingTracker(state_store=state_store)
-    logger.info(
-        "Starting monitor for %s (previous count: %s)",
-        settings.location_name,
-        previous_count,
-    )
+        location_name = self.location_name
+        poll_start = time.time()
 
-    # Initialize property count gauge
-    if previous_count is not None:
-        property_count_gauge.labels(location=settings.location_name).set(previous_count)
+        try:
+            current_count = fetch_property_count(self.plan.payload)
+        except RuntimeError as exc:
+            logger.error("%s: %s", location_name, exc)
+            return None
 
-    try:
-        while True:
-            poll_start = time.time()
+        # Update current count gauge
+        property_count_gauge.labels(location=location_name).set(current_count)
+
+        # Record poll duration
+        poll_duration_seconds.labels(location=location_name).observe(
+            time.time() - poll_start
+        )
+        return current_count
+
+    def handle_count(self, current_count: int) -> str | None:
+        """Record a fetched count and return the notification to send, if any.
+
+        With a durable outbox, the notification is stored together with the
+        listings it announces: the state store commits both or neither, so a
+        crash can no longer record new listings and lose their notification.
+        An open digest window is stored the same way and reopened on restart.
+        """
+
+        with self.state_store.atomic():
+            message = self._record_count(current_count) or self._close_digest()
+            self._store_notification(message)
+        return message
+
+    def flush_digest(self) -> None:
+        """Send the collected digest now rather than when its window closes.
+
+        Called on shutdown, so the listings of an open window are announced.
+        """
+
+        if self.digest is None or not self.digest.pending:
+            return
+        with self.state_store.atomic():
+            message = self._close_digest(reason="shutdown")
+            self._store_notification(message)
+        if message is not None:
+            self.notify(message)
+
+    def _store_notification(self, message: str | None) -> None:
+        if message is not None and self.notifier.outbox is not None:
+            self.state_store.add_notifications(
+                [message], channels=self.notifier.channels
+            )
 
+    def _close_digest(self, reason: str | None = None) -> str | None:
+        digest = self.digest
+        if digest is None:
+            return None
+        reason = reason or digest.close_reason()
+        collected = digest.take() if reason is not None else None
+        if collected is None:
+            return None
+        self.state_store.set_pending_digest(None)
+        notification_digests_total.labels(
+            location=self.location_name, reason=reason
+        ).inc()
+        notification_polls_coalesced_total.labels(location=self.location_name).inc(
+            collected.polls - 1
+        )
+        return self._format_digest(collected)
+
+    def _record_count(self, current_count: int) -> str | None:
+        settings = self.settings
+        plan = self.plan
+        location_name = self.location_name
+        previous_count = self.previous_count
+
+        if current_count == previous_count:
+            logger.debug(
+                "No change in property count for %s: %s", location_name, current_count
+            )
+            return None
+
+        logger.info("Property count changed for %s: %s", location_name, current_count)
+        self.state_store.set_property_count(current_count)
+        self.previous_count = current_count
+
+        # On first run, just initialize state without sending notifications
+        if previous_count is None:
+            logger.info("First run detected - initializing state without notifications")
+
+            # Still fetch and record listings to establish baseline
             try:
-                current_count = fetch_property_count(payload)
+                listing_urls = fetch_listing_urls(
+                    plan,
+                    count=current_count,
+                    max_concurrency=settings.listing_concurrency,
+                    verifier=self.verifier,
+                    cache=self.cache,
+                )
+                self.tracker.record(listing_urls)
+                logger.info("Initialized tracking with %s listings", len(listing_urls))
             except RuntimeError as exc:
-                logger.error("%s", exc)
-                time.sleep(settings.poll_interval)
-                continue
-
-            # Update current count gauge
-            property_count_gauge.labels(location=settings.location_name).set(
-                current_count
+                logger.error("Failed to fetch listing URLs: %s", exc)
+                fetch_errors_total.labels(error_type="listing_fetch_failed").inc()
+            return None
+
+        # Normal operation: track changes and send notifications
+        change_type = "increase" if current_count > previous_count else "decrease"
+        property_count_changes.labels(
+            location=location_name, change_type=change_type
+        ).inc()
+
+        newly_added_ids: list[int] = []
+        try:
+            listing_count, newly_added_ids = crawl_listings(
+                settings,
+                plan,
+                self.tracker,
+                previous_count=previous_count,
+                current_count=current_count,
+                verifier=self.verifier,
+                cache=self.cache,
+            )
+        except RuntimeError as exc:
+            logger.error("Failed to fetch listing URLs: %s", exc)
+            fetch_errors_total.labels(error_type="listing_fetch_failed").inc()
+        else:
+            logger.debug(
+                "Recorded %s listings (%s new)",
+                listing_count,
+                len(newly_added_ids),
             )
 
-            # Record poll duration
-            poll_duration_seconds.labels(location=settings.location_name).observe(
-                time.time() - poll_start
+            # Track new listings
+            if newly_added_ids:
+                listings_new_total.labels(location=location_name).inc(
+                    len(newly_added_ids)
+                )
+
+        if current_count <= previous_count:
+            return None
+
+        if self.digest is not None:
+            self.digest.add(current_count, newly_added_ids)
+            self.state_store.set_pending_digest(self.digest.pending_state())
+            return None
+
+        return self._format_message(
+            f"New property added in {location_name}. Count: {current_count}",
+            newly_added_ids,
+            MAX_DISPLAY_LISTINGS,
+        )
+
+    def _format_digest(self, digest: Digest) -> str:
+        if digest.polls == 1:
+            header = f"New property added in {self.location_name}."
+        else:
+            header = (
+                f"New properties added in {self.location_name} "
+                f"over {digest.polls} polls."
             )
+        return self._format_message(
+            f"{header} Count: {digest.count}",
+            # A listing can be counted again if it left and came back.
+            list(dict.fromkeys(digest.listing_ids)),
+            self.settings.notification_digest_max_listings,
+        )
+
+    def _format_message(
+        self, header: str, listing_ids: Sequence[int], max_display: int
+    ) -> str:
+        message_lines = [header]
+
+        if listing_ids:
+            display_ids = listing_ids[:max_display]
+            # URLs are only looked up for the listings that are displayed.
+            message_lines.append("New listings:")
+            message_lines.extend(self.tracker.listing_urls(display_ids))
+            remaining = len(listing_ids) - len(display_ids)
+            if remaining > 0:
+                message_lines.append(f"...and {remaining} more")
+
+        return "\n".join(message_lines)
+
+    def notify(self, message: str) -> None:
+        if (
+            self.settings.state_durability == "notify"
+            or self.notifier.outbox is not None
+        ):
+            # Persist the listings being announced first, so a crash after
+            # sending cannot announce them again on restart. With the outbox
+            # this also stores the message itself, so it is flushed in every
+            # durability mode rather than waiting for the interval timer.
+            try:
+                self.state_store.flush()
+            except Exception:
+                logger.exception("Failed to flush state before notifying")
+        # Delivery happens on the channels' workers, off the poll loop.
+        if self.notifier.outbox is not None:
+            # ``handle_count`` already put the message in the outbox.
+            self.notifier.wake()
+        else:
+            self.notifier.submit(message)
 
-            if current_count != previous_count:
-                logger.info("Property count changed: %s", current_count)
-
-                # On first run, just initialize state without sending notifications
-                if previous_count is None:
-                    logger.info(
-                        "First run detected - initializing state without notifications"
-                    )
-                    state_store.set_property_count(current_count)
-
-                    # Still fetch and record listings to establish baseline
-                    try:
-                        listing_urls = fetch_listing_urls(payload, count=current_count)
-                        tracker.record(listing_urls)
-                        logger.info(
-                            "Initialized tracking with %s listings", len(listing_urls)
-                        )
-                    except RuntimeError as exc:
-                        logger.error("Failed to fetch listing URLs: %s", exc)
-                        fetch_errors_total.labels(
-                            error_type="listing_fetch_failed"
-                        ).inc()
-
-                    previous_count = current_count
-                else:
-                    # Normal operation: track changes and send notifications
-                    state_store.set_property_count(current_count)
-
-                    # Track the type of change
-                    change_type = (
-                        "increase" if current_count > previous_count else "decrease"
-                    )
-                    property_count_changes.labels(
-                        location=settings.location_name, change_type=change_type
-                    ).inc()
-
-                    listing_urls = []
-                    newly_added_urls = []
-                    try:
-                        listing_urls = fetch_listing_urls(payload, count=current_count)
-                    except RuntimeError as exc:
-                        logger.error("Failed to fetch listing URLs: %s", exc)
-                        fetch_errors_total.labels(
-                            error_type="listing_fetch_failed"
-                        ).inc()
-                    else:
-                        newly_added_urls = tracker.record(listing_urls)
-                        logger.debug(
-                            "Recorded %s listings (%s new)",
-                            len(listing_urls),
-                            len(newly_added_urls),
-                        )
-
-                        # Track new listings
-                        if newly_added_urls:
-                            listings_new_total.labels(
-                                location=settings.location_name
-                            ).inc(len(newly_added_urls))
-
-                    if current_count > previous_count:
-                        message_lines = [
-                            (
-                                f"New property added in {settings.location_name}. "
-                                f"Count: {current_count}"
-                            )
-                        ]
-
-                        if newly_added_urls:
-                            max_display = 10
-                            display_urls = newly_added_urls[:max_display]
-                            message_lines.append("New listings:")
-                            message_lines.extend(display_urls)
-                            remaining = len(newly_added_urls) - len(display_urls)
-                            if remaining > 0:
-                                message_lines.append(f"...and {remaining} more")
-
-                        message = "\n".join(message_lines)
-                        try:
-                            send_notification(settings, message)
-                            logger.info(
-                                "Notification sent via %s",
-                                settings.notification_method,
-                            )
-                        except Exception as e:
-                            logger.error("Failed to send notification: %s", e)
-
-                    previous_count = current_count
-            else:
-                logger.debug("No change in property count: %s", current_count)
 
-            if settings.run_once:
-                break
+def create_response_cache(settings: MonitorSettings) -> ResponseCache | None:
+    """Return the listing page cache next to the state file, if enabled."""
+
+    if not settings.http_cache_enabled:
+        return None
+    return ResponseCache(
+        settings.state_file.parent / DEFAULT_CACHE_DIRNAME,
+        max_bytes=settings.http_cache_max_mb * 1024 * 1024,
+    )
+
+
+@contextmanager
+def open_monitor_state(settings: MonitorSettings) -> Iterator[StateStore]:
+    """Open the configured state backend behind a write-behind cache.
+
+    The ``memory`` backend already lives in memory and is used as is. File
+    backends also get a background maintenance thread while open.
+    """
+
+    backend = open_state_store(settings.state_backend, settings.state_file)
+    if settings.state_backend == "memory":
+        with backend:
+            backend.ensure_file()
+            yield backend
+        return
+
+    with CachedStateStore(
+        backend,
+        durability=settings.state_durability,
+        flush_interval=settings.state_flush_interval,
+    ) as state_store:
+        state_store.ensure_file()
+        if not settings.maintenance_interval:
+            yield state_store
+            return
+        maintenance = StateMaintenance(
+            state_store,
+            interval=settings.maintenance_interval,
+            retention=(
+                timedelta(days=settings.history_retention_days)
+                if settings.history_retention_days
+                else None
+            ),
+        )
+        maintenance.start()
+        try:
+            yield state_store
+        finally:
+            maintenance.stop()
+
+
+def _stop_on_sigterm(signum: int, frame: object) -> None:
+    # Unwind like Ctrl-C so buffered state is flushed on the way out.
+    raise KeyboardInterrupt
+
 
-            time.sleep(settings.poll_interval)
-    except KeyboardInterrupt:
-        logger.info("Monitor stopped by user")
+def monitor_property_count(
+    settings: MonitorSettings,
+    payload: Mapping[str, object] | SearchPlan,
+) -> None:
+    """Monitor the property count and notify when new listings appear."""
+
+    with (
+        open_monitor_state(settings) as state_store,
+        create_notifier(settings, state_store) as notifier,
+    ):
+        monitor = SearchMonitor(
+            settings,
+            SearchPlan.coerce(payload),
+            state_store,
+            location_name=settings.location_name,
+            notifier=notifier,
+            cache=create_response_cache(settings),
+        )
+
+        try:
+            while True:
+                monitor.poll()
+
+                if settings.run_once:
+                    break
+
+                time.sleep(settings.poll_interval)
+        except KeyboardInterrupt:
+            logger.info("Monitor stopped by user")
+        finally:
+            flush_digests([monitor])
+
+
+def create_monitors(
+    settings: MonitorSettings,
+    searches: Sequence[SearchConfig],
+    state_store: StateStore,
+    notifier: Notifier,
+) -> list[SearchMonitor]:
+    """Create one monitor per search sharing the state, page cache and notifier."""
+
+    cache = create_response_cache(settings)
+
+    return [
+        SearchMonitor(
+            settings,
+            search.plan,
+            state_store.for_search(search.search_id),
+            location_name=search.location_name,
+            notifier=notifier,
+            cache=cache,
+        )
+        for search in searches
+    ]
+
+
+def flush_digests(monitors: Sequence[SearchMonitor]) -> None:
+    """Send the digests the monitors are still collecting before shutdown."""
+
+    for monitor in monitors:
+        try:
+            monitor.flush_digest()
+        except Exception:
+            logger.exception("Failed to send the digest of %s", monitor.location_name)
+
+
+def monitor_searches(
+    settings: MonitorSettings,
+    searches: Sequence[SearchConfig],
+) -> None:
+    """Monitor several searches from one scheduler.
+
+    All searches share the HTTP connection pools, the response cache and the
+    state file; each search keeps its own rows, keyed by its search id.
+    """
+
+    with (
+        open_monitor_state(settings) as state_store,
+        create_notifier(settings, state_store) as notifier,
+    ):
+        scheduler = SearchScheduler(max_workers=settings.scheduler_workers)
+        monitors = create_monitors(settings, searches, state_store, notifier)
+        for search, monitor in zip(searches, monitors, strict=True):
+            scheduler.add(
+                search.search_id or search.location_name,
+                monitor.poll,
+                search.poll_interval,
+            )
+        logger.info(
+            "Scheduling %s searches on %s workers",
+            len(searches),
+            scheduler.max_workers,
+        )
+
+        try:
+            if settings.run_once:
+                scheduler.run_once()
+            else:
+                scheduler.run()
+        except KeyboardInterrupt:
+            logger.info("Monitor stopped by user")
+        finally:
+            flush_digests(monitors)
 
 
 def main() -> None:
@@ -258,22 +594,49 @@ def main() -> None:
         raise SystemExit(1) from exc
 
     configure_logging(settings.log_level)
+    configure_http_client(
+        pool_connections=settings.http_pool_connections,
+        pool_maxsize=max(
+            settings.http_pool_maxsize,
+            settings.listing_concurrency
+            * (settings.scheduler_workers if settings.searches else 1),
+        ),
+        timeout=settings.http_timeout,
+    )
 
     # Start metrics server if enabled
     if settings.metrics_enabled:
         start_metrics_server(port=settings.metrics_port)
         # Set application info metric
         app_info.labels(
-            version="0.1.0", notification_method=settings.notification_method
+            version="0.1.0",
+            notification_method=",".join(settings.notification_methods),
         ).set(1)
 
     try:
-        payload = load_search_payload(settings.payload_file)
+        if settings.searches:
+            searches = load_searches(
+                settings.searches, default_poll_interval=settings.poll_interval
+            )
+        else:
+            payload = load_search_payload(settings.payload_file)
+            searches = [
+                SearchConfig(
+                    search_id=None,
+                    location_name=settings.location_name,
+                    poll_interval=settings.poll_interval,
+                    plan=SearchPlan.from_payload(payload),
+                )
+            ]
     except RuntimeError as exc:
         logger.error("%s", exc)
         raise SystemExit(1) from exc
 
-    monitor_property_count(settings, payload)
+    signal.signal(signal.SIGTERM, _stop_on_sigterm)
+    if settings.searches:
+        monitor_searches(settings, searches)
+    else:
+        monitor_property_count(settings, searches[0].plan)
 
 
 if __name__ == "__main__":
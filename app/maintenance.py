@@ -0,0 +1,91 @@
+"""Background retention and compaction for the state file."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+
+from app.metrics import (
+    state_file_size_bytes,
+    state_history_pruned_total,
+    state_maintenance_duration_seconds,
+)
+from app.state import StateStore
+
+logger = logging.getLogger(__name__)
+
+
+def state_file_size(path: Path) -> int:
+    """Return the size of ``path`` plus its write-ahead log, if any."""
+
+    return sum(
+        candidate.stat().st_size
+        for candidate in (
+            path,
+            path.with_name(f"{path.name}.wal"),
+            path.with_name(f"{path.name}-wal"),
+        )
+        if candidate.is_file()
+    )
+
+
+class StateMaintenance:
+    """Prune old listing history and compact the state file periodically.
+
+    Runs on its own thread every ``interval`` seconds, deleting listings that
+    left their search more than ``retention`` ago and then letting the backend
+    checkpoint and reclaim space. Behind the write-behind cache, maintenance
+    only delays flushes; polls keep running from memory.
+    """
+
+    def __init__(
+        self,
+        state_store: StateStore,
+        *,
+        interval: float,
+        retention: timedelta | None,
+    ) -> None:
+        self.state_store = state_store
+        self.interval = interval
+        self.retention = retention
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self) -> None:
+        state_file_size_bytes.set(state_file_size(self.state_store.path))
+        self._thread = threading.Thread(
+            target=self._run, name="state-maintenance", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("State maintenance failed")
+
+    def run_once(self) -> None:
+        """Apply the retention policy, then compact the state file."""
+
+        if self.retention is not None:
+            before = datetime.now(UTC).replace(tzinfo=None) - self.retention
+            with state_maintenance_duration_seconds.labels(step="prune").time():
+                pruned = self.state_store.prune_history(before)
+            state_history_pruned_total.inc(pruned)
+            if pruned:
+                logger.info("Pruned %s listings removed before %s", pruned, before)
+
+        with state_maintenance_duration_seconds.labels(step="compact").time():
+            self.state_store.compact()
+        size = state_file_size(self.state_store.path)
+        state_file_size_bytes.set(size)
+        logger.debug("State file %s is %s bytes", self.state_store.path, size)
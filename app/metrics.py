@@ -34,7 +34,64 @@ fetch_errors_total = Counter(
 notifications_sent_total = Counter(
     "property24_notifications_sent_total",
     "Total number of notifications sent",
-    ["method", "status"],
+    ["method", "channel", "status"],
+)
+
+notification_queue_depth = Gauge(
+    "property24_notification_queue_depth",
+    "Notifications waiting for a dispatcher worker",
+    ["method", "channel"],
+)
+
+notification_outbox_size = Gauge(
+    "property24_notification_outbox_size",
+    "Notifications stored in the state outbox awaiting delivery",
+)
+
+notification_delivery_seconds = Histogram(
+    "property24_notification_delivery_seconds",
+    "Time from queueing a notification to its delivery",
+    ["method", "channel"],
+)
+
+notification_retries_total = Counter(
+    "property24_notification_retries_total",
+    "Total number of notification sends retried after a failure",
+    ["method", "channel"],
+)
+
+notifications_dropped_total = Counter(
+    "property24_notifications_dropped_total",
+    "Total number of notifications dropped without being delivered",
+    ["method", "channel", "reason"],
+)
+
+notifications_batched_total = Counter(
+    "property24_notifications_batched_total",
+    "Total number of queued notifications merged into an earlier one",
+    ["method", "channel"],
+)
+
+notification_digests_total = Counter(
+    "property24_notification_digests_total",
+    "Total number of digests sent, by why their window closed",
+    ["location", "reason"],
+)
+
+notification_polls_coalesced_total = Counter(
+    "property24_notification_polls_coalesced_total",
+    "Total number of poll notifications saved by merging polls into a digest",
+    ["location"],
+)
+
+telegram_rate_limited_total = Counter(
+    "property24_telegram_rate_limited_total",
+    "Total number of 429 Too Many Requests responses from Telegram",
+)
+
+telegram_throttled_seconds_total = Counter(
+    "property24_telegram_throttled_seconds_total",
+    "Total seconds Telegram messages waited for the rate limiter",
 )
 
 poll_duration_seconds = Histogram(
@@ -43,6 +100,81 @@ poll_duration_seconds = Histogram(
     ["location"],
 )
 
+# Metrics for the shared HTTP client
+http_requests_total = Counter(
+    "property24_http_requests_total",
+    "Total number of HTTP requests sent by the shared client",
+    ["host"],
+)
+
+http_connections_opened_total = Counter(
+    "property24_http_connections_opened_total",
+    "Total number of new HTTP connections opened (requests minus this is reuse)",
+    ["host"],
+)
+
+# Metrics for the listing page HTTP cache
+http_cache_hits_total = Counter(
+    "property24_http_cache_hits_total",
+    "Total number of listing page fetches served as unchanged from the cache",
+    ["kind"],
+)
+
+http_cache_misses_total = Counter(
+    "property24_http_cache_misses_total",
+    "Total number of listing page fetches that returned new content",
+)
+
+http_cache_bytes_saved_total = Counter(
+    "property24_http_cache_bytes_saved_total",
+    "Total number of response body bytes not downloaded thanks to the cache",
+)
+
+# Metrics for the write-behind state cache
+state_flush_duration_seconds = Histogram(
+    "property24_state_flush_duration_seconds",
+    "Duration of flushes of buffered state writes to the state backend",
+)
+
+state_flush_errors_total = Counter(
+    "property24_state_flush_errors_total",
+    "Total number of failed state flushes (the writes are retried)",
+)
+
+state_pending_writes = Gauge(
+    "property24_state_pending_writes",
+    "Buffered state writes not yet flushed to the state backend",
+)
+
+# Metrics for state file maintenance
+state_file_size_bytes = Gauge(
+    "property24_state_file_size_bytes",
+    "Size of the state file and its write-ahead log",
+)
+
+state_maintenance_duration_seconds = Histogram(
+    "property24_state_maintenance_duration_seconds",
+    "Duration of state maintenance steps",
+    ["step"],
+)
+
+state_history_pruned_total = Counter(
+    "property24_state_history_pruned_total",
+    "Total number of listing history rows deleted by the retention policy",
+)
+
+# Metrics for the "ever seen" listing index
+seen_index_lookups_total = Counter(
+    "property24_seen_index_lookups_total",
+    "Total number of added listings checked against the ever-seen index",
+    ["result"],
+)
+
+seen_index_bytes = Gauge(
+    "property24_seen_index_bytes",
+    "Memory used by the Bloom filters of the ever-seen index",
+)
+
 # Application info and uptime
 app_info = Gauge(
     "property24_app_info",
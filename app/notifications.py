@@ -0,0 +1,564 @@
+"""Notification channels and the dispatchers that deliver off the poll loop."""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from datetime import UTC, datetime, timedelta
+from functools import partial
+from typing import Callable, Sequence
+
+from app.config import MonitorSettings
+from app.metrics import (
+    notification_delivery_seconds,
+    notification_outbox_size,
+    notification_queue_depth,
+    notification_retries_total,
+    notifications_batched_total,
+    notifications_dropped_total,
+    notifications_sent_total,
+)
+from app.ntfy import (
+    MAX_MESSAGE_LENGTH as NTFY_MAX_MESSAGE_LENGTH,
+    send_message as send_ntfy_message,
+)
+from app.state import StateStore
+from app.telegram import MAX_MESSAGE_LENGTH, TelegramClient, split_message
+from app.webhook import send_message as send_webhook_message
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_RETRIES = 3
+# Seconds before the first retry; each further retry waits twice as long.
+DEFAULT_RETRY_BACKOFF = 2.0
+DEFAULT_WORKERS = 2
+DEFAULT_QUEUE_SIZE = 100
+# Put between notifications merged into one message.
+BATCH_SEPARATOR = "\n\n"
+# Seconds ``close`` waits for queued notifications before dropping them.
+DEFAULT_DRAIN_TIMEOUT = 10.0
+# Hex digits of the target hash in a channel name.
+CHANNEL_HASH_LENGTH = 8
+# Seconds between checks of the outbox for due notifications.
+DEFAULT_OUTBOX_POLL_INTERVAL = 5.0
+# Longest wait before retrying a notification from the outbox.
+MAX_RETRY_BACKOFF = 60 * 60.0
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class NotificationChannel:
+    """A destination for notifications.
+
+    ``send`` delivers one message within ``timeout`` seconds and raises on
+    failure; failed sends are retried up to ``retries`` times. Channels with a
+    ``max_length`` get queued notifications merged into messages of up to that
+    many characters. Metrics are labelled with both the ``method`` (``ntfy``,
+    ``telegram``, ``webhook``) and the channel ``name``.
+    """
+
+    name: str
+    send: Callable[[str, float], None]
+    method: str
+    timeout: float = DEFAULT_TIMEOUT
+    retries: int = DEFAULT_RETRIES
+    max_length: int | None = None
+
+    @property
+    def labels(self) -> dict[str, str]:
+        """Metric labels of the channel."""
+
+        return {"method": self.method, "channel": self.name}
+
+
+def _send_ntfy(server: str, topic: str, message: str, timeout: float) -> None:
+    # Long digests are sent in parts rather than as an attachment.
+    for chunk in split_message(message, NTFY_MAX_MESSAGE_LENGTH):
+        send_ntfy_message(server=server, topic=topic, message=chunk, timeout=timeout)
+
+
+def _send_telegram(
+    client: TelegramClient, chat_id: str, message: str, timeout: float
+) -> None:
+    client.send_message(chat_id, message, timeout=timeout)
+
+
+def _send_webhook(url: str, message: str, timeout: float) -> None:
+    send_webhook_message(url, message, timeout=timeout)
+
+
+def channel_name(method: str, target: str) -> str:
+    """Name the channel of ``method`` that sends to ``target``.
+
+    The name follows the target rather than its position in the settings, so
+    outbox messages stay with their destination when targets are added,
+    removed or reordered. Only a hash of the target is used, as topics and
+    webhook URLs often work as secrets.
+    """
+
+    digest = hashlib.sha256(target.encode("utf-8")).hexdigest()
+    return f"{method}-{digest[:CHANNEL_HASH_LENGTH]}"
+
+
+def _named_channels(
+    settings: MonitorSettings,
+    method: str,
+    senders: Sequence[tuple[str, Callable[[str, float], None]]],
+    timeout: float | None,
+    max_length: int | None = None,
+) -> list[NotificationChannel]:
+    return [
+        NotificationChannel(
+            name=channel_name(method, target),
+            send=send,
+            method=method,
+            timeout=timeout or settings.notification_timeout,
+            retries=settings.notification_retries,
+            max_length=max_length,
+        )
+        for target, send in senders
+    ]
+
+
+def _ntfy_channels(settings: MonitorSettings) -> list[NotificationChannel]:
+    senders = [
+        (
+            f"{settings.ntfy_server}/{topic}",
+            partial(_send_ntfy, settings.ntfy_server, topic),
+        )
+        for topic in settings.ntfy_topics
+    ]
+    return _named_channels(
+        settings, "ntfy", senders, settings.ntfy_timeout, NTFY_MAX_MESSAGE_LENGTH
+    )
+
+
+def _telegram_channels(settings: MonitorSettings) -> list[NotificationChannel]:
+    # One client for every chat, so Telegram's overall rate limit holds.
+    client = TelegramClient(settings.telegram_token or "")
+    senders = [
+        (chat_id, partial(_send_telegram, client, chat_id))
+        for chat_id in settings.telegram_chat_ids
+    ]
+    return _named_channels(
+        settings, "telegram", senders, settings.telegram_timeout, MAX_MESSAGE_LENGTH
+    )
+
+
+def _webhook_channels(settings: MonitorSettings) -> list[NotificationChannel]:
+    senders = [(url, partial(_send_webhook, url)) for url in settings.webhook_urls]
+    return _named_channels(settings, "webhook", senders, settings.webhook_timeout)
+
+
+# Builds the channels of each notification method from the settings.
+CHANNEL_FACTORIES: dict[str, Callable[[MonitorSettings], list[NotificationChannel]]] = {
+    "ntfy": _ntfy_channels,
+    "telegram": _telegram_channels,
+    "webhook": _webhook_channels,
+}
+
+
+def create_channels(settings: MonitorSettings) -> list[NotificationChannel]:
+    """Return a channel per target of each method in ``P24_NOTIFICATION_METHOD``.
+
+    Several ntfy topics, Telegram chats or webhook URLs give several channels
+    of one method. Each is named by :func:`channel_name` after its method and
+    target (``ntfy-1a2b3c4d``); the name keys the channel's outbox messages
+    and its ``channel`` metric label.
+    """
+
+    channels: list[NotificationChannel] = []
+    for method in settings.notification_methods:
+        factory = CHANNEL_FACTORIES.get(method)
+        if factory is None:
+            raise ValueError(f"Unknown notification method: {method}")
+        channels.extend(factory(settings))
+    return channels
+
+
+@dataclass(frozen=True, slots=True)
+class _Job:
+    message: str
+    enqueued_at: float
+    # Notifications merged into this one, itself included.
+    count: int = 1
+    # Outbox rows this job delivers; empty for submitted notifications.
+    ids: tuple[int, ...] = ()
+    attempts: int = 0
+
+
+class NotificationDispatcher:
+    """Queue notifications and deliver them from worker threads.
+
+    :meth:`submit` returns at once, so a slow or unreachable notification
+    service never delays a poll. Workers retry failed sends with exponential
+    backoff. When ``max_queue`` notifications are already waiting, new ones
+    are dropped rather than letting the queue grow without bound. For channels
+    with a ``max_length``, a worker merges the notifications waiting behind
+    the one it takes, so a burst goes out as a few long messages.
+
+    With an ``outbox``, the dispatcher also delivers the notifications stored
+    in the state store's outbox: a feeder thread queues due messages every
+    ``poll_interval`` seconds or when woken by :meth:`wake`. A message is
+    removed from the outbox only once it was sent, and a failed send is held
+    back in the outbox with exponential backoff instead of being retried in
+    memory, so messages are delivered at least once across restarts.
+    """
+
+    def __init__(
+        self,
+        channel: NotificationChannel,
+        *,
+        workers: int = DEFAULT_WORKERS,
+        max_queue: int = DEFAULT_QUEUE_SIZE,
+        retry_backoff: float = DEFAULT_RETRY_BACKOFF,
+        outbox: StateStore | None = None,
+        poll_interval: float = DEFAULT_OUTBOX_POLL_INTERVAL,
+    ) -> None:
+        self.channel = channel
+        self.max_queue = max(1, max_queue)
+        self.retry_backoff = retry_backoff
+        self.outbox = outbox
+        self.poll_interval = poll_interval
+        # Unbounded so the shutdown sentinels never block; ``submit`` enforces
+        # ``max_queue`` itself.
+        self._queue: queue.Queue[_Job | None] = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        # Set when the drain timeout expires: workers drop what is left.
+        self._abort = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, name=f"notify-{index}", daemon=True)
+            for index in range(max(1, workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+        # Outbox ids queued or being sent, so the feeder queues each once.
+        self._in_flight: set[int] = set()
+        self._wake = threading.Event()
+        self._feeder: threading.Thread | None = None
+        if outbox is not None:
+            self._feeder = threading.Thread(
+                target=self._feed, args=(outbox,), name="notify-outbox", daemon=True
+            )
+            self._feeder.start()
+
+    def __enter__(self) -> NotificationDispatcher:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def submit(self, message: str) -> bool:
+        """Queue ``message`` for delivery; returns ``False`` if it was dropped."""
+
+        with self._lock:
+            if self._closed:
+                reason = "shutdown"
+            elif self._queue.qsize() >= self.max_queue:
+                reason = "queue_full"
+            else:
+                self._queue.put(_Job(message, time.monotonic()))
+                notification_queue_depth.labels(**self.channel.labels).set(
+                    self._queue.qsize()
+                )
+                return True
+        logger.warning("Dropping notification via %s (%s)", self.channel.name, reason)
+        notifications_dropped_total.labels(**self.channel.labels, reason=reason).inc()
+        return False
+
+    def wake(self) -> None:
+        """Check the outbox for due notifications now."""
+
+        self._wake.set()
+
+    def close(self, timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
+        """Stop accepting notifications and deliver the queued ones.
+
+        Waits up to ``timeout`` seconds; anything still queued after that is
+        dropped, except outbox messages, which stay stored for the next run.
+        A send already in progress is left to its own timeout.
+        """
+
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+
+        deadline = time.monotonic() + timeout
+        if self._feeder is not None:
+            # The feeder checks the outbox once more before it stops, so
+            # messages stored by the last polls are sent too.
+            self._wake.set()
+            self._feeder.join(max(0.0, deadline - time.monotonic()))
+        for _ in self._workers:
+            self._queue.put(None)
+        for worker in self._workers:
+            worker.join(max(0.0, deadline - time.monotonic()))
+        if any(worker.is_alive() for worker in self._workers):
+            logger.warning(
+                "Notifications still queued after %.0fs; dropping them", timeout
+            )
+            self._abort.set()
+
+    def _feed(self, outbox: StateStore) -> None:
+        while True:
+            self._wake.clear()
+            stopping = self._closed
+            try:
+                if stopping:
+                    # Messages buffered by a write-behind cache are not in
+                    # the outbox until flushed.
+                    outbox.flush()
+                self._queue_due(outbox)
+            except Exception:
+                logger.exception("Failed to read the notification outbox")
+            if stopping:
+                return
+            self._wake.wait(self.poll_interval)
+
+    def _queue_due(self, outbox: StateStore) -> None:
+        notification_outbox_size.set(outbox.count_notifications())
+        now = _utcnow()
+        for row in outbox.get_due_notifications(
+            now, channel=self.channel.name, limit=self.max_queue
+        ):
+            with self._lock:
+                if row.id in self._in_flight:
+                    continue
+                if len(self._in_flight) >= self.max_queue:
+                    break
+                self._in_flight.add(row.id)
+            age = (now - row.created_at).total_seconds()
+            self._queue.put(
+                _Job(
+                    row.message,
+                    time.monotonic() - age,
+                    ids=(row.id,),
+                    attempts=row.attempts,
+                )
+            )
+        notification_queue_depth.labels(**self.channel.labels).set(self._queue.qsize())
+
+    def _work(self) -> None:
+        # A job (or the shutdown sentinel) taken off the queue that did not
+        # fit into the last batch.
+        carried: list[_Job | None] = []
+        while True:
+            job = carried.pop() if carried else self._queue.get()
+            if job is None:
+                return
+            if self.channel.max_length is not None:
+                job, carried = self._batch(job, self.channel.max_length)
+            notification_queue_depth.labels(**self.channel.labels).set(
+                self._queue.qsize()
+            )
+            try:
+                self._deliver(job)
+            except Exception:
+                logger.exception("Notification worker failed")
+
+    def _batch(self, job: _Job, max_length: int) -> tuple[_Job, list[_Job | None]]:
+        """Merge queued jobs into ``job`` while the message stays short enough.
+
+        Returns the merged job and the queue item that did not fit, if any.
+        """
+
+        jobs = [job]
+        length = len(job.message)
+        carried: list[_Job | None] = []
+        while True:
+            try:
+                queued = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if (
+                queued is None
+                or length + len(BATCH_SEPARATOR) + len(queued.message) > max_length
+            ):
+                carried.append(queued)
+                break
+            jobs.append(queued)
+            length += len(BATCH_SEPARATOR) + len(queued.message)
+        if len(jobs) == 1:
+            return job, carried
+        notifications_batched_total.labels(**self.channel.labels).inc(len(jobs) - 1)
+        merged = _Job(
+            BATCH_SEPARATOR.join(queued.message for queued in jobs),
+            job.enqueued_at,
+            count=sum(queued.count for queued in jobs),
+            ids=tuple(number for queued in jobs for number in queued.ids),
+            attempts=max(queued.attempts for queued in jobs),
+        )
+        return merged, carried
+
+    def _deliver(self, job: _Job) -> None:
+        if job.ids and self.outbox is not None:
+            try:
+                self._deliver_stored(job, self.outbox)
+            finally:
+                with self._lock:
+                    self._in_flight.difference_update(job.ids)
+            return
+
+        channel = self.channel
+        for attempt in range(channel.retries + 1):
+            if self._abort.is_set():
+                notifications_dropped_total.labels(
+                    **channel.labels, reason="shutdown"
+                ).inc(job.count)
+                return
+            try:
+                channel.send(job.message, channel.timeout)
+            except Exception as exc:
+                if attempt == channel.retries:
+                    logger.error(
+                        "Failed to send notification via %s after %s attempts: %s",
+                        channel.name,
+                        attempt + 1,
+                        exc,
+                    )
+                    break
+                delay = self.retry_backoff * 2**attempt
+                logger.warning(
+                    "Failed to send notification via %s (%s); retrying in %.0fs",
+                    channel.name,
+                    exc,
+                    delay,
+                )
+                notification_retries_total.labels(**channel.labels).inc()
+                self._abort.wait(delay)
+                continue
+
+            notifications_sent_total.labels(**channel.labels, status="success").inc(
+                job.count
+            )
+            notification_delivery_seconds.labels(**channel.labels).observe(
+                time.monotonic() - job.enqueued_at
+            )
+            logger.info("Notification sent via %s", channel.name)
+            return
+
+        notifications_sent_total.labels(**channel.labels, status="failed").inc(
+            job.count
+        )
+        notifications_dropped_total.labels(**channel.labels, reason="failed").inc(
+            job.count
+        )
+
+    def _deliver_stored(self, job: _Job, outbox: StateStore) -> None:
+        channel = self.channel
+        if self._abort.is_set():
+            # Left in the outbox for the next run.
+            return
+        try:
+            channel.send(job.message, channel.timeout)
+        except Exception as exc:
+            delay = min(self.retry_backoff * 2**job.attempts, MAX_RETRY_BACKOFF)
+            logger.warning(
+                "Failed to send notification via %s (%s); retrying in %.0fs",
+                channel.name,
+                exc,
+                delay,
+            )
+            notification_retries_total.labels(**channel.labels).inc()
+            outbox.retry_notifications(job.ids, _utcnow() + timedelta(seconds=delay))
+            return
+
+        # A crash before this line sends the message again on the next run.
+        outbox.complete_notifications(job.ids)
+        notifications_sent_total.labels(**channel.labels, status="success").inc(
+            job.count
+        )
+        notification_delivery_seconds.labels(**channel.labels).observe(
+            time.monotonic() - job.enqueued_at
+        )
+        logger.info("Notification sent via %s", channel.name)
+
+
+def _utcnow() -> datetime:
+    # The state stores keep naive UTC timestamps.
+    return datetime.now(UTC).replace(tzinfo=None)
+
+
+class Notifier:
+    """Fan notifications out to every channel.
+
+    Each channel has its own :class:`NotificationDispatcher`, with its own
+    queue, workers, timeout and retries, so channels are sent to concurrently:
+    a notification reaches all of them after the slowest channel's latency
+    rather than the sum, and a failing channel never holds the others back.
+    """
+
+    def __init__(self, dispatchers: Sequence[NotificationDispatcher]) -> None:
+        if not dispatchers:
+            raise ValueError("At least one notification channel is required")
+        self.dispatchers = list(dispatchers)
+        self.channels = [dispatcher.channel.name for dispatcher in dispatchers]
+        # Dispatchers of one notifier share the state store's outbox.
+        self.outbox = dispatchers[0].outbox
+
+    def __enter__(self) -> Notifier:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def submit(self, message: str) -> bool:
+        """Queue ``message`` on every channel; ``False`` if any dropped it."""
+
+        accepted = [dispatcher.submit(message) for dispatcher in self.dispatchers]
+        return all(accepted)
+
+    def wake(self) -> None:
+        """Have every channel check the outbox for due notifications now."""
+
+        for dispatcher in self.dispatchers:
+            dispatcher.wake()
+
+    def close(self, timeout: float = DEFAULT_DRAIN_TIMEOUT) -> None:
+        """Close every dispatcher, sharing ``timeout`` between them.
+
+        Channels keep delivering while earlier ones are closed, so the drain
+        takes as long as the slowest channel.
+        """
+
+        deadline = time.monotonic() + timeout
+        for dispatcher in self.dispatchers:
+            dispatcher.close(max(0.0, deadline - time.monotonic()))
+
+
+def create_notifier(
+    settings: MonitorSettings, state_store: StateStore | None = None
+) -> Notifier:
+    """Start a dispatcher for each configured notification channel.
+
+    Unless ``P24_NOTIFICATION_OUTBOX`` is off, they deliver the outbox of
+    ``state_store``. Outbox messages of channels no longer configured are
+    dropped.
+    """
+
+    channels = create_channels(settings)
+    outbox = state_store if settings.notification_outbox else None
+    if outbox is not None:
+        dropped = outbox.prune_notifications([channel.name for channel in channels])
+        if dropped:
+            logger.warning(
+                "Dropped %s outbox notifications of channels no longer configured",
+                dropped,
+            )
+    return Notifier(
+        [
+            NotificationDispatcher(
+                channel,
+                workers=settings.notification_workers,
+                max_queue=settings.notification_queue_size,
+                outbox=outbox,
+            )
+            for channel in channels
+        ]
+    )
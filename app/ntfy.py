@@ -1,17 +1,35 @@
 import logging
 
-import requests
+from app.http_client import HttpClient, get_http_client
+
+# Longest message ntfy.sh shows as text (it counts bytes; listing messages are
+# nearly all ASCII). Longer messages arrive as an attachment.
+MAX_MESSAGE_LENGTH = 4096
 
 logger = logging.getLogger(__name__)
 
 
-def send_message(server: str, topic: str, message: str) -> None:
-    """Send a message via the ntfy service."""
+def send_message(
+    server: str,
+    topic: str,
+    message: str,
+    client: HttpClient | None = None,
+    timeout: float | None = None,
+) -> None:
+    """Send a message via the ntfy service.
+
+    Raises ``requests.RequestException`` if the request fails or the server
+    rejects it. ``timeout`` defaults to the HTTP client's timeout.
+    """
 
     url = f"{server}/{topic}"
     logger.info("Sending message to %s: %s", url, message)
-    response = requests.post(url, data=message.encode("utf-8"))
+    client = client or get_http_client()
+    response = client.post(
+        url, data=message.encode("utf-8"), timeout=timeout or client.timeout
+    )
     logger.info("Response status code: %s", response.status_code)
+    response.raise_for_status()
 
 
 def main() -> None:
@@ -5,16 +5,27 @@ from __future__ import annotations
 import logging
 import math
 import re
-from typing import Iterable, Mapping, Sequence
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Collection, Generator, Iterable, Iterator, Mapping, Sequence
 from urllib.parse import urlencode
 
 import requests
 
-from app.state import DuckDBStateStore
+from app.bloom import SeenListingIndex
+from app.http_cache import ResponseCache, content_digest
+from app.http_client import get_http_client
+from app.state import StateStore, listing_id
 
 BASE_URL = "https://www.property24.com"
 ADVANCED_SEARCH_PATH = "/to-rent/advanced-search/results"
 PAGE_SIZE = 20
+NEWEST_SORT = "Newest"
+SORT_ORDERS: tuple[str | None, ...] = (None, NEWEST_SORT)
+DELTA_MARGIN_PAGES = 1
+PAGE_TIMEOUT = 15
 
 # Mapping of Property24 property type identifiers to query parameter values.
 PROPERTY_CATEGORY_MAP = {
@@ -32,8 +43,9 @@ PROPERTY_CATEGORY_MAP = {
     12: "FlatShare",
 }
 
-LISTING_NUMBER_PATTERN = re.compile(r'data-listing-number="(\d+)"')
-LISTING_HREF_PATTERN = re.compile(r'href="(?P<path>/to-rent/[^"?#]+/(?P<number>\d+))"')
+LISTING_NUMBER_MARKER = b'data-listing-number="'
+LISTING_HREF_MARKER = b'href="/to-rent/'
+LISTING_PATH_PREFIX = "/to-rent/"
 
 logger = logging.getLogger(__name__)
 
@@ -144,27 +156,29 @@ def _coerce_numeric_query_value(data: object) -> str | None:
     return None
 
 
-def _build_standard_listing_page_url(
+def _build_standard_page_template(
     payload: Mapping[str, object],
-    page: int,
-) -> str:
+    categories: str,
+    sort: str | None,
+) -> tuple[str, str]:
     base_path = _build_listing_path(payload).rstrip("/")
-    page_path = f"{base_path}/p{page}"
 
     query_params: list[tuple[str, str]] = []
-    categories = _build_property_categories(payload)
+    if sort:
+        query_params.append(("sp", f"so={sort}"))
     if categories:
-        query_params.append(("PropertyCategory", ",".join(categories)))
+        query_params.append(("PropertyCategory", categories))
 
     query_string = urlencode(query_params)
     suffix = f"?{query_string}" if query_string else ""
-    return f"{BASE_URL}{page_path}{suffix}"
+    return f"{BASE_URL}{base_path}/p", suffix
 
 
 def _build_advanced_search_url(
     payload: Mapping[str, object],
-    page: int,
     auto_complete_items: Sequence[Mapping[str, object]],
+    categories: str,
+    sort: str | None,
 ) -> str:
     location_ids = _extract_location_ids(auto_complete_items)
     if not location_ids:
@@ -176,125 +190,616 @@ def _build_advanced_search_url(
         value = _coerce_numeric_query_value(payload.get(source_key))
         if value is not None:
             sp_pairs.append((target_key, value))
+    if sort:
+        sp_pairs.append(("so", sort))
 
     sp_value = "&".join(f"{key}={value}" for key, value in sp_pairs)
 
     query_params: list[tuple[str, str]] = [("sp", sp_value)]
-    categories = _build_property_categories(payload)
     if categories:
-        query_params.append(("PropertyCategory", ",".join(categories)))
-    if page > 1:
-        query_params.append(("Page", str(page)))
+        query_params.append(("PropertyCategory", categories))
 
-    query_string = urlencode(query_params)
-    suffix = f"?{query_string}" if query_string else ""
-    return f"{BASE_URL}{ADVANCED_SEARCH_PATH}{suffix}"
+    return f"{BASE_URL}{ADVANCED_SEARCH_PATH}?{urlencode(query_params)}"
+
+
+@dataclass(frozen=True, slots=True)
+class SearchPlan:
+    """Listing page URL builder compiled once from a search payload.
 
+    Compiling validates the payload and caches the category string and a URL
+    template per sort order, so building a page URL is a string format.
+    """
 
-def _build_listing_page_url(payload: Mapping[str, object], page: int) -> str:
-    auto_complete_items = _normalize_auto_complete_items(payload)
-    if len(auto_complete_items) > 1:
-        return _build_advanced_search_url(payload, page, auto_complete_items)
+    payload: Mapping[str, object]
+    categories: str
+    advanced: bool
+    templates: Mapping[str | None, tuple[str, str]]
 
-    return _build_standard_listing_page_url(payload, page)
+    @classmethod
+    def from_payload(cls, payload: Mapping[str, object]) -> SearchPlan:
+        """Validate ``payload`` and compile its listing page URL templates.
 
+        Raises ``RuntimeError`` when the payload cannot produce listing URLs.
+        """
+
+        categories = ",".join(_build_property_categories(payload))
+        auto_complete_items = _normalize_auto_complete_items(payload)
+        advanced = len(auto_complete_items) > 1
+
+        templates: dict[str | None, tuple[str, str]] = {}
+        for sort in SORT_ORDERS:
+            if advanced:
+                url = _build_advanced_search_url(
+                    payload, auto_complete_items, categories, sort
+                )
+                templates[sort] = (url, "")
+            else:
+                templates[sort] = _build_standard_page_template(
+                    payload, categories, sort
+                )
 
-def _extract_listing_urls(html: str, valid_numbers: Iterable[str]) -> list[str]:
-    valid_set = set(valid_numbers)
-    urls: list[str] = []
+        return cls(
+            payload=payload,
+            categories=categories,
+            advanced=advanced,
+            templates=templates,
+        )
 
-    for match in LISTING_HREF_PATTERN.finditer(html):
-        number = match.group("number")
-        if valid_set and number not in valid_set:
+    @classmethod
+    def coerce(cls, payload: Mapping[str, object] | SearchPlan) -> SearchPlan:
+        if isinstance(payload, SearchPlan):
+            return payload
+        return cls.from_payload(payload)
+
+    def page_url(self, page: int, sort: str | None = None) -> str:
+        try:
+            prefix, suffix = self.templates[sort]
+        except KeyError:
+            raise ValueError(f"Unsupported sort order: {sort}") from None
+
+        if self.advanced:
+            return prefix if page <= 1 else f"{prefix}&Page={page}"
+        return f"{prefix}{page}{suffix}"
+
+
+ListingLinks = dict[tuple[int, str], None]
+
+
+def _scan_listing_page(content: bytes) -> tuple[set[int], ListingLinks]:
+    """Scan raw page bytes once for listing numbers and listing links.
+
+    Two ``bytes.find`` cursors (number attributes and listing hrefs) advance
+    through the page in a single forward pass, so only matched values are
+    decoded. Returns the ``data-listing-number`` values and an ordered set of
+    ``(number, path)`` link pairs.
+    """
+
+    numbers: set[int] = set()
+    links: ListingLinks = {}
+    find = content.find
+    number_at = find(LISTING_NUMBER_MARKER)
+    href_at = find(LISTING_HREF_MARKER)
+
+    while number_at != -1 or href_at != -1:
+        if href_at == -1 or (number_at != -1 and number_at < href_at):
+            start = number_at + len(LISTING_NUMBER_MARKER)
+            end = find(b'"', start)
+            if end == -1:
+                break
+            value = content[start:end]
+            if value.isdigit():
+                numbers.add(int(value))
+            number_at = find(LISTING_NUMBER_MARKER, end)
+        else:
+            start = href_at + len(b'href="')
+            end = find(b'"', start)
+            if end == -1:
+                break
+            path = content[start:end]
+            slash = path.rfind(b"/")
+            value = path[slash + 1 :]
+            if (
+                slash > len(LISTING_PATH_PREFIX)
+                and value.isdigit()
+                and b"?" not in path
+                and b"#" not in path
+            ):
+                links[(int(value), path.decode("utf-8", "replace"))] = None
+            href_at = find(LISTING_HREF_MARKER, end)
+
+    return numbers, links
+
+
+def _extract_listing_urls(links: ListingLinks, valid_numbers: set[int]) -> list[str]:
+    urls: dict[str, None] = {}
+    for number, path in links:
+        if valid_numbers and number not in valid_numbers:
             continue
-        path = match.group("path")
-        absolute = f"{BASE_URL}{path}"
-        if absolute not in urls:
-            urls.append(absolute)
-    return urls
+        urls[f"{BASE_URL}{path}"] = None
+    return list(urls)
 
 
-def fetch_listing_urls(
-    payload: Mapping[str, object],
+@dataclass(frozen=True, slots=True)
+class ListingPage:
+    """Verified listings from one search result page."""
+
+    page: int
+    numbers: frozenset[int]
+    urls: tuple[str, ...]
+    requests: int
+    elapsed: float
+
+    @property
+    def listing_ids(self) -> tuple[int, ...]:
+        return tuple(listing_id(url) for url in self.urls)
+
+
+class ListingVerifier:
+    """Remember listing numbers verified as genuine across polls.
+
+    Property24 mixes decoy listings into its result pages that change between
+    requests. Once a listing number has survived a double fetch it is persisted
+    as stable, and pages made up only of stable numbers need a single request.
+    """
+
+    def __init__(self, state_store: StateStore) -> None:
+        self.state_store = state_store
+        self._stable: set[int] | None = None
+        self._pending: set[int] = set()
+
+    @property
+    def stable_numbers(self) -> set[int]:
+        return self.load()
+
+    def load(self) -> set[int]:
+        """Read the stable numbers from the state store once.
+
+        Call it on the thread owning the state store before page workers check
+        :meth:`is_stable`.
+        """
+
+        if self._stable is None:
+            self._stable = self.state_store.get_stable_listing_numbers()
+        return self._stable
+
+    def is_stable(self, numbers: set[int]) -> bool:
+        return bool(numbers) and numbers <= self.stable_numbers
+
+    def remember(self, numbers: Iterable[int]) -> None:
+        new_numbers = set(numbers) - self.stable_numbers
+        self.stable_numbers.update(new_numbers)
+        self._pending.update(new_numbers)
+
+    def flush(self) -> None:
+        """Persist numbers verified since the last flush."""
+
+        if self._pending:
+            self.state_store.add_stable_listing_numbers(sorted(self._pending))
+            self._pending.clear()
+
+
+@dataclass(frozen=True, slots=True)
+class _PageBody:
+    """Body of one page request, with its cache digest when a cache is used."""
+
+    content: bytes
+    digest: str | None = None
+    unchanged: bool = False
+
+
+class _PageFetcher:
+    """Submit page requests to a bounded worker pool."""
+
+    def __init__(
+        self,
+        session: requests.Session,
+        max_concurrency: int,
+        max_requests: int,
+        cache: ResponseCache | None = None,
+    ) -> None:
+        self.session = session
+        self.cache = cache
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(1, min(max_concurrency, max_requests)),
+            thread_name_prefix="listing-fetch",
+        )
+
+    def submit(
+        self, page_url: str, page: int, *, cached: bool = False
+    ) -> Future[_PageBody]:
+        return self.executor.submit(self.fetch, page_url, page, cached=cached)
+
+    def fetch(self, page_url: str, page: int, *, cached: bool = False) -> _PageBody:
+        cache = self.cache if cached else None
+        entry = cache.lookup(page_url) if cache is not None else None
+        headers = entry.conditional_headers() if entry is not None else {}
+
+        try:
+            if headers:
+                response = self.session.get(
+                    page_url, timeout=PAGE_TIMEOUT, headers=headers
+                )
+            else:
+                response = self.session.get(page_url, timeout=PAGE_TIMEOUT)
+            if cache is not None and entry is not None and response.status_code == 304:
+                cache.record_hit("not_modified", len(entry.body))
+                return _PageBody(entry.body, entry.digest, unchanged=True)
+            response.raise_for_status()
+        except requests.RequestException as exc:
+            raise RuntimeError(f"Failed to fetch listing page {page}") from exc
+
+        content = response.content
+        if cache is None:
+            return _PageBody(content)
+
+        digest = content_digest(content)
+        if entry is not None and entry.digest == digest:
+            cache.record_hit("content_hash")
+            return _PageBody(content, digest, unchanged=True)
+
+        cache.record_miss()
+        cache.store(
+            page_url,
+            content,
+            digest=digest,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+        )
+        return _PageBody(content, digest)
+
+    def close(self) -> None:
+        # Drop queued page fetches if an earlier page failed.
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+
+class _PendingPage:
+    """First (and optionally second) copy of a listing page in flight.
+
+    The worker fetching the first copy decides whether the page needs a second
+    one and queues it straight away, so second copies of different pages are
+    fetched concurrently rather than one at a time as the consumer reaches
+    each page.
+    """
+
+    def __init__(
+        self,
+        fetcher: _PageFetcher,
+        page_url: str,
+        page: int,
+        *,
+        verifier: ListingVerifier | None,
+        eager_second: bool,
+    ) -> None:
+        self.fetcher = fetcher
+        self.page_url = page_url
+        self.page = page
+        self.verifier = verifier
+        self.eager_second = eager_second
+        self.verified: tuple[frozenset[int], tuple[str, ...]] | None = None
+        self.scanned: tuple[set[int], ListingLinks] = (set(), {})
+        self.second: Future[_PageBody] | None = None
+        self.first = fetcher.executor.submit(self._fetch_first)
+        if eager_second:
+            self.second = fetcher.submit(page_url, page)
+
+    def _fetch_first(self) -> _PageBody:
+        # Only the first copy is revalidated against the cache; the second must
+        # be a fresh download for the dummy-listing comparison to mean anything.
+        first = self.fetcher.fetch(self.page_url, self.page, cached=True)
+        if self._needs_second(first) and not self.eager_second:
+            try:
+                self.second = self.fetcher.submit(self.page_url, self.page)
+            except RuntimeError:
+                # The crawl was closed while this page was in flight.
+                pass
+        return first
+
+    def _needs_second(self, first: _PageBody) -> bool:
+        cache = self.fetcher.cache
+
+        # Unchanged pages reuse the result verified when the body was last seen.
+        if cache is not None and first.unchanged and first.digest is not None:
+            self.verified = cache.verified_result(self.page_url, first.digest)
+            if self.verified is not None:
+                return False
+
+        self.scanned = _scan_listing_page(first.content)
+        # Pages made up only of previously verified listings need one request.
+        return self.verifier is None or not self.verifier.is_stable(self.scanned[0])
+
+    @property
+    def request_count(self) -> int:
+        return 1 if self.second is None else 2
+
+    def verify(self) -> tuple[frozenset[int], tuple[str, ...]]:
+        """Return the verified listing numbers and URLs for the page."""
+
+        first = self.first.result()
+        if self.verified is not None:
+            return self.verified
+
+        numbers, urls = self._verify_content()
+        result = frozenset(numbers), tuple(urls)
+        cache = self.fetcher.cache
+        if cache is not None and first.digest is not None:
+            cache.remember_verified(self.page_url, first.digest, *result)
+        return result
+
+    def _verify_content(self) -> tuple[set[int], list[str]]:
+        numbers1, links1 = self.scanned
+        if self.second is None:
+            return numbers1, _extract_listing_urls(links1, numbers1)
+
+        # Fetch the page a second time to filter out dummy listings.
+        # Property24 includes fake listings that change between requests.
+        numbers2, links2 = _scan_listing_page(self.second.result().content)
+
+        # Only use listings that appear in BOTH responses (filter out dummies)
+        common_numbers = numbers1 & numbers2
+
+        if not common_numbers:
+            logger.warning(
+                "No common listing numbers found on page %s (first=%s, second=%s)",
+                self.page,
+                len(numbers1),
+                len(numbers2),
+            )
+            # Fall back to second response if no overlap
+            common_numbers = numbers2
+        elif self.verifier is not None:
+            self.verifier.remember(common_numbers)
+
+        # Use the second response HTML for extracting URLs
+        return common_numbers, _extract_listing_urls(links2, common_numbers)
+
+
+def iter_listing_pages(
+    payload: Mapping[str, object] | SearchPlan,
     *,
     count: int,
     session: requests.Session | None = None,
-) -> list[str]:
-    """Fetch all listing URLs for the search payload."""
+    max_concurrency: int = 1,
+    verifier: ListingVerifier | None = None,
+    sort: str | None = None,
+    max_pages: int | None = None,
+    cache: ResponseCache | None = None,
+) -> Generator[ListingPage, None, None]:
+    """Yield verified listing pages for the search payload in page order.
+
+    At most ``max_concurrency`` pages are in flight ahead of the consumer, so
+    results can be processed as soon as the first page is verified, memory stays
+    bounded, and closing the generator early stops further requests. Without a
+    ``verifier`` every page is fetched twice; with one, the second copy is only
+    requested for pages containing unverified listings. With a ``cache`` the
+    first copy of each page is a conditional request, and pages whose body is
+    unchanged since they were last verified skip parsing and verification.
+    """
 
     if count < 0:
         raise ValueError("Count cannot be negative")
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
 
+    plan = SearchPlan.coerce(payload)
     total_pages = max(1, math.ceil(count / PAGE_SIZE)) if count else 1
-    local_session: requests.Session | None = None
+    if max_pages is not None:
+        total_pages = max(1, min(total_pages, max_pages))
+
     if session is None:
-        local_session = requests.Session()
-        session = local_session
+        session = get_http_client().session
 
-    urls: list[str] = []
-    seen_numbers: set[str] = set()
+    if verifier is not None:
+        verifier.load()
+    fetcher = _PageFetcher(session, max_concurrency, total_pages * 2, cache)
+    # Request both copies up front only when nothing can make the second one
+    # unnecessary (a stable-listing verifier or an unchanged cached page).
+    eager_second = verifier is None and cache is None
+    pending: deque[tuple[_PendingPage, float]] = deque()
+    next_page = 1
 
     try:
-        for page in range(1, total_pages + 1):
-            page_url = _build_listing_page_url(payload, page)
-
-            # Fetch the page twice to filter out dummy listings
-            # Property24 includes fake listings that change between requests
-            try:
-                response1 = session.get(page_url, timeout=15)
-                response1.raise_for_status()
-                response2 = session.get(page_url, timeout=15)
-                response2.raise_for_status()
-            except requests.RequestException as exc:
-                raise RuntimeError(f"Failed to fetch listing page {page}") from exc
-
-            # Extract listing numbers from both responses
-            numbers1 = set(LISTING_NUMBER_PATTERN.findall(response1.text))
-            numbers2 = set(LISTING_NUMBER_PATTERN.findall(response2.text))
-
-            # Only use listings that appear in BOTH responses (filter out dummies)
-            common_numbers = numbers1 & numbers2
-
-            if not common_numbers:
-                logger.warning(
-                    "No common listing numbers found on page %s (first=%s, second=%s)",
-                    page,
-                    len(numbers1),
-                    len(numbers2),
+        while pending or next_page <= total_pages:
+            while len(pending) < max_concurrency and next_page <= total_pages:
+                pending.append(
+                    (
+                        _PendingPage(
+                            fetcher,
+                            plan.page_url(next_page, sort),
+                            next_page,
+                            verifier=verifier,
+                            eager_second=eager_second,
+                        ),
+                        time.perf_counter(),
+                    )
                 )
-                # Fall back to second response if no overlap
-                common_numbers = numbers2
-
-            seen_numbers.update(common_numbers)
+                next_page += 1
+
+            pending_page, started = pending.popleft()
+            numbers, urls = pending_page.verify()
+            yield ListingPage(
+                page=pending_page.page,
+                numbers=numbers,
+                urls=urls,
+                requests=pending_page.request_count,
+                elapsed=time.perf_counter() - started,
+            )
+    finally:
+        if verifier is not None:
+            verifier.flush()
+        fetcher.close()
 
-            # Use the second response HTML for extracting URLs
-            page_urls = _extract_listing_urls(response2.text, common_numbers)
-            for url in page_urls:
-                if url not in urls:
-                    urls.append(url)
 
-        if count and len(urls) < count:
-            logger.debug(
-                "Extracted %s listing URLs but count is %s (pages=%s)",
-                len(urls),
-                count,
-                total_pages,
-            )
+def fetch_listing_urls(
+    payload: Mapping[str, object] | SearchPlan,
+    *,
+    count: int,
+    session: requests.Session | None = None,
+    max_concurrency: int = 1,
+    verifier: ListingVerifier | None = None,
+    cache: ResponseCache | None = None,
+) -> list[str]:
+    """Fetch all listing URLs for the search payload in page order."""
+
+    urls: dict[str, None] = {}
+    pages = 0
+    for listing_page in iter_listing_pages(
+        payload,
+        count=count,
+        session=session,
+        max_concurrency=max_concurrency,
+        verifier=verifier,
+        cache=cache,
+    ):
+        urls.update(dict.fromkeys(listing_page.urls))
+        pages += 1
+
+    if count and len(urls) < count:
+        logger.debug(
+            "Extracted %s listing URLs but count is %s (pages=%s)",
+            len(urls),
+            count,
+            pages,
+        )
+    return list(urls)
+
+
+def fetch_recent_listing_urls(
+    payload: Mapping[str, object] | SearchPlan,
+    *,
+    delta: int,
+    known_ids: Collection[int],
+    session: requests.Session | None = None,
+    margin_pages: int = DELTA_MARGIN_PAGES,
+    max_concurrency: int = 1,
+    verifier: ListingVerifier | None = None,
+    cache: ResponseCache | None = None,
+) -> list[str]:
+    """Fetch the newest listing URLs implied by a count increase of ``delta``.
+
+    Pages are requested newest-first and the crawl stops at the first page whose
+    listings are all in ``known_ids``, or after the pages the delta spans plus
+    ``margin_pages``.
+    """
+
+    if delta < 0:
+        raise ValueError("Delta cannot be negative")
+
+    max_pages = math.ceil(max(delta, 1) / PAGE_SIZE) + max(margin_pages, 0)
+    urls: dict[str, None] = {}
+    pages = iter_listing_pages(
+        payload,
+        count=max_pages * PAGE_SIZE,
+        session=session,
+        max_concurrency=max_concurrency,
+        verifier=verifier,
+        sort=NEWEST_SORT,
+        cache=cache,
+    )
+    try:
+        for listing_page in pages:
+            urls.update(dict.fromkeys(listing_page.urls))
+            if not listing_page.urls or all(
+                number in known_ids for number in listing_page.listing_ids
+            ):
+                logger.debug(
+                    "Stopping recent listing crawl after page %s", listing_page.page
+                )
+                break
     finally:
-        if local_session is not None:
-            local_session.close()
+        pages.close()
 
-    return urls
+    return list(urls)
 
 
 class ListingTracker:
-    """Track listing URLs across runs and identify new entries."""
+    """Track listings across runs and identify new entries.
+
+    Listings are compared by their integer listing ids; URLs are only looked up
+    again (see :meth:`listing_urls`) when a notification needs them. With a
+    ``seen_index``, listings that drop out of the search and come back later
+    are not reported as new a second time.
+    """
 
-    def __init__(self, state_store: DuckDBStateStore) -> None:
+    def __init__(
+        self, state_store: StateStore, seen_index: SeenListingIndex | None = None
+    ) -> None:
         self.state_store = state_store
+        self.seen_index = seen_index
 
     def load_previous(self) -> list[str]:
         return self.state_store.get_current_listings()
 
-    def record(self, urls: Sequence[str]) -> list[str]:
-        return self.state_store.update_current_listings(urls)
+    def load_previous_ids(self) -> set[int]:
+        return self.state_store.get_current_listing_ids()
+
+    def listing_urls(self, listing_ids: Sequence[int]) -> list[str]:
+        return self.state_store.get_listing_urls(listing_ids)
+
+    def record(self, urls: Sequence[str]) -> list[int]:
+        return self._first_seen(self._replace(urls))
+
+    def _replace(self, urls: Sequence[str]) -> list[int]:
+        diff = self.state_store.replace_current_listings(urls)
+        logger.debug(
+            "Snapshot updated: %s added, %s removed, %s retained",
+            len(diff.added),
+            len(diff.removed),
+            len(diff.retained),
+        )
+        return diff.added
+
+    def _unseen(self, listing_ids: list[int]) -> list[int]:
+        if self.seen_index is None or not listing_ids:
+            return listing_ids
+        unseen = self.seen_index.unseen(listing_ids)
+        if len(unseen) < len(listing_ids):
+            logger.debug(
+                "Ignoring %s re-listed listings", len(listing_ids) - len(unseen)
+            )
+        return unseen
+
+    def _first_seen(self, added: list[int]) -> list[int]:
+        unseen = self._unseen(added)
+        if self.seen_index is not None:
+            self.seen_index.add(unseen)
+        return unseen
+
+    def record_pages(
+        self, pages: Iterable[ListingPage]
+    ) -> Iterator[tuple[ListingPage, list[int]]]:
+        """Yield each page with its new listing ids, then store the snapshot.
+
+        The snapshot is only replaced once every page has been consumed, so a
+        consumer that stops early leaves the stored state untouched.
+        """
+
+        known_ids = self.load_previous_ids()
+        listings: dict[int, str] = {}
+        unseen: list[int] = []
+        for listing_page in pages:
+            new_ids: list[int] = []
+            for number, url in zip(
+                listing_page.listing_ids, listing_page.urls, strict=True
+            ):
+                if number in listings:
+                    continue
+                listings[number] = url
+                if number not in known_ids:
+                    new_ids.append(number)
+            new_ids = self._unseen(new_ids)
+            unseen.extend(new_ids)
+            yield listing_page, new_ids
+        self._replace(list(listings.values()))
+        if self.seen_index is not None:
+            self.seen_index.add(unseen)
+
+    def record_recent(self, urls: Sequence[str]) -> list[int]:
+        """Merge a partial newest-first crawl into the current snapshot."""
+
+        recent: dict[int, str] = {}
+        for url in urls:
+            recent.setdefault(listing_id(url), url)
+        retained = [
+            url for url in self.load_previous() if listing_id(url) not in recent
+        ]
+        return self._first_seen(self._replace([*recent.values(), *retained]))
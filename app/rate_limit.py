@@ -0,0 +1,56 @@
+"""Token bucket rate limiting shared by worker threads."""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Callable
+
+
+class TokenBucket:
+    """Hand out ``rate`` tokens per second, allowing bursts of ``capacity``.
+
+    :meth:`acquire` reserves a token and sleeps until it is due, so callers on
+    several threads are served in the order they asked, without polling.
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: float = 1.0,
+        *,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if rate <= 0:
+            raise ValueError(f"rate must be positive: {rate}")
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = clock()
+        self._not_before = 0.0
+
+    def acquire(self) -> float:
+        """Take a token, waiting for it if needed; returns the seconds waited."""
+
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+            # A negative balance is a queue of reservations not yet due.
+            self._tokens -= 1
+            wait = max(self._not_before - now, -self._tokens / self.rate, 0.0)
+        if wait:
+            self._sleep(wait)
+        return wait
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for the next ``seconds`` seconds."""
+
+        with self._lock:
+            self._not_before = max(self._not_before, self._clock() + seconds)
@@ -0,0 +1,115 @@
+"""Priority-queue scheduler for polling many searches from one process."""
+
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable
+
+DEFAULT_WORKERS = 4
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Job:
+    name: str
+    func: Callable[[], None]
+    interval: float
+
+
+class SearchScheduler:
+    """Run recurring jobs ordered by their next due time.
+
+    Due jobs are taken from a heap and run on a bounded worker pool. A job is
+    only rescheduled once its run finishes, so a slow search never overlaps
+    with itself, and its next run is measured from when the previous one
+    started.
+    """
+
+    def __init__(self, max_workers: int = DEFAULT_WORKERS) -> None:
+        self.max_workers = max(1, max_workers)
+        self._heap: list[tuple[float, int, _Job]] = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._stopped = False
+
+    def __len__(self) -> int:
+        with self._condition:
+            return len(self._heap)
+
+    def add(
+        self,
+        name: str,
+        func: Callable[[], None],
+        interval: float,
+        *,
+        delay: float = 0.0,
+    ) -> None:
+        self._push(time.monotonic() + delay, _Job(name, func, interval))
+
+    def stop(self) -> None:
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+
+    def run(self) -> None:
+        """Run jobs until :meth:`stop` is called."""
+
+        executor = ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="search"
+        )
+        try:
+            while True:
+                job = self._next_due()
+                if job is None:
+                    return
+                executor.submit(self._run_and_reschedule, job)
+        finally:
+            self.stop()
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def run_once(self) -> None:
+        """Run every scheduled job once and wait for all of them to finish."""
+
+        with self._condition:
+            jobs = [job for _, _, job in sorted(self._heap)]
+        with ThreadPoolExecutor(
+            max_workers=self.max_workers, thread_name_prefix="search"
+        ) as executor:
+            for job in jobs:
+                executor.submit(self._invoke, job)
+
+    def _push(self, due: float, job: _Job) -> None:
+        with self._condition:
+            heapq.heappush(self._heap, (due, next(self._sequence), job))
+            self._condition.notify()
+
+    def _next_due(self) -> _Job | None:
+        with self._condition:
+            while not self._stopped:
+                now = time.monotonic()
+                if self._heap and self._heap[0][0] <= now:
+                    return heapq.heappop(self._heap)[2]
+                timeout = self._heap[0][0] - now if self._heap else None
+                self._condition.wait(timeout)
+            return None
+
+    def _invoke(self, job: _Job) -> None:
+        try:
+            job.func()
+        except Exception:
+            logger.exception("Search %s failed", job.name)
+
+    def _run_and_reschedule(self, job: _Job) -> None:
+        started = time.monotonic()
+        self._invoke(job)
+        with self._condition:
+            if self._stopped:
+                return
+        self._push(started + job.interval, job)
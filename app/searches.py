@@ -0,0 +1,116 @@
+"""Search definitions for monitoring several areas from one process."""
+
+from __future__ import annotations
+
+import json
+import logging
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Mapping
+
+from app.config import MIN_POLL_INTERVAL
+from app.property24 import SearchPlan
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True, slots=True)
+class SearchConfig:
+    """A search payload with its own identifier, label and poll interval.
+
+    A ``search_id`` of ``None`` is the single search configured through
+    ``P24_PAYLOAD_FILE``, whose state keeps its unscoped keys.
+    """
+
+    search_id: str | None
+    location_name: str
+    poll_interval: float
+    plan: SearchPlan
+
+
+def load_search_payload(path: Path) -> Mapping[str, object]:
+    """Load the search payload from disk."""
+
+    try:
+        with path.open(encoding="utf-8") as payload_file:
+            payload = json.load(payload_file)
+    except FileNotFoundError as exc:
+        raise RuntimeError(f"Payload file not found: {path}") from exc
+    except json.JSONDecodeError as exc:
+        raise RuntimeError(f"Invalid JSON content in payload file: {path}") from exc
+
+    if not isinstance(payload, dict):
+        raise RuntimeError("Payload file must contain a JSON object")
+
+    return payload
+
+
+def load_search_config(path: Path, *, default_poll_interval: float) -> SearchConfig:
+    """Load one search definition.
+
+    The file is either a plain search payload, or an object with a ``payload``
+    key and optional ``id``, ``location_name`` and ``poll_interval`` keys. The
+    file name (without extension) is the default id and location label.
+    """
+
+    data = load_search_payload(path)
+    payload = data.get("payload")
+    if isinstance(payload, dict):
+        options = data
+    else:
+        payload, options = data, {}
+
+    search_id = str(options.get("id") or path.stem)
+    location_name = str(options.get("location_name") or search_id)
+    raw_interval = options.get("poll_interval", default_poll_interval)
+    if isinstance(raw_interval, bool) or not isinstance(raw_interval, (int, float)):
+        raise RuntimeError(f"Invalid poll_interval in search file: {path}")
+    poll_interval = float(raw_interval)
+    if poll_interval < MIN_POLL_INTERVAL:
+        logger.warning(
+            "poll_interval=%s in %s is too low. Using %s seconds instead.",
+            poll_interval,
+            path,
+            MIN_POLL_INTERVAL,
+        )
+        poll_interval = MIN_POLL_INTERVAL
+
+    return SearchConfig(
+        search_id=search_id,
+        location_name=location_name,
+        poll_interval=poll_interval,
+        plan=SearchPlan.from_payload(payload),
+    )
+
+
+def load_searches(
+    paths: str | Path, *, default_poll_interval: float
+) -> list[SearchConfig]:
+    """Load searches from a comma-separated list of JSON files or directories.
+
+    Directories contribute every ``*.json`` file they contain, in name order.
+    """
+
+    files: list[Path] = []
+    for part in str(paths).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        path = Path(part)
+        if path.is_dir():
+            files.extend(sorted(path.glob("*.json")))
+        else:
+            files.append(path)
+
+    if not files:
+        raise RuntimeError(f"No search files found in: {paths}")
+
+    searches: list[SearchConfig] = []
+    seen: set[str | None] = set()
+    for file in files:
+        search = load_search_config(file, default_poll_interval=default_poll_interval)
+        if search.search_id in seen:
+            raise RuntimeError(f"Duplicate search id: {search.search_id}")
+        seen.add(search.search_id)
+        searches.append(search)
+    return searches
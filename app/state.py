@@ -1,189 +1,238 @@
-"""DuckDB-backed persistence for Property24 bot state."""
+"""State store interface shared by the DuckDB, SQLite and in-memory backends."""
 
 from __future__ import annotations
 
-import logging
+import json
+from contextlib import AbstractContextManager
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
 from pathlib import Path
-from typing import Iterable, Sequence
+from typing import TYPE_CHECKING, Iterable, Iterator, Protocol, Self, Sequence
 
-import duckdb
+if TYPE_CHECKING:
+    from app.state_duckdb import DuckDBStateStore as DuckDBStateStore
 
 DEFAULT_STATE_FILE = Path("data/state.duckdb")
+# Rows pulled per ``fetchmany`` call when streaming a snapshot.
+DEFAULT_FETCH_SIZE = 1000
+SNAPSHOTS = ("current", "previous", "new")
+# ``search_id`` value of the unnamed search configured by ``P24_PAYLOAD_FILE``.
+DEFAULT_SEARCH_ID = ""
 
-logger = logging.getLogger(__name__)
-
-
-class DuckDBStateStore:
-    """Persist bot state (counts and listing snapshots) in DuckDB."""
-
-    def __init__(self, path: Path = DEFAULT_STATE_FILE) -> None:
-        self.path = path
-        self._initialise()
-
-    def _connect(self) -> duckdb.DuckDBPyConnection:
-        if self.path.parent and self.path.parent != Path(""):
-            self.path.parent.mkdir(parents=True, exist_ok=True)
-        return duckdb.connect(str(self.path))
-
-    def _initialise(self) -> None:
-        connection = self._connect()
-        try:
-            connection.execute(
-                """
-                CREATE TABLE IF NOT EXISTS metadata (
-                    key TEXT PRIMARY KEY,
-                    value TEXT
-                )
-                """
-            )
-            connection.execute(
-                """
-                CREATE TABLE IF NOT EXISTS listings (
-                    snapshot TEXT,
-                    position INTEGER,
-                    url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (snapshot, position)
-                )
-                """
-            )
-            connection.execute(
-                """
-                CREATE INDEX IF NOT EXISTS listings_snapshot_position_idx
-                ON listings (snapshot, position)
-                """
-            )
-        finally:
-            connection.close()
-
-    def get_property_count(self) -> int:
-        connection = self._connect()
-        try:
-            row = connection.execute(
-                "SELECT value FROM metadata WHERE key = 'property_count'"
-            ).fetchone()
-            if row is None:
-                return 0
-
-            raw_value = row[0]
-            try:
-                return int(raw_value)
-            except (TypeError, ValueError):
-                logger.warning(
-                    "Invalid property count '%s' in state store; resetting to 0.",
-                    raw_value,
-                )
-                connection.execute("DELETE FROM metadata WHERE key = 'property_count'")
-                connection.execute(
-                    "INSERT INTO metadata (key, value) VALUES (?, ?)",
-                    ("property_count", "0"),
-                )
-                return 0
-        finally:
-            connection.close()
-
-    def set_property_count(self, value: int) -> None:
-        connection = self._connect()
-        try:
-            connection.execute("DELETE FROM metadata WHERE key = 'property_count'")
-            connection.execute(
-                "INSERT INTO metadata (key, value) VALUES (?, ?)",
-                ("property_count", str(value)),
-            )
-        finally:
-            connection.close()
-
-    def _snapshot_urls(self, snapshot: str) -> list[str]:
-        connection = self._connect()
-        try:
-            rows = connection.execute(
-                "SELECT url FROM listings WHERE snapshot = ? ORDER BY position",
-                (snapshot,),
-            ).fetchall()
-            return [row[0] for row in rows]
-        finally:
-            connection.close()
-
-    def get_current_listings(self) -> list[str]:
-        return self._snapshot_urls("current")
-
-    def get_previous_listings(self) -> list[str]:
-        return self._snapshot_urls("previous")
-
-    def get_new_listings(self) -> list[str]:
-        return self._snapshot_urls("new")
-
-    def update_current_listings(self, urls: Sequence[str]) -> list[str]:
-        urls_list = list(urls)
-        connection = self._connect()
-        try:
-            connection.execute("BEGIN")
-            existing_rows = connection.execute(
-                "SELECT position, url FROM listings WHERE snapshot = 'current' "
-                "ORDER BY position"
-            ).fetchall()
-
-            connection.execute("DELETE FROM listings WHERE snapshot = 'previous'")
-            for index, (_, url) in enumerate(existing_rows):
-                connection.execute(
-                    "INSERT INTO listings (snapshot, position, url) VALUES (?, ?, ?)",
-                    ("previous", index, url),
-                )
-
-            connection.execute("DELETE FROM listings WHERE snapshot = 'current'")
-            for index, url in enumerate(urls_list):
-                connection.execute(
-                    "INSERT INTO listings (snapshot, position, url) VALUES (?, ?, ?)",
-                    ("current", index, url),
-                )
-
-            previous_urls = [row[1] for row in existing_rows]
-            previous_set = set(previous_urls)
-            new_urls = [url for url in urls_list if url not in previous_set]
-
-            connection.execute("DELETE FROM listings WHERE snapshot = 'new'")
-            for index, url in enumerate(new_urls):
-                connection.execute(
-                    "INSERT INTO listings (snapshot, position, url) VALUES (?, ?, ?)",
-                    ("new", index, url),
-                )
-
-            connection.execute("COMMIT")
-        except Exception:  # pragma: no cover - defensive
-            connection.execute("ROLLBACK")
-            raise
-        finally:
-            connection.close()
-
-        return new_urls
-
-    def reset(self) -> None:
-        """Clear all stored state."""
-
-        connection = self._connect()
-        try:
-            connection.execute("DELETE FROM metadata")
-            connection.execute("DELETE FROM listings")
-        finally:
-            connection.close()
-
-    def ensure_file(self) -> None:
-        """Ensure the underlying database file exists on disk."""
-
-        # Connecting already creates the file if needed.
-        connection = self._connect()
-        connection.close()
-
-    def iterate_snapshot(self, snapshot: str) -> Iterable[str]:
-        """Yield URLs for a snapshot without loading all in memory."""
-
-        connection = self._connect()
-        try:
-            result = connection.execute(
-                "SELECT url FROM listings WHERE snapshot = ? ORDER BY position",
-                (snapshot,),
-            )
-            for row in result.fetchall():
-                yield row[0]
-        finally:
-            connection.close()
+
+@dataclass(slots=True)
+class ListingDiff:
+    """Listing ids added, removed and retained by a snapshot update."""
+
+    added: list[int] = field(default_factory=list)
+    removed: list[int] = field(default_factory=list)
+    retained: list[int] = field(default_factory=list)
+
+
+@dataclass(frozen=True, slots=True)
+class OutboxMessage:
+    """A notification stored in the outbox until it is delivered."""
+
+    id: int
+    message: str
+    created_at: datetime
+    # Failed deliveries so far.
+    attempts: int = 0
+
+
+@dataclass(frozen=True, slots=True)
+class PendingDigest:
+    """New listings collected in a digest window that has not closed yet."""
+
+    # Property count of the last poll in the window.
+    count: int
+    listing_ids: list[int]
+    polls: int
+    # When the window opened, in seconds since the epoch.
+    opened_at: float
+
+
+def encode_digest(digest: PendingDigest) -> str:
+    """Serialise ``digest`` for the ``metadata`` table."""
+
+    return json.dumps(asdict(digest))
+
+
+def decode_digest(value: str) -> PendingDigest:
+    """Parse a digest stored by :func:`encode_digest`; raises ``ValueError``."""
+
+    try:
+        data = json.loads(value)
+        return PendingDigest(
+            count=int(data["count"]),
+            listing_ids=[int(number) for number in data["listing_ids"]],
+            polls=int(data["polls"]),
+            opened_at=float(data["opened_at"]),
+        )
+    except (KeyError, TypeError, ValueError) as exc:
+        raise ValueError(f"Invalid pending digest: {value!r}") from exc
+
+
+def listing_id(url: str) -> int:
+    """Return the listing number at the end of a listing URL as an integer."""
+
+    number = url.rstrip("/").rpartition("/")[2]
+    if not number.isdigit():
+        raise ValueError(f"Listing URL has no listing number: {url}")
+    return int(number)
+
+
+class StateStore(Protocol):
+    """Persisted monitor state for one search.
+
+    Each poll's listings are recorded with :meth:`replace_current_listings`,
+    which makes the stored ``current`` snapshot the ``previous`` one. Stores
+    returned by :meth:`for_search` share the underlying database, and closing
+    any of them closes it for all.
+    """
+
+    path: Path
+    search_id: str | None
+
+    def __enter__(self) -> Self: ...
+
+    def __exit__(self, *exc_info: object) -> None: ...
+
+    def close(self) -> None: ...
+
+    def for_search(self, search_id: str | None) -> Self: ...
+
+    def ensure_file(self) -> None: ...
+
+    def flush(self) -> None:
+        """Persist buffered writes; stores that write immediately do nothing."""
+        ...
+
+    def atomic(self) -> AbstractContextManager[None]:
+        """Commit the writes made inside the block together or not at all.
+
+        Database backends hold one transaction open for the block, so keep it
+        short; the write-behind cache holds the search's writes back from
+        flushes until the block ends instead.
+        """
+        ...
+
+    def reset(self) -> None: ...
+
+    def prune_history(self, before: datetime) -> int:
+        """Delete listings that left their search before ``before`` (naive UTC)."""
+        ...
+
+    def compact(self) -> None:
+        """Checkpoint the backing file and reclaim free space where worthwhile."""
+        ...
+
+    def get_property_count(self) -> int: ...
+
+    def set_property_count(self, value: int) -> None: ...
+
+    def get_pending_digest(self) -> PendingDigest | None:
+        """Return the search's open digest window, if one is stored."""
+        ...
+
+    def set_pending_digest(self, digest: PendingDigest | None) -> None:
+        """Store the search's open digest window, or clear it with ``None``."""
+        ...
+
+    def get_current_listings(self) -> list[str]: ...
+
+    def get_previous_listings(self) -> list[str]: ...
+
+    def get_new_listings(self) -> list[str]: ...
+
+    def iterate_snapshot(
+        self, snapshot: str, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[str]: ...
+
+    def get_current_listing_ids(self) -> set[int]: ...
+
+    def get_listing_urls(self, listing_ids: Sequence[int]) -> list[str]: ...
+
+    def update_current_listings(self, urls: Sequence[str]) -> list[str]: ...
+
+    def replace_current_listings(self, urls: Sequence[str]) -> ListingDiff: ...
+
+    def iterate_seen_listing_ids(
+        self, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[int]:
+        """Yield every listing id recorded with :meth:`add_seen_listing_ids`."""
+        ...
+
+    def get_seen_listing_ids(self, listing_ids: Sequence[int]) -> set[int]:
+        """Return which of ``listing_ids`` the search has seen before."""
+        ...
+
+    def add_seen_listing_ids(self, listing_ids: Iterable[int]) -> None:
+        """Remember ``listing_ids`` as seen; history retention keeps them."""
+        ...
+
+    def get_stable_listing_numbers(self) -> set[int]: ...
+
+    def add_stable_listing_numbers(self, numbers: Iterable[int]) -> None: ...
+
+    def add_notifications(
+        self, messages: Iterable[str], *, channels: Sequence[str]
+    ) -> None:
+        """Store ``messages`` in the outbox of each channel, due at once."""
+        ...
+
+    def get_due_notifications(
+        self, now: datetime, *, channel: str, limit: int
+    ) -> list[OutboxMessage]:
+        """Return up to ``limit`` messages for ``channel`` due by ``now``.
+
+        Messages of every search come oldest first; ``now`` is naive UTC.
+        """
+        ...
+
+    def prune_notifications(self, channels: Sequence[str]) -> int:
+        """Delete outbox messages of channels not in ``channels``; returns how many."""
+        ...
+
+    def count_notifications(self) -> int:
+        """Return the number of messages in the outbox."""
+        ...
+
+    def complete_notifications(self, ids: Sequence[int]) -> None:
+        """Remove delivered messages from the outbox."""
+        ...
+
+    def retry_notifications(self, ids: Sequence[int], next_attempt: datetime) -> None:
+        """Count a failed delivery and hold the messages until ``next_attempt``."""
+        ...
+
+
+def open_state_store(backend: str, path: Path = DEFAULT_STATE_FILE) -> StateStore:
+    """Open the state store of ``backend`` (``duckdb``, ``sqlite`` or ``memory``).
+
+    Backends are imported on demand, so DuckDB is only loaded when used.
+    """
+
+    if backend == "duckdb":
+        from app.state_duckdb import DuckDBStateStore
+
+        return DuckDBStateStore(path=path)
+    if backend == "sqlite":
+        from app.state_sqlite import SQLiteStateStore
+
+        return SQLiteStateStore(path=path)
+    if backend == "memory":
+        from app.state_memory import MemoryStateStore
+
+        return MemoryStateStore(path=path)
+    raise ValueError(f"Unknown state backend: {backend}")
+
+
+def __getattr__(name: str) -> type[DuckDBStateStore]:
+    # ``DuckDBStateStore`` used to live here; it is still importable from this
+    # module, but only loaded on first use like in :func:`open_state_store`.
+    if name == "DuckDBStateStore":
+        from app import state_duckdb
+
+        return state_duckdb.DuckDBStateStore
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
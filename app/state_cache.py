@@ -0,0 +1,456 @@
+"""Write-behind cache that keeps state reads and writes off the backend."""
+
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+from app.metrics import (
+    state_flush_duration_seconds,
+    state_flush_errors_total,
+    state_pending_writes,
+)
+from app.state import (
+    DEFAULT_FETCH_SIZE,
+    ListingDiff,
+    OutboxMessage,
+    PendingDigest,
+    StateStore,
+    listing_id,
+)
+from app.state_memory import MemoryStateStore
+
+DURABILITY_MODES = ("always", "notify", "interval")
+DEFAULT_FLUSH_INTERVAL = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(slots=True)
+class _Pending:
+    """Writes to one search not yet flushed.
+
+    Later counts, snapshots and digests replace earlier ones; seen ids and
+    outbox messages accumulate.
+    """
+
+    property_count: int | None = None
+    snapshot: list[str] | None = None
+    # ``digest`` is only written when changed, since ``None`` clears it.
+    digest: PendingDigest | None = None
+    digest_changed: bool = False
+    seen: set[int] = field(default_factory=set)
+    # Outbox messages with the channels each is for.
+    notifications: list[tuple[str, tuple[str, ...]]] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class _Cache:
+    """State shared by every ``CachedStateStore`` over one backend."""
+
+    backend: StateStore
+    memory: MemoryStateStore
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    # Serialises flushes so buffered writes reach the backend in order.
+    flush_lock: threading.Lock = field(default_factory=threading.Lock)
+    loaded: set[str | None] = field(default_factory=set)
+    pending: dict[str | None, _Pending] = field(default_factory=dict)
+    pending_stable: set[int] = field(default_factory=set)
+    # Searches inside an ``atomic`` block, which flushes leave buffered.
+    held: dict[str | None, int] = field(default_factory=dict)
+    stop: threading.Event = field(default_factory=threading.Event)
+    flusher: threading.Thread | None = None
+    closed: bool = False
+
+
+class CachedStateStore:
+    """Serve state from memory and write it to ``backend`` in the background.
+
+    Each search's state is loaded from the backend on first use into a
+    :class:`MemoryStateStore`, which then answers every read. Writes update
+    memory at once and are buffered per search, keeping only the latest
+    property count and listing snapshot, so the backend sees at most one
+    snapshot per search per flush.
+
+    ``durability`` decides when buffered writes are flushed:
+
+    * ``always`` flushes after every write (reads are still served from memory);
+    * ``notify`` flushes every ``flush_interval`` seconds and whenever the
+      monitor calls :meth:`flush` before sending a notification;
+    * ``interval`` only flushes on the timer.
+
+    Closing the store always flushes. Snapshots coalesced between flushes are
+    not recorded in the backend's listing history. A search's buffered writes
+    reach the backend in one transaction; outbox messages are the exception
+    to caching and are read from and updated in the backend directly.
+    """
+
+    def __init__(
+        self,
+        backend: StateStore,
+        *,
+        durability: str = "notify",
+        flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+        search_id: str | None = None,
+        _cache: _Cache | None = None,
+    ) -> None:
+        if durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown state durability mode: {durability}")
+        self.path: Path = backend.path
+        self.search_id = search_id
+        self.durability = durability
+        self.flush_interval = flush_interval
+        if _cache is not None:
+            self._cache = _cache
+            return
+
+        self._cache = _Cache(backend=backend, memory=MemoryStateStore(backend.path))
+        self._cache.memory.add_stable_listing_numbers(
+            backend.get_stable_listing_numbers()
+        )
+        if durability != "always":
+            self._cache.flusher = threading.Thread(
+                target=self._flush_periodically,
+                name="state-flush",
+                daemon=True,
+            )
+            self._cache.flusher.start()
+
+    def __enter__(self) -> CachedStateStore:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Stop the flush timer, flush buffered writes and close the backend."""
+
+        cache = self._cache
+        with cache.lock:
+            if cache.closed:
+                return
+            cache.closed = True
+        cache.stop.set()
+        if cache.flusher is not None:
+            cache.flusher.join()
+        try:
+            self.flush()
+        finally:
+            cache.memory.close()
+            cache.backend.close()
+
+    def for_search(self, search_id: str | None) -> CachedStateStore:
+        """Return a store for ``search_id`` sharing this store's cache."""
+
+        return CachedStateStore(
+            self._cache.backend,
+            durability=self.durability,
+            flush_interval=self.flush_interval,
+            search_id=search_id,
+            _cache=self._cache,
+        )
+
+    def _flush_periodically(self) -> None:
+        while not self._cache.stop.wait(self.flush_interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Failed to flush state to %s", self.path)
+
+    def flush(self) -> None:
+        """Write buffered changes to the backend now.
+
+        Searches inside an :meth:`atomic` block stay buffered.
+        """
+
+        cache = self._cache
+        with cache.flush_lock:
+            with cache.lock:
+                pending = {
+                    search_id: writes
+                    for search_id, writes in cache.pending.items()
+                    if search_id not in cache.held
+                }
+                for search_id in pending:
+                    del cache.pending[search_id]
+                stable, cache.pending_stable = cache.pending_stable, set()
+            if not pending and not stable:
+                return
+
+            started = time.perf_counter()
+            try:
+                while pending:
+                    search_id, writes = next(iter(pending.items()))
+                    backend = cache.backend.for_search(search_id)
+                    with backend.atomic():
+                        if writes.snapshot is not None:
+                            backend.replace_current_listings(writes.snapshot)
+                        if writes.property_count is not None:
+                            backend.set_property_count(writes.property_count)
+                        if writes.digest_changed:
+                            backend.set_pending_digest(writes.digest)
+                        if writes.seen:
+                            backend.add_seen_listing_ids(writes.seen)
+                        for message, channels in writes.notifications:
+                            backend.add_notifications([message], channels=channels)
+                    del pending[search_id]
+                if stable:
+                    cache.backend.add_stable_listing_numbers(stable)
+                    stable = set()
+            except BaseException:
+                state_flush_errors_total.inc()
+                self._requeue(pending, stable)
+                raise
+            finally:
+                state_flush_duration_seconds.observe(time.perf_counter() - started)
+                self._update_pending_gauge()
+
+    def _requeue(self, pending: dict[str | None, _Pending], stable: set[int]) -> None:
+        # Writes buffered while the flush ran are newer and take precedence.
+        with self._cache.lock:
+            for search_id, writes in pending.items():
+                current = self._cache.pending.setdefault(search_id, _Pending())
+                if current.snapshot is None:
+                    current.snapshot = writes.snapshot
+                if current.property_count is None:
+                    current.property_count = writes.property_count
+                if not current.digest_changed:
+                    current.digest = writes.digest
+                    current.digest_changed = writes.digest_changed
+                current.seen |= writes.seen
+                current.notifications[:0] = writes.notifications
+            self._cache.pending_stable |= stable
+
+    def _update_pending_gauge(self) -> None:
+        with self._cache.lock:
+            count = len(self._cache.pending) + bool(self._cache.pending_stable)
+        state_pending_writes.set(count)
+
+    def _memory(self) -> MemoryStateStore:
+        """Return the in-memory store of this search, loading it if needed."""
+
+        cache = self._cache
+        memory = cache.memory.for_search(self.search_id)
+        with cache.lock:
+            if cache.closed:
+                raise RuntimeError(f"State store is closed: {self.path}")
+            if self.search_id in cache.loaded:
+                return memory
+            backend = cache.backend.for_search(self.search_id)
+            memory.set_property_count(backend.get_property_count())
+            memory.set_pending_digest(backend.get_pending_digest())
+            # Replaying the previous and current snapshots as two polls gives
+            # the same previous, current and new listings as the backend.
+            previous = backend.get_previous_listings()
+            current = backend.get_current_listings()
+            if previous:
+                memory.replace_current_listings(previous)
+            if previous or current:
+                memory.replace_current_listings(current)
+            cache.loaded.add(self.search_id)
+        return memory
+
+    def _buffer(self, **writes: object) -> None:
+        with self._cache.lock:
+            pending = self._cache.pending.setdefault(self.search_id, _Pending())
+            for name, value in writes.items():
+                setattr(pending, name, value)
+        self._after_write()
+
+    def _after_write(self) -> None:
+        if self.durability == "always":
+            self.flush()
+        else:
+            self._update_pending_gauge()
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        """Keep the search's writes out of flushes until the block ends.
+
+        They then reach the backend together with the next flush, which
+        ``always`` durability runs at once.
+        """
+
+        cache = self._cache
+        with cache.lock:
+            cache.held[self.search_id] = cache.held.get(self.search_id, 0) + 1
+        try:
+            yield
+        finally:
+            with cache.lock:
+                cache.held[self.search_id] -= 1
+                if not cache.held[self.search_id]:
+                    del cache.held[self.search_id]
+        self._after_write()
+
+    def prune_history(self, before: datetime) -> int:
+        self.flush()
+        with self._cache.flush_lock:
+            deleted = self._cache.backend.prune_history(before)
+        # The mirror keeps the URL of every listing it has recorded; drop
+        # those no search holds any more, which are still in the backend.
+        self._cache.memory.prune_history(before)
+        return deleted
+
+    def compact(self) -> None:
+        self.flush()
+        with self._cache.flush_lock:
+            self._cache.backend.compact()
+
+    def ensure_file(self) -> None:
+        self._cache.backend.ensure_file()
+
+    def reset(self) -> None:
+        """Clear all stored state, dropping any buffered writes."""
+
+        cache = self._cache
+        with cache.flush_lock:
+            with cache.lock:
+                cache.pending.clear()
+                cache.pending_stable.clear()
+                cache.loaded.clear()
+            cache.memory.reset()
+            cache.backend.reset()
+        self._update_pending_gauge()
+
+    def get_property_count(self) -> int:
+        return self._memory().get_property_count()
+
+    def set_property_count(self, value: int) -> None:
+        self._memory().set_property_count(value)
+        self._buffer(property_count=value)
+
+    def get_pending_digest(self) -> PendingDigest | None:
+        return self._memory().get_pending_digest()
+
+    def set_pending_digest(self, digest: PendingDigest | None) -> None:
+        self._memory().set_pending_digest(digest)
+        self._buffer(digest=digest, digest_changed=True)
+
+    def get_current_listings(self) -> list[str]:
+        return self._memory().get_current_listings()
+
+    def get_previous_listings(self) -> list[str]:
+        return self._memory().get_previous_listings()
+
+    def get_new_listings(self) -> list[str]:
+        return self._memory().get_new_listings()
+
+    def iterate_snapshot(
+        self, snapshot: str, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[str]:
+        return self._memory().iterate_snapshot(snapshot, batch_size=batch_size)
+
+    def get_current_listing_ids(self) -> set[int]:
+        return self._memory().get_current_listing_ids()
+
+    def get_listing_urls(self, listing_ids: Sequence[int]) -> list[str]:
+        """Return the URLs of ``listing_ids`` in the same order.
+
+        Listings that left the search before the cache was loaded are looked
+        up in the backend.
+        """
+
+        urls = self._memory().get_listing_urls(listing_ids)
+        if len(urls) == len(listing_ids):
+            return urls
+        backend = self._cache.backend.for_search(self.search_id)
+        by_id = {
+            listing_id(url): url
+            for url in (*backend.get_listing_urls(listing_ids), *urls)
+        }
+        return [by_id[number] for number in listing_ids if number in by_id]
+
+    def update_current_listings(self, urls: Sequence[str]) -> list[str]:
+        return self.get_listing_urls(self.replace_current_listings(urls).added)
+
+    def replace_current_listings(self, urls: Sequence[str]) -> ListingDiff:
+        snapshot = list(urls)
+        diff = self._memory().replace_current_listings(snapshot)
+        self._buffer(snapshot=snapshot)
+        return diff
+
+    def iterate_seen_listing_ids(
+        self, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[int]:
+        """Yield the ids the search has seen; buffered ones may repeat."""
+
+        backend = self._cache.backend.for_search(self.search_id)
+        yield from backend.iterate_seen_listing_ids(batch_size=batch_size)
+        with self._cache.lock:
+            pending = self._cache.pending.get(self.search_id)
+            buffered = list(pending.seen) if pending is not None else []
+        yield from buffered
+
+    def get_seen_listing_ids(self, listing_ids: Sequence[int]) -> set[int]:
+        """Return which of ``listing_ids`` were seen, buffered or in the backend.
+
+        Seen ids are not loaded into memory, since they are never pruned.
+        """
+
+        with self._cache.lock:
+            pending = self._cache.pending.get(self.search_id)
+            buffered = pending.seen.intersection(listing_ids) if pending else set()
+        unknown = [number for number in listing_ids if number not in buffered]
+        backend = self._cache.backend.for_search(self.search_id)
+        return buffered | backend.get_seen_listing_ids(unknown)
+
+    def add_seen_listing_ids(self, listing_ids: Iterable[int]) -> None:
+        values = {int(number) for number in listing_ids}
+        if not values:
+            return
+        with self._cache.lock:
+            pending = self._cache.pending.setdefault(self.search_id, _Pending())
+            pending.seen |= values
+        self._after_write()
+
+    def get_stable_listing_numbers(self) -> set[int]:
+        return self._memory().get_stable_listing_numbers()
+
+    def add_stable_listing_numbers(self, numbers: Iterable[int]) -> None:
+        values = {int(number) for number in numbers}
+        if not values:
+            return
+        self._memory().add_stable_listing_numbers(values)
+        with self._cache.lock:
+            self._cache.pending_stable |= values
+        self._after_write()
+
+    def add_notifications(
+        self, messages: Iterable[str], *, channels: Sequence[str]
+    ) -> None:
+        targets = tuple(channels)
+        values = [(message, targets) for message in messages]
+        if not values or not targets:
+            return
+        with self._cache.lock:
+            pending = self._cache.pending.setdefault(self.search_id, _Pending())
+            pending.notifications.extend(values)
+        self._after_write()
+
+    def get_due_notifications(
+        self, now: datetime, *, channel: str, limit: int
+    ) -> list[OutboxMessage]:
+        """Return due outbox messages; buffered ones wait for the next flush."""
+
+        return self._cache.backend.get_due_notifications(
+            now, channel=channel, limit=limit
+        )
+
+    def prune_notifications(self, channels: Sequence[str]) -> int:
+        return self._cache.backend.prune_notifications(channels)
+
+    def count_notifications(self) -> int:
+        return self._cache.backend.count_notifications()
+
+    def complete_notifications(self, ids: Sequence[int]) -> None:
+        self._cache.backend.complete_notifications(ids)
+
+    def retry_notifications(self, ids: Sequence[int], next_attempt: datetime) -> None:
+        self._cache.backend.retry_notifications(ids, next_attempt)
@@ -0,0 +1,880 @@
+"""DuckDB state store, the default backend."""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+
+import duckdb
+
+from app.state import (
+    DEFAULT_FETCH_SIZE,
+    DEFAULT_SEARCH_ID,
+    DEFAULT_STATE_FILE,
+    ListingDiff,
+    OutboxMessage,
+    PendingDigest,
+    decode_digest,
+    encode_digest,
+)
+
+SELECT_METADATA_SQL = "SELECT value FROM metadata WHERE key = ?"
+DELETE_METADATA_SQL = "DELETE FROM metadata WHERE key = ?"
+INSERT_METADATA_SQL = "INSERT INTO metadata (key, value) VALUES (?, ?)"
+# Version 1 kept snapshots in a ``listings`` table, migrated on open.
+SCHEMA_VERSION = 2
+EXPORT_FORMATS = ("parquet", "csv")
+# ``compact`` swaps in a rewritten copy of the file only if it is at least this
+# much smaller.
+COMPACT_MIN_SAVING = 0.25
+# Seconds a rewrite waits for open cursors (e.g. a streamed snapshot) to close.
+COMPACT_IDLE_TIMEOUT = 30.0
+SNAPSHOT_VIEWS = {
+    "current": "current_listings",
+    "previous": "previous_listings",
+    "new": "new_listings",
+}
+# The listing number that ends a listing URL.
+LISTING_ID_SQL = "TRY_CAST(regexp_extract({url}, '(\\d+)/*$', 1) AS BIGINT)"
+
+# Binding a Python list converts it element by element, which takes about a
+# second for 10k URLs; a single JSON string unnested in SQL is ~100x faster.
+STAGE_BATCH_SQL = f"""
+    CREATE OR REPLACE TEMP TABLE listing_batch AS
+    SELECT
+        listing_id,
+        arg_min(url, ordinal) AS url,
+        CAST(min(ordinal) - 1 AS INTEGER) AS position
+    FROM (
+        SELECT batch.url, batch.ordinal, {LISTING_ID_SQL.format(url="batch.url")}
+            AS listing_id
+        FROM unnest(CAST(? AS JSON)::VARCHAR[]) WITH ORDINALITY AS batch(url, ordinal)
+    )
+    GROUP BY listing_id
+"""
+STORE_URLS_SQL = """
+    INSERT INTO listing_urls (listing_id, url)
+    SELECT listing_id, url FROM listing_batch
+    ON CONFLICT (listing_id) DO UPDATE SET url = excluded.url
+    WHERE listing_urls.url <> excluded.url
+"""
+SELECT_POLL_SQL = "SELECT poll FROM search_polls WHERE search_id = ?"
+UPSERT_POLL_SQL = """
+    INSERT INTO search_polls (search_id, poll, polled_at) VALUES (?, ?, ?)
+    ON CONFLICT (search_id) DO UPDATE
+    SET poll = excluded.poll, polled_at = excluded.polled_at
+"""
+# Runs before the poll is recorded, so removed listings were last seen at the
+# search's previous poll.
+MARK_REMOVED_SQL = """
+    UPDATE listing_history AS h
+    SET removed_at = $3,
+        removed_poll = $2,
+        last_seen = (SELECT p.polled_at FROM search_polls AS p WHERE p.search_id = $1)
+    WHERE h.search_id = $1
+      AND h.removed_poll IS NULL
+      AND NOT EXISTS (
+        SELECT 1 FROM listing_batch AS b WHERE b.listing_id = h.listing_id
+      )
+"""
+# Only new, returning and moved listings are written; the WHERE guard leaves
+# rows that kept their position untouched.
+UPSERT_BATCH_SQL = """
+    INSERT INTO listing_history (
+        search_id, listing_id, position, first_seen, last_seen, added_poll,
+        position_poll
+    )
+    SELECT $1, listing_id, position, $3, $3, $2, $2 FROM listing_batch
+    ON CONFLICT (search_id, listing_id) DO UPDATE SET
+        previous_position = CASE
+            WHEN listing_history.removed_poll IS NULL THEN listing_history.position
+        END,
+        position = excluded.position,
+        position_poll = excluded.position_poll,
+        last_seen = excluded.last_seen,
+        added_poll = CASE
+            WHEN listing_history.removed_poll IS NULL THEN listing_history.added_poll
+            ELSE excluded.added_poll
+        END,
+        removed_at = NULL,
+        removed_poll = NULL
+    WHERE listing_history.removed_poll IS NOT NULL
+       OR listing_history.position <> excluded.position
+"""
+DIFF_POLL_SQL = """
+    SELECT kind, listing_id FROM (
+        SELECT
+            CASE
+                WHEN removed_poll = $2 THEN 'removed'
+                WHEN added_poll = $2 THEN 'added'
+                ELSE 'retained'
+            END AS kind,
+            listing_id,
+            position
+        FROM listing_history
+        WHERE search_id = $1 AND (removed_poll IS NULL OR removed_poll = $2)
+    )
+    ORDER BY CASE kind WHEN 'added' THEN 0 WHEN 'removed' THEN 1 ELSE 2 END, position
+"""
+EXPORT_HISTORY_SQL = """
+    SELECT h.search_id, h.listing_id, u.url, h.position, h.first_seen,
+           h.last_seen, h.removed_at
+    FROM listing_history AS h
+    JOIN listing_urls AS u USING (listing_id)
+    WHERE h.search_id = ?
+    ORDER BY h.first_seen, h.listing_id
+"""
+# Listings removed at their search's latest poll are kept for the previous
+# snapshot whatever their age.
+PRUNE_HISTORY_SQL = """
+    DELETE FROM listing_history AS h
+    WHERE h.removed_at < ?
+      AND h.removed_poll < (
+        SELECT p.poll FROM search_polls AS p WHERE p.search_id = h.search_id
+      )
+"""
+# ``seen_listings`` has no primary key, which would keep an index of every id
+# in memory; inserts skip ids the search already has instead. The anti join
+# builds its hash table from the batch, and the scan of ``seen_listings`` is
+# narrowed to the batch's id range rather than reading the search's whole set.
+INSERT_SEEN_SQL = """
+    INSERT INTO seen_listings (search_id, listing_id)
+    SELECT DISTINCT $1, batch.listing_id
+    FROM (SELECT unnest(CAST($2 AS JSON)::BIGINT[]) AS listing_id) AS batch
+    ANTI JOIN seen_listings AS seen
+        ON seen.search_id = $1 AND seen.listing_id = batch.listing_id
+"""
+SELECT_SEEN_SQL = """
+    SELECT listing_id FROM seen_listings
+    WHERE search_id = ?
+      AND listing_id IN (SELECT unnest(CAST(? AS JSON)::BIGINT[]))
+"""
+# Ids continue from the largest stored one; writes are serialised, so two
+# inserts never pick the same ids.
+INSERT_NOTIFICATIONS_SQL = """
+    INSERT INTO notification_outbox (
+        id, search_id, channel, message, created_at, next_attempt_at
+    )
+    SELECT (SELECT coalesce(max(id), 0) FROM notification_outbox)
+               + row_number() OVER (ORDER BY batch.ordinal, targets.ordinal),
+           $1, targets.channel, batch.message, $4, $4
+    FROM unnest(CAST($2 AS JSON)::VARCHAR[])
+             WITH ORDINALITY AS batch(message, ordinal),
+         unnest(CAST($3 AS JSON)::VARCHAR[])
+             WITH ORDINALITY AS targets(channel, ordinal)
+"""
+SELECT_DUE_NOTIFICATIONS_SQL = """
+    SELECT id, message, created_at, attempts FROM notification_outbox
+    WHERE channel = ? AND next_attempt_at <= ?
+    ORDER BY id
+    LIMIT ?
+"""
+SELECT_LISTING_URLS_SQL = """
+    SELECT listing_id, url FROM listing_urls
+    WHERE listing_id IN (SELECT unnest(CAST(? AS JSON)::BIGINT[]))
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class _Database:
+    """A DuckDB connection shared by every store scoped to one file."""
+
+    def __init__(self, path: Path) -> None:
+        if path.parent and path.parent != Path(""):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.connection = duckdb.connect(str(path))
+        # DuckDB connections are not thread-safe, so each operation runs on its
+        # own cursor. Writes are serialised to avoid transaction conflicts
+        # between searches touching the same tables.
+        self.cursor_lock = threading.Lock()
+        self.write_lock = threading.RLock()
+        # Open cursors are counted so a rewrite can wait for them to finish.
+        self.cursors_idle = threading.Condition(self.cursor_lock)
+        self.open_cursors = 0
+        self.rewriting = False
+        self.closed = False
+        # The cursor of the transaction each thread has open, so writes made
+        # inside ``atomic`` join it.
+        self.transactions = threading.local()
+
+    def close(self) -> None:
+        with self.cursor_lock:
+            if not self.closed:
+                self.closed = True
+                self.connection.close()
+
+    def rewrite(self, timeout: float, min_saving: float) -> bool:
+        """Copy the database into a fresh file and swap it in if smaller.
+
+        DuckDB reuses freed blocks but never shrinks its file, and deleted
+        rows keep their blocks until their row group is rewritten; copying the
+        live data is the only way to give the space back. The copy replaces
+        the file only if it saves at least ``min_saving`` of its size. Returns
+        whether the file was replaced; gives up if cursors stay open for
+        ``timeout`` seconds.
+        """
+
+        compacted = self.path.with_name(f"{self.path.name}.compact")
+        target = str(compacted).replace("'", "''")
+        with self.write_lock, self.cursor_lock:
+            if self.closed:
+                raise RuntimeError(f"State store is closed: {self.path}")
+            self.rewriting = True
+            try:
+                if not self.cursors_idle.wait_for(
+                    lambda: self.open_cursors == 0, timeout
+                ):
+                    return False
+                compacted.unlink(missing_ok=True)
+                connection = self.connection
+                (name,) = connection.execute(
+                    "SELECT current_database()"
+                ).fetchone() or ("main",)
+                connection.execute(f"ATTACH '{target}' AS compacted")
+                try:
+                    connection.execute(f'COPY FROM DATABASE "{name}" TO compacted')
+                finally:
+                    connection.execute("DETACH compacted")
+                if compacted.stat().st_size > self.path.stat().st_size * (
+                    1 - min_saving
+                ):
+                    return False
+                connection.close()
+                compacted.replace(self.path)
+                self.connection = duckdb.connect(str(self.path))
+                return True
+            finally:
+                compacted.unlink(missing_ok=True)
+                self.rewriting = False
+                self.cursors_idle.notify_all()
+
+
+class DuckDBStateStore:
+    """Persist bot state (counts and listing history) in DuckDB.
+
+    The store keeps one connection open for its lifetime; use it as a context
+    manager or call :meth:`close` when done. Stores returned by
+    :meth:`for_search` share that connection, so closing any of them closes it
+    for all.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_STATE_FILE,
+        search_id: str | None = None,
+        *,
+        _database: _Database | None = None,
+    ) -> None:
+        self.path = path
+        self.search_id = search_id
+        if _database is None:
+            self._database = _Database(path)
+            self._initialise()
+        else:
+            self._database = _database
+
+    def __enter__(self) -> DuckDBStateStore:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._database.close()
+
+    def for_search(self, search_id: str | None) -> DuckDBStateStore:
+        """Return a store for ``search_id`` sharing this store's connection."""
+
+        return DuckDBStateStore(
+            path=self.path, search_id=search_id, _database=self._database
+        )
+
+    def _key(self, name: str) -> str:
+        # Searches share the metadata table; keys of the default (unnamed)
+        # search keep their original names for compatibility.
+        if self.search_id is None:
+            return name
+        return f"{self.search_id}:{name}"
+
+    @contextmanager
+    def _cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        database = self._database
+        with database.cursor_lock:
+            database.cursors_idle.wait_for(lambda: not database.rewriting)
+            if database.closed:
+                raise RuntimeError(f"State store is closed: {self.path}")
+            cursor = database.connection.cursor()
+            database.open_cursors += 1
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+            with database.cursor_lock:
+                database.open_cursors -= 1
+                database.cursors_idle.notify_all()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        transactions = self._database.transactions
+        active: duckdb.DuckDBPyConnection | None = getattr(transactions, "cursor", None)
+        if active is not None:
+            yield active
+            return
+        with self._database.write_lock, self._cursor() as cursor:
+            cursor.execute("BEGIN")
+            transactions.cursor = cursor
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            finally:
+                transactions.cursor = None
+            cursor.execute("COMMIT")
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        """Run the writes made inside the block in one transaction.
+
+        Other writers wait for the block. Reads made inside it do not see its
+        writes until it commits.
+        """
+
+        with self._transaction():
+            yield
+
+    def _initialise(self) -> None:
+        with self._transaction() as cursor:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS metadata (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                )
+                """
+            )
+            # One row per listing and search. A listing is present from
+            # ``added_poll`` until ``removed_poll``; ``last_seen`` is only
+            # written when the row changes, the views report present listings
+            # as seen at their search's latest poll. URLs are kept once per
+            # listing in ``listing_urls``.
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS listing_history (
+                    search_id TEXT NOT NULL,
+                    listing_id BIGINT NOT NULL,
+                    position INTEGER NOT NULL,
+                    previous_position INTEGER,
+                    position_poll BIGINT NOT NULL,
+                    added_poll BIGINT NOT NULL,
+                    removed_poll BIGINT,
+                    first_seen TIMESTAMP NOT NULL,
+                    last_seen TIMESTAMP NOT NULL,
+                    removed_at TIMESTAMP,
+                    PRIMARY KEY (search_id, listing_id)
+                )
+                """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS listing_urls (
+                    listing_id BIGINT PRIMARY KEY,
+                    url TEXT NOT NULL
+                )
+                """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS search_polls (
+                    search_id TEXT PRIMARY KEY,
+                    poll BIGINT NOT NULL,
+                    polled_at TIMESTAMP NOT NULL
+                )
+                """
+            )
+            cursor.execute(
+                """
+                CREATE OR REPLACE VIEW current_listings AS
+                SELECT h.search_id, h.position, h.listing_id, u.url, h.first_seen,
+                       p.polled_at AS last_seen
+                FROM listing_history AS h
+                JOIN search_polls AS p USING (search_id)
+                JOIN listing_urls AS u USING (listing_id)
+                WHERE h.removed_poll IS NULL
+                """
+            )
+            cursor.execute(
+                """
+                CREATE OR REPLACE VIEW new_listings AS
+                SELECT h.search_id, h.position, h.listing_id, u.url, h.first_seen
+                FROM listing_history AS h
+                JOIN search_polls AS p USING (search_id)
+                JOIN listing_urls AS u USING (listing_id)
+                WHERE h.removed_poll IS NULL AND h.added_poll = p.poll
+                """
+            )
+            cursor.execute(
+                """
+                CREATE OR REPLACE VIEW previous_listings AS
+                SELECT h.search_id,
+                       CASE WHEN h.position_poll = p.poll
+                            THEN h.previous_position
+                            ELSE h.position
+                       END AS position,
+                       h.listing_id, u.url, h.first_seen
+                FROM listing_history AS h
+                JOIN search_polls AS p USING (search_id)
+                JOIN listing_urls AS u USING (listing_id)
+                WHERE h.added_poll < p.poll
+                  AND coalesce(h.removed_poll, p.poll) >= p.poll
+                """
+            )
+            seen_exists = self._column_type(cursor, "seen_listings", "listing_id")
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS seen_listings (
+                    search_id TEXT NOT NULL,
+                    listing_id BIGINT NOT NULL
+                )
+                """
+            )
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS stable_listings (
+                    number BIGINT PRIMARY KEY,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            # Notifications waiting for delivery; a row is deleted once sent.
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS notification_outbox (
+                    id BIGINT PRIMARY KEY,
+                    search_id TEXT NOT NULL,
+                    channel TEXT NOT NULL,
+                    message TEXT NOT NULL,
+                    created_at TIMESTAMP NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at TIMESTAMP NOT NULL
+                )
+                """
+            )
+            self._migrate_snapshots(cursor)
+            if seen_exists is None:
+                # Listings recorded before the seen index existed count as seen.
+                cursor.execute(
+                    "INSERT INTO seen_listings (search_id, listing_id) "
+                    "SELECT DISTINCT search_id, listing_id FROM listing_history"
+                )
+            cursor.execute(DELETE_METADATA_SQL, ("schema_version",))
+            cursor.execute(INSERT_METADATA_SQL, ("schema_version", str(SCHEMA_VERSION)))
+
+    def _column_type(
+        self, cursor: duckdb.DuckDBPyConnection, table: str, column: str
+    ) -> str | None:
+        row = cursor.execute(
+            "SELECT data_type FROM duckdb_columns() "
+            "WHERE table_name = ? AND column_name = ?",
+            (table, column),
+        ).fetchone()
+        return None if row is None else str(row[0])
+
+    def _migrate_snapshots(self, cursor: duckdb.DuckDBPyConnection) -> None:
+        # Version 1 rewrote ``previous``, ``current`` and ``new`` snapshots in a
+        # ``listings`` table on every poll. Replaying each search's previous and
+        # current snapshot as two polls rebuilds the same three views.
+        row = cursor.execute(
+            "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'listings'"
+        ).fetchone()
+        if not row or not row[0]:
+            return
+
+        snapshots: dict[str, dict[str, list[str]]] = {}
+        for snapshot, url in cursor.execute(
+            "SELECT snapshot, url FROM listings ORDER BY snapshot, position"
+        ).fetchall():
+            search_id, _, name = snapshot.rpartition(":")
+            snapshots.setdefault(search_id, {}).setdefault(name, []).append(url)
+
+        logger.info(
+            "Migrating listing snapshots of %s searches to listing_history",
+            len(snapshots),
+        )
+        for search_id, named in snapshots.items():
+            for name in ("previous", "current"):
+                if name in named:
+                    self._apply_snapshot(
+                        cursor, search_id, named[name], skip_invalid=True
+                    )
+
+        cursor.execute("DROP INDEX IF EXISTS listings_snapshot_position_idx")
+        cursor.execute("DROP TABLE listings")
+
+    def _apply_snapshot(
+        self,
+        cursor: duckdb.DuckDBPyConnection,
+        search_id: str,
+        urls: Sequence[str],
+        *,
+        skip_invalid: bool = False,
+    ) -> int:
+        # Timestamps are stored as naive UTC.
+        now = datetime.now(UTC).replace(tzinfo=None)
+        row = cursor.execute(SELECT_POLL_SQL, (search_id,)).fetchone()
+        poll = (row[0] if row else 0) + 1
+
+        cursor.execute(STAGE_BATCH_SQL, (json.dumps(list(urls)),))
+        invalid = cursor.execute(
+            "SELECT url FROM listing_batch WHERE listing_id IS NULL"
+        ).fetchone()
+        if invalid is not None:
+            if not skip_invalid:
+                raise ValueError(f"Listing URL has no listing number: {invalid[0]}")
+            logger.warning("Skipping listing URL without a number: %s", invalid[0])
+            cursor.execute("DELETE FROM listing_batch WHERE listing_id IS NULL")
+
+        cursor.execute(STORE_URLS_SQL)
+        cursor.execute(MARK_REMOVED_SQL, (search_id, poll, now))
+        cursor.execute(UPSERT_POLL_SQL, (search_id, poll, now))
+        cursor.execute(UPSERT_BATCH_SQL, (search_id, poll, now))
+        return poll
+
+    def _write_property_count(
+        self, cursor: duckdb.DuckDBPyConnection, value: int
+    ) -> None:
+        key = self._key("property_count")
+        cursor.execute(DELETE_METADATA_SQL, (key,))
+        cursor.execute(INSERT_METADATA_SQL, (key, str(value)))
+
+    def get_property_count(self) -> int:
+        with self._cursor() as cursor:
+            row = cursor.execute(
+                SELECT_METADATA_SQL, (self._key("property_count"),)
+            ).fetchone()
+        if row is None:
+            return 0
+
+        raw_value = row[0]
+        try:
+            return int(raw_value)
+        except (TypeError, ValueError):
+            logger.warning(
+                "Invalid property count '%s' in state store; resetting to 0.",
+                raw_value,
+            )
+            with self._transaction() as cursor:
+                self._write_property_count(cursor, 0)
+            return 0
+
+    def set_property_count(self, value: int) -> None:
+        with self._transaction() as cursor:
+            self._write_property_count(cursor, value)
+
+    def get_pending_digest(self) -> PendingDigest | None:
+        with self._cursor() as cursor:
+            row = cursor.execute(
+                SELECT_METADATA_SQL, (self._key("pending_digest"),)
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return decode_digest(row[0])
+        except ValueError:
+            logger.warning("Ignoring invalid pending digest in state store.")
+            return None
+
+    def set_pending_digest(self, digest: PendingDigest | None) -> None:
+        key = self._key("pending_digest")
+        with self._transaction() as cursor:
+            cursor.execute(DELETE_METADATA_SQL, (key,))
+            if digest is not None:
+                cursor.execute(INSERT_METADATA_SQL, (key, encode_digest(digest)))
+
+    @property
+    def _search(self) -> str:
+        return DEFAULT_SEARCH_ID if self.search_id is None else self.search_id
+
+    def _snapshot_query(self, snapshot: str) -> str:
+        try:
+            view = SNAPSHOT_VIEWS[snapshot]
+        except KeyError:
+            raise ValueError(f"Unknown listing snapshot: {snapshot}") from None
+        return f"SELECT url FROM {view} WHERE search_id = ? ORDER BY position"
+
+    def _snapshot_urls(self, snapshot: str) -> list[str]:
+        with self._cursor() as cursor:
+            rows = cursor.execute(
+                self._snapshot_query(snapshot), (self._search,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_current_listings(self) -> list[str]:
+        return self._snapshot_urls("current")
+
+    def get_previous_listings(self) -> list[str]:
+        return self._snapshot_urls("previous")
+
+    def get_new_listings(self) -> list[str]:
+        return self._snapshot_urls("new")
+
+    def get_current_listing_ids(self) -> set[int]:
+        with self._cursor() as cursor:
+            rows = cursor.execute(
+                "SELECT listing_id FROM listing_history "
+                "WHERE search_id = ? AND removed_poll IS NULL",
+                (self._search,),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_listing_urls(self, listing_ids: Sequence[int]) -> list[str]:
+        """Return the URLs of ``listing_ids`` in the same order."""
+
+        if not listing_ids:
+            return []
+        with self._cursor() as cursor:
+            rows = cursor.execute(
+                SELECT_LISTING_URLS_SQL, (json.dumps(list(listing_ids)),)
+            ).fetchall()
+        urls = dict(rows)
+        return [urls[number] for number in listing_ids if number in urls]
+
+    def update_current_listings(self, urls: Sequence[str]) -> list[str]:
+        return self.get_listing_urls(self.replace_current_listings(urls).added)
+
+    def replace_current_listings(self, urls: Sequence[str]) -> ListingDiff:
+        """Record ``urls`` as the search's next poll and diff it against the last.
+
+        Listings are keyed by the listing number that ends each URL. Each poll
+        bumps the search's poll number and upserts the batch into
+        ``listing_history``; only added, returning, moved and removed listings
+        are written. The diff is computed in DuckDB, so stored listings are never
+        loaded into Python to find what changed.
+        """
+
+        with self._transaction() as cursor:
+            poll = self._apply_snapshot(cursor, self._search, urls)
+            rows = cursor.execute(DIFF_POLL_SQL, (self._search, poll)).fetchall()
+
+        diff = ListingDiff()
+        for kind, number in rows:
+            getattr(diff, kind).append(number)
+        return diff
+
+    def iterate_seen_listing_ids(
+        self, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[int]:
+        """Yield the ids the search has seen, ``batch_size`` rows at a time."""
+
+        yield from self._read_batches(
+            "SELECT listing_id FROM seen_listings WHERE search_id = ?", batch_size
+        )
+
+    def get_seen_listing_ids(self, listing_ids: Sequence[int]) -> set[int]:
+        if not listing_ids:
+            return set()
+        with self._cursor() as cursor:
+            rows = cursor.execute(
+                SELECT_SEEN_SQL, (self._search, json.dumps(list(listing_ids)))
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add_seen_listing_ids(self, listing_ids: Iterable[int]) -> None:
+        values = [int(number) for number in listing_ids]
+        if not values:
+            return
+        with self._transaction() as cursor:
+            cursor.execute(INSERT_SEEN_SQL, (self._search, json.dumps(values)))
+
+    def get_stable_listing_numbers(self) -> set[int]:
+        """Return listing numbers previously verified as genuine."""
+
+        with self._cursor() as cursor:
+            rows = cursor.execute("SELECT number FROM stable_listings").fetchall()
+        return {row[0] for row in rows}
+
+    def add_stable_listing_numbers(self, numbers: Iterable[int]) -> None:
+        """Persist listing numbers that survived dummy-listing verification."""
+
+        values = [int(number) for number in numbers]
+        if not values:
+            return
+        with self._transaction() as cursor:
+            cursor.execute(
+                "INSERT OR IGNORE INTO stable_listings (number) "
+                "SELECT unnest(CAST(? AS JSON)::BIGINT[])",
+                (json.dumps(values),),
+            )
+
+    def add_notifications(
+        self, messages: Iterable[str], *, channels: Sequence[str]
+    ) -> None:
+        values = list(messages)
+        if not values or not channels:
+            return
+        now = datetime.now(UTC).replace(tzinfo=None)
+        with self._transaction() as cursor:
+            cursor.execute(
+                INSERT_NOTIFICATIONS_SQL,
+                (self._search, json.dumps(values), json.dumps(list(channels)), now),
+            )
+
+    def get_due_notifications(
+        self, now: datetime, *, channel: str, limit: int
+    ) -> list[OutboxMessage]:
+        with self._cursor() as cursor:
+            rows = cursor.execute(
+                SELECT_DUE_NOTIFICATIONS_SQL, (channel, now, limit)
+            ).fetchall()
+        return [OutboxMessage(*row) for row in rows]
+
+    def prune_notifications(self, channels: Sequence[str]) -> int:
+        targets = json.dumps(list(channels))
+        with self._transaction() as cursor:
+            dropped = cursor.execute(
+                "DELETE FROM notification_outbox "
+                "WHERE channel NOT IN (SELECT unnest(CAST(? AS JSON)::VARCHAR[])) "
+                "RETURNING id",
+                (targets,),
+            ).fetchall()
+        return len(dropped)
+
+    def count_notifications(self) -> int:
+        with self._cursor() as cursor:
+            row = cursor.execute("SELECT count(*) FROM notification_outbox").fetchone()
+        return int(row[0]) if row else 0
+
+    def complete_notifications(self, ids: Sequence[int]) -> None:
+        if not ids:
+            return
+        with self._transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM notification_outbox "
+                "WHERE id IN (SELECT unnest(CAST(? AS JSON)::BIGINT[]))",
+                (json.dumps(list(ids)),),
+            )
+
+    def retry_notifications(self, ids: Sequence[int], next_attempt: datetime) -> None:
+        if not ids:
+            return
+        with self._transaction() as cursor:
+            cursor.execute(
+                "UPDATE notification_outbox "
+                "SET attempts = attempts + 1, next_attempt_at = ? "
+                "WHERE id IN (SELECT unnest(CAST(? AS JSON)::BIGINT[]))",
+                (next_attempt, json.dumps(list(ids))),
+            )
+
+    def reset(self) -> None:
+        """Clear all stored state."""
+
+        with self._transaction() as cursor:
+            cursor.execute("DELETE FROM metadata")
+            cursor.execute("DELETE FROM listing_history")
+            cursor.execute("DELETE FROM listing_urls")
+            cursor.execute("DELETE FROM search_polls")
+            cursor.execute("DELETE FROM seen_listings")
+            cursor.execute("DELETE FROM stable_listings")
+            cursor.execute("DELETE FROM notification_outbox")
+
+    def ensure_file(self) -> None:
+        """Ensure the underlying database file exists on disk."""
+
+        # Opening the connection already created the file; a checkpoint also
+        # flushes the schema out of the write-ahead log.
+        with self._database.write_lock, self._cursor() as cursor:
+            cursor.execute("CHECKPOINT")
+
+    def flush(self) -> None:
+        """Every write commits immediately, so there is nothing to flush."""
+
+    def prune_history(self, before: datetime) -> int:
+        """Delete listings of every search that were removed before ``before``.
+
+        URLs and stable listing numbers no search refers to any more are
+        dropped with them. Returns the number of history rows deleted.
+        """
+
+        with self._transaction() as cursor:
+            row = cursor.execute(PRUNE_HISTORY_SQL, (before,)).fetchone()
+            cursor.execute(
+                "DELETE FROM listing_urls WHERE listing_id NOT IN "
+                "(SELECT listing_id FROM listing_history)"
+            )
+            cursor.execute(
+                "DELETE FROM stable_listings WHERE created_at < ? AND number NOT IN "
+                "(SELECT listing_id FROM listing_history)",
+                (before,),
+            )
+        return int(row[0]) if row else 0
+
+    def compact(self) -> None:
+        """Checkpoint the write-ahead log and rewrite the file if that shrinks it."""
+
+        with self._database.write_lock, self._cursor() as cursor:
+            cursor.execute("CHECKPOINT")
+        size = self.path.stat().st_size
+        if self._database.rewrite(COMPACT_IDLE_TIMEOUT, COMPACT_MIN_SAVING):
+            logger.info(
+                "Compacted %s from %s to %s bytes",
+                self.path,
+                size,
+                self.path.stat().st_size,
+            )
+
+    def iterate_snapshot(
+        self, snapshot: str, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[str]:
+        """Yield URLs for a snapshot, fetching ``batch_size`` rows at a time.
+
+        DuckDB streams the query result, so at most one batch is held in memory
+        however large the snapshot is. The cursor stays open until the generator
+        is exhausted or closed.
+        """
+
+        yield from self._read_batches(self._snapshot_query(snapshot), batch_size)
+
+    def _read_batches(self, query: str, batch_size: int) -> Iterator[Any]:
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive: {batch_size}")
+        with self._cursor() as cursor:
+            result = cursor.execute(query, (self._search,))
+            while rows := result.fetchmany(batch_size):
+                for row in rows:
+                    yield row[0]
+
+    def export(self, table: str, path: Path, *, file_format: str | None = None) -> None:
+        """Write a snapshot or the listing history to a Parquet or CSV file.
+
+        ``table`` is ``history`` or one of the snapshot names. The format is
+        taken from ``path``'s suffix unless given. DuckDB's ``COPY`` writes the
+        rows as it reads them, so nothing is loaded into Python.
+        """
+
+        file_format = (file_format or path.suffix.lstrip(".")).lower()
+        if file_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {file_format or path}")
+        if table == "history":
+            query = EXPORT_HISTORY_SQL
+        else:
+            if table not in SNAPSHOT_VIEWS:
+                raise ValueError(f"Unknown listing snapshot: {table}")
+            query = (
+                "SELECT position, listing_id, url, first_seen "
+                f"FROM {SNAPSHOT_VIEWS[table]} WHERE search_id = ? ORDER BY position"
+            )
+        target = str(path).replace("'", "''")
+        if path.parent != Path(""):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        with self._cursor() as cursor:
+            cursor.execute(
+                f"COPY ({query}) TO '{target}' (FORMAT {file_format})",
+                (self._search,),
+            )
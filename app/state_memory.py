@@ -0,0 +1,349 @@
+"""In-memory state store for tests and deployments that need no persistence."""
+
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from dataclasses import dataclass, field, replace
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Iterable, Iterator, Sequence
+
+from app.state import (
+    DEFAULT_FETCH_SIZE,
+    DEFAULT_SEARCH_ID,
+    DEFAULT_STATE_FILE,
+    SNAPSHOTS,
+    ListingDiff,
+    OutboxMessage,
+    PendingDigest,
+    listing_id,
+)
+
+
+@dataclass(slots=True)
+class _Listing:
+    """A listing's place in a search, mirroring a ``listing_history`` row."""
+
+    position: int
+    position_poll: int
+    added_poll: int
+    previous_position: int | None = None
+    removed_poll: int | None = None
+
+
+@dataclass(slots=True)
+class _Notification:
+    """An outbox message, the channel it is for and when it is next due."""
+
+    message: OutboxMessage
+    channel: str
+    next_attempt: datetime
+
+
+@dataclass(slots=True)
+class _Database:
+    """State shared by every store created from the same ``MemoryStateStore``."""
+
+    lock: threading.Lock = field(default_factory=threading.Lock)
+    counts: dict[str, int] = field(default_factory=dict)
+    digests: dict[str, PendingDigest] = field(default_factory=dict)
+    polls: dict[str, int] = field(default_factory=dict)
+    listings: dict[str, dict[int, _Listing]] = field(default_factory=dict)
+    urls: dict[int, str] = field(default_factory=dict)
+    seen: dict[str, set[int]] = field(default_factory=dict)
+    stable: set[int] = field(default_factory=set)
+    # Keyed by id, which only grows, so iteration is oldest first.
+    outbox: dict[int, _Notification] = field(default_factory=dict)
+    last_outbox_id: int = 0
+    closed: bool = False
+
+
+class MemoryStateStore:
+    """Keep bot state in process memory; it is lost when the process exits.
+
+    Follows the same poll semantics as the database backends. Listings removed
+    before the latest poll are dropped, since no snapshot can include them.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_STATE_FILE,
+        search_id: str | None = None,
+        *,
+        _database: _Database | None = None,
+    ) -> None:
+        self.path = path
+        self.search_id = search_id
+        self._database = _Database() if _database is None else _database
+
+    def __enter__(self) -> MemoryStateStore:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._database.closed = True
+
+    def for_search(self, search_id: str | None) -> MemoryStateStore:
+        """Return a store for ``search_id`` sharing this store's state."""
+
+        return MemoryStateStore(
+            path=self.path, search_id=search_id, _database=self._database
+        )
+
+    @property
+    def _search(self) -> str:
+        return DEFAULT_SEARCH_ID if self.search_id is None else self.search_id
+
+    @contextmanager
+    def _state(self) -> Iterator[_Database]:
+        with self._database.lock:
+            if self._database.closed:
+                raise RuntimeError(f"State store is closed: {self.path}")
+            yield self._database
+
+    def ensure_file(self) -> None:
+        """Nothing to create; kept for parity with the database backends."""
+
+    def flush(self) -> None:
+        """Nothing is buffered."""
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        """Writes apply at once; nothing outlives the process to keep consistent."""
+
+        yield
+
+    def prune_history(self, before: datetime) -> int:
+        """Forget URLs of listings no search holds; removed ones are gone already."""
+
+        with self._state() as state:
+            kept = {
+                number for listings in state.listings.values() for number in listings
+            }
+            for number in state.urls.keys() - kept:
+                del state.urls[number]
+        return 0
+
+    def compact(self) -> None:
+        """Nothing to compact."""
+
+    def reset(self) -> None:
+        """Clear all stored state."""
+
+        with self._state() as state:
+            state.counts.clear()
+            state.digests.clear()
+            state.polls.clear()
+            state.listings.clear()
+            state.urls.clear()
+            state.seen.clear()
+            state.stable.clear()
+            state.outbox.clear()
+
+    def get_property_count(self) -> int:
+        with self._state() as state:
+            return state.counts.get(self._search, 0)
+
+    def set_property_count(self, value: int) -> None:
+        with self._state() as state:
+            state.counts[self._search] = value
+
+    def get_pending_digest(self) -> PendingDigest | None:
+        with self._state() as state:
+            return state.digests.get(self._search)
+
+    def set_pending_digest(self, digest: PendingDigest | None) -> None:
+        with self._state() as state:
+            if digest is None:
+                state.digests.pop(self._search, None)
+            else:
+                state.digests[self._search] = digest
+
+    def _snapshot_urls(self, snapshot: str) -> list[str]:
+        if snapshot not in SNAPSHOTS:
+            raise ValueError(f"Unknown listing snapshot: {snapshot}")
+        with self._state() as state:
+            poll = state.polls.get(self._search, 0)
+            rows: list[tuple[int, int]] = []
+            for number, listing in state.listings.get(self._search, {}).items():
+                if snapshot == "previous":
+                    if listing.added_poll < poll:
+                        position = (
+                            listing.previous_position
+                            if listing.position_poll == poll
+                            else listing.position
+                        )
+                        rows.append((position or 0, number))
+                elif listing.removed_poll is None and (
+                    snapshot == "current" or listing.added_poll == poll
+                ):
+                    rows.append((listing.position, number))
+            return [state.urls[number] for _, number in sorted(rows)]
+
+    def get_current_listings(self) -> list[str]:
+        return self._snapshot_urls("current")
+
+    def get_previous_listings(self) -> list[str]:
+        return self._snapshot_urls("previous")
+
+    def get_new_listings(self) -> list[str]:
+        return self._snapshot_urls("new")
+
+    def iterate_snapshot(
+        self, snapshot: str, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[str]:
+        """Yield URLs for a snapshot; ``batch_size`` is validated but unused."""
+
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive: {batch_size}")
+        yield from self._snapshot_urls(snapshot)
+
+    def get_current_listing_ids(self) -> set[int]:
+        with self._state() as state:
+            return {
+                number
+                for number, listing in state.listings.get(self._search, {}).items()
+                if listing.removed_poll is None
+            }
+
+    def get_listing_urls(self, listing_ids: Sequence[int]) -> list[str]:
+        """Return the URLs of ``listing_ids`` in the same order."""
+
+        with self._state() as state:
+            return [
+                state.urls[number] for number in listing_ids if number in state.urls
+            ]
+
+    def update_current_listings(self, urls: Sequence[str]) -> list[str]:
+        return self.get_listing_urls(self.replace_current_listings(urls).added)
+
+    def replace_current_listings(self, urls: Sequence[str]) -> ListingDiff:
+        """Record ``urls`` as the search's next poll and diff it against the last."""
+
+        batch: dict[int, tuple[str, int]] = {}
+        for position, url in enumerate(urls):
+            batch.setdefault(listing_id(url), (url, position))
+
+        with self._state() as state:
+            poll = state.polls.get(self._search, 0) + 1
+            state.polls[self._search] = poll
+            listings = state.listings.setdefault(self._search, {})
+            removed: list[tuple[int, int]] = []
+            for number, listing in list(listings.items()):
+                if listing.removed_poll is not None:
+                    del listings[number]
+                elif number not in batch:
+                    listing.removed_poll = poll
+                    removed.append((listing.position, number))
+
+            added: list[tuple[int, int]] = []
+            retained: list[tuple[int, int]] = []
+            for number, (url, position) in batch.items():
+                state.urls[number] = url
+                existing = listings.get(number)
+                if existing is None:
+                    listings[number] = _Listing(
+                        position=position, position_poll=poll, added_poll=poll
+                    )
+                    added.append((position, number))
+                    continue
+                if existing.position != position:
+                    existing.previous_position = existing.position
+                    existing.position = position
+                    existing.position_poll = poll
+                retained.append((position, number))
+
+        return ListingDiff(
+            added=[number for _, number in sorted(added)],
+            removed=[number for _, number in sorted(removed)],
+            retained=[number for _, number in sorted(retained)],
+        )
+
+    def iterate_seen_listing_ids(
+        self, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[int]:
+        """Yield the ids the search has seen; ``batch_size`` is validated but unused."""
+
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive: {batch_size}")
+        with self._state() as state:
+            seen = list(state.seen.get(self._search, ()))
+        yield from seen
+
+    def get_seen_listing_ids(self, listing_ids: Sequence[int]) -> set[int]:
+        with self._state() as state:
+            return state.seen.get(self._search, set()).intersection(listing_ids)
+
+    def add_seen_listing_ids(self, listing_ids: Iterable[int]) -> None:
+        with self._state() as state:
+            state.seen.setdefault(self._search, set()).update(
+                int(number) for number in listing_ids
+            )
+
+    def get_stable_listing_numbers(self) -> set[int]:
+        """Return listing numbers previously verified as genuine."""
+
+        with self._state() as state:
+            return set(state.stable)
+
+    def add_stable_listing_numbers(self, numbers: Iterable[int]) -> None:
+        """Remember listing numbers that survived dummy-listing verification."""
+
+        with self._state() as state:
+            state.stable.update(int(number) for number in numbers)
+
+    def add_notifications(
+        self, messages: Iterable[str], *, channels: Sequence[str]
+    ) -> None:
+        now = datetime.now(UTC).replace(tzinfo=None)
+        with self._state() as state:
+            for message in messages:
+                for channel in channels:
+                    state.last_outbox_id += 1
+                    state.outbox[state.last_outbox_id] = _Notification(
+                        OutboxMessage(state.last_outbox_id, message, now), channel, now
+                    )
+
+    def get_due_notifications(
+        self, now: datetime, *, channel: str, limit: int
+    ) -> list[OutboxMessage]:
+        with self._state() as state:
+            due = [
+                stored.message
+                for stored in state.outbox.values()
+                if stored.channel == channel and stored.next_attempt <= now
+            ]
+        return due[:limit]
+
+    def prune_notifications(self, channels: Sequence[str]) -> int:
+        with self._state() as state:
+            dropped = [
+                number
+                for number, stored in state.outbox.items()
+                if stored.channel not in channels
+            ]
+            for number in dropped:
+                del state.outbox[number]
+        return len(dropped)
+
+    def count_notifications(self) -> int:
+        with self._state() as state:
+            return len(state.outbox)
+
+    def complete_notifications(self, ids: Sequence[int]) -> None:
+        with self._state() as state:
+            for number in ids:
+                state.outbox.pop(number, None)
+
+    def retry_notifications(self, ids: Sequence[int], next_attempt: datetime) -> None:
+        with self._state() as state:
+            for number in ids:
+                stored = state.outbox.get(number)
+                if stored is not None:
+                    stored.message = replace(
+                        stored.message, attempts=stored.message.attempts + 1
+                    )
+                    stored.next_attempt = next_attempt
@@ -0,0 +1,644 @@
+"""SQLite state store in WAL mode, for small deployments without DuckDB."""
+
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import UTC, datetime
+from pathlib import Path
+from typing import Any, Iterable, Iterator, Sequence
+
+from app.state import (
+    DEFAULT_FETCH_SIZE,
+    DEFAULT_SEARCH_ID,
+    DEFAULT_STATE_FILE,
+    ListingDiff,
+    OutboxMessage,
+    PendingDigest,
+    decode_digest,
+    encode_digest,
+    listing_id,
+)
+
+SCHEMA_VERSION = 1
+# ``compact`` vacuums the file once at least this share of its pages is free.
+COMPACT_FREE_RATIO = 0.25
+# Seconds to wait for another process (e.g. a reader) holding the file lock.
+BUSY_TIMEOUT = 5.0
+
+# Same layout as the DuckDB backend: one ``listing_history`` row per listing
+# and search, present from ``added_poll`` until ``removed_poll``.
+SCHEMA_SQL = """
+    CREATE TABLE IF NOT EXISTS metadata (
+        key TEXT PRIMARY KEY,
+        value TEXT
+    );
+    CREATE TABLE IF NOT EXISTS listing_history (
+        search_id TEXT NOT NULL,
+        listing_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        previous_position INTEGER,
+        position_poll INTEGER NOT NULL,
+        added_poll INTEGER NOT NULL,
+        removed_poll INTEGER,
+        first_seen TEXT NOT NULL,
+        last_seen TEXT NOT NULL,
+        removed_at TEXT,
+        PRIMARY KEY (search_id, listing_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS listing_urls (
+        listing_id INTEGER PRIMARY KEY,
+        url TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS search_polls (
+        search_id TEXT PRIMARY KEY,
+        poll INTEGER NOT NULL,
+        polled_at TEXT NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS seen_listings (
+        search_id TEXT NOT NULL,
+        listing_id INTEGER NOT NULL,
+        PRIMARY KEY (search_id, listing_id)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS stable_listings (
+        number INTEGER PRIMARY KEY,
+        created_at TEXT DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS notification_outbox (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        search_id TEXT NOT NULL,
+        channel TEXT NOT NULL,
+        message TEXT NOT NULL,
+        created_at TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        next_attempt_at TEXT NOT NULL
+    );
+    CREATE VIEW IF NOT EXISTS current_listings AS
+    SELECT h.search_id, h.position, h.listing_id, u.url, h.first_seen,
+           p.polled_at AS last_seen
+    FROM listing_history AS h
+    JOIN search_polls AS p USING (search_id)
+    JOIN listing_urls AS u USING (listing_id)
+    WHERE h.removed_poll IS NULL;
+    CREATE VIEW IF NOT EXISTS new_listings AS
+    SELECT h.search_id, h.position, h.listing_id, u.url, h.first_seen
+    FROM listing_history AS h
+    JOIN search_polls AS p USING (search_id)
+    JOIN listing_urls AS u USING (listing_id)
+    WHERE h.removed_poll IS NULL AND h.added_poll = p.poll;
+    CREATE VIEW IF NOT EXISTS previous_listings AS
+    SELECT h.search_id,
+           CASE WHEN h.position_poll = p.poll
+                THEN h.previous_position
+                ELSE h.position
+           END AS position,
+           h.listing_id, u.url, h.first_seen
+    FROM listing_history AS h
+    JOIN search_polls AS p USING (search_id)
+    JOIN listing_urls AS u USING (listing_id)
+    WHERE h.added_poll < p.poll
+      AND coalesce(h.removed_poll, p.poll) >= p.poll;
+"""
+SNAPSHOT_VIEWS = {
+    "current": "current_listings",
+    "previous": "previous_listings",
+    "new": "new_listings",
+}
+UPSERT_METADATA_SQL = """
+    INSERT INTO metadata (key, value) VALUES (?, ?)
+    ON CONFLICT (key) DO UPDATE SET value = excluded.value
+"""
+STORE_URLS_SQL = """
+    INSERT INTO listing_urls (listing_id, url)
+    SELECT listing_id, url FROM listing_batch WHERE true
+    ON CONFLICT (listing_id) DO UPDATE SET url = excluded.url
+    WHERE listing_urls.url <> excluded.url
+"""
+UPSERT_POLL_SQL = """
+    INSERT INTO search_polls (search_id, poll, polled_at) VALUES (?, ?, ?)
+    ON CONFLICT (search_id) DO UPDATE
+    SET poll = excluded.poll, polled_at = excluded.polled_at
+"""
+# Runs before the poll is recorded, so removed listings were last seen at the
+# search's previous poll.
+MARK_REMOVED_SQL = """
+    UPDATE listing_history
+    SET removed_at = ?3,
+        removed_poll = ?2,
+        last_seen = (SELECT p.polled_at FROM search_polls AS p WHERE p.search_id = ?1)
+    WHERE search_id = ?1
+      AND removed_poll IS NULL
+      AND listing_id NOT IN (SELECT listing_id FROM listing_batch)
+"""
+UPSERT_BATCH_SQL = """
+    INSERT INTO listing_history (
+        search_id, listing_id, position, first_seen, last_seen, added_poll,
+        position_poll
+    )
+    SELECT ?1, listing_id, position, ?3, ?3, ?2, ?2 FROM listing_batch WHERE true
+    ON CONFLICT (search_id, listing_id) DO UPDATE SET
+        previous_position = CASE
+            WHEN listing_history.removed_poll IS NULL THEN listing_history.position
+        END,
+        position = excluded.position,
+        position_poll = excluded.position_poll,
+        last_seen = excluded.last_seen,
+        added_poll = CASE
+            WHEN listing_history.removed_poll IS NULL THEN listing_history.added_poll
+            ELSE excluded.added_poll
+        END,
+        removed_at = NULL,
+        removed_poll = NULL
+    WHERE listing_history.removed_poll IS NOT NULL
+       OR listing_history.position <> excluded.position
+"""
+DIFF_POLL_SQL = """
+    SELECT kind, listing_id FROM (
+        SELECT
+            CASE
+                WHEN removed_poll = ?2 THEN 'removed'
+                WHEN added_poll = ?2 THEN 'added'
+                ELSE 'retained'
+            END AS kind,
+            listing_id,
+            position
+        FROM listing_history
+        WHERE search_id = ?1 AND (removed_poll IS NULL OR removed_poll = ?2)
+    )
+    ORDER BY CASE kind WHEN 'added' THEN 0 WHEN 'removed' THEN 1 ELSE 2 END, position
+"""
+# Listings removed at their search's latest poll are kept for the previous
+# snapshot whatever their age.
+PRUNE_HISTORY_SQL = """
+    DELETE FROM listing_history
+    WHERE removed_at < ?
+      AND removed_poll < (
+        SELECT p.poll FROM search_polls AS p
+        WHERE p.search_id = listing_history.search_id
+      )
+"""
+SELECT_LISTING_URLS_SQL = """
+    SELECT listing_id, url FROM listing_urls
+    WHERE listing_id IN (SELECT value FROM json_each(?))
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class _Database:
+    """A SQLite connection shared by every store scoped to one file."""
+
+    def __init__(self, path: Path) -> None:
+        if path.parent and path.parent != Path(""):
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self.connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, check_same_thread=False, autocommit=True
+        )
+        # WAL lets readers in other processes work alongside the monitor, and
+        # NORMAL sync only fsyncs at checkpoints, which is safe in WAL mode.
+        self.connection.execute("PRAGMA journal_mode = WAL")
+        self.connection.execute("PRAGMA synchronous = NORMAL")
+        # One connection serves every thread, so all statements are serialised.
+        self.lock = threading.RLock()
+        self.closed = False
+
+    def close(self) -> None:
+        with self.lock:
+            if not self.closed:
+                self.closed = True
+                self.connection.close()
+
+
+class SQLiteStateStore:
+    """Persist bot state in a SQLite database using write-ahead logging.
+
+    Uses the same tables and views as the DuckDB backend, with listing ids
+    parsed in Python since SQLite has no regular expressions.
+    """
+
+    def __init__(
+        self,
+        path: Path = DEFAULT_STATE_FILE,
+        search_id: str | None = None,
+        *,
+        _database: _Database | None = None,
+    ) -> None:
+        self.path = path
+        self.search_id = search_id
+        if _database is None:
+            self._database = _Database(path)
+            self._initialise()
+        else:
+            self._database = _database
+
+    def __enter__(self) -> SQLiteStateStore:
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._database.close()
+
+    def for_search(self, search_id: str | None) -> SQLiteStateStore:
+        """Return a store for ``search_id`` sharing this store's connection."""
+
+        return SQLiteStateStore(
+            path=self.path, search_id=search_id, _database=self._database
+        )
+
+    def _key(self, name: str) -> str:
+        if self.search_id is None:
+            return name
+        return f"{self.search_id}:{name}"
+
+    @property
+    def _search(self) -> str:
+        return DEFAULT_SEARCH_ID if self.search_id is None else self.search_id
+
+    @contextmanager
+    def _connection(self) -> Iterator[sqlite3.Connection]:
+        with self._database.lock:
+            if self._database.closed:
+                raise RuntimeError(f"State store is closed: {self.path}")
+            yield self._database.connection
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._connection() as connection:
+            # The lock is held for the whole transaction, so an open one
+            # belongs to this thread's ``atomic`` block.
+            if connection.in_transaction:
+                yield connection
+                return
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    @contextmanager
+    def atomic(self) -> Iterator[None]:
+        """Run the writes made inside the block in one transaction.
+
+        The connection is held for the block, so other threads wait for it.
+        """
+
+        with self._transaction():
+            yield
+
+    def _initialise(self) -> None:
+        with self._transaction() as connection:
+            for statement in SCHEMA_SQL.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+            connection.execute(
+                UPSERT_METADATA_SQL, ("schema_version", str(SCHEMA_VERSION))
+            )
+
+    def ensure_file(self) -> None:
+        """Ensure the database file exists and fold the WAL back into it."""
+
+        with self._connection() as connection:
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def flush(self) -> None:
+        """Writes commit as they happen; SQLite checkpoints the WAL itself."""
+
+    def prune_history(self, before: datetime) -> int:
+        """Delete listings of every search that were removed before ``before``.
+
+        URLs and stable listing numbers no search refers to any more are
+        dropped with them. Returns the number of history rows deleted.
+        """
+
+        cutoff = before.isoformat(sep=" ")
+        with self._transaction() as connection:
+            deleted = connection.execute(PRUNE_HISTORY_SQL, (cutoff,)).rowcount
+            connection.execute(
+                "DELETE FROM listing_urls WHERE listing_id NOT IN "
+                "(SELECT listing_id FROM listing_history)"
+            )
+            connection.execute(
+                "DELETE FROM stable_listings WHERE created_at < ? AND number NOT IN "
+                "(SELECT listing_id FROM listing_history)",
+                (cutoff,),
+            )
+        return deleted
+
+    def compact(self) -> None:
+        """Fold the WAL into the file and vacuum it if many pages are free."""
+
+        with self._connection() as connection:
+            connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            (pages,) = connection.execute("PRAGMA page_count").fetchone()
+            (free,) = connection.execute("PRAGMA freelist_count").fetchone()
+            if pages and free / pages >= COMPACT_FREE_RATIO:
+                logger.info("Vacuuming %s to reclaim %s free pages", self.path, free)
+                connection.execute("VACUUM")
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def reset(self) -> None:
+        """Clear all stored state."""
+
+        with self._transaction() as connection:
+            for table in (
+                "metadata",
+                "listing_history",
+                "listing_urls",
+                "search_polls",
+                "seen_listings",
+                "stable_listings",
+                "notification_outbox",
+            ):
+                connection.execute(f"DELETE FROM {table}")
+
+    def get_property_count(self) -> int:
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT value FROM metadata WHERE key = ?",
+                (self._key("property_count"),),
+            ).fetchone()
+        if row is None:
+            return 0
+
+        raw_value = row[0]
+        try:
+            return int(raw_value)
+        except (TypeError, ValueError):
+            logger.warning(
+                "Invalid property count '%s' in state store; resetting to 0.",
+                raw_value,
+            )
+            self.set_property_count(0)
+            return 0
+
+    def set_property_count(self, value: int) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                UPSERT_METADATA_SQL, (self._key("property_count"), str(value))
+            )
+
+    def get_pending_digest(self) -> PendingDigest | None:
+        with self._connection() as connection:
+            row = connection.execute(
+                "SELECT value FROM metadata WHERE key = ?",
+                (self._key("pending_digest"),),
+            ).fetchone()
+        if row is None:
+            return None
+        try:
+            return decode_digest(row[0])
+        except ValueError:
+            logger.warning("Ignoring invalid pending digest in state store.")
+            return None
+
+    def set_pending_digest(self, digest: PendingDigest | None) -> None:
+        key = self._key("pending_digest")
+        with self._transaction() as connection:
+            if digest is None:
+                connection.execute("DELETE FROM metadata WHERE key = ?", (key,))
+            else:
+                connection.execute(UPSERT_METADATA_SQL, (key, encode_digest(digest)))
+
+    def _snapshot_query(self, snapshot: str) -> str:
+        try:
+            view = SNAPSHOT_VIEWS[snapshot]
+        except KeyError:
+            raise ValueError(f"Unknown listing snapshot: {snapshot}") from None
+        return f"SELECT url FROM {view} WHERE search_id = ? ORDER BY position"
+
+    def _snapshot_urls(self, snapshot: str) -> list[str]:
+        with self._connection() as connection:
+            rows = connection.execute(
+                self._snapshot_query(snapshot), (self._search,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def get_current_listings(self) -> list[str]:
+        return self._snapshot_urls("current")
+
+    def get_previous_listings(self) -> list[str]:
+        return self._snapshot_urls("previous")
+
+    def get_new_listings(self) -> list[str]:
+        return self._snapshot_urls("new")
+
+    def iterate_snapshot(
+        self, snapshot: str, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[str]:
+        """Yield URLs for a snapshot, fetching ``batch_size`` rows at a time.
+
+        Rows are read on a separate read-only connection, which WAL mode lets
+        run alongside writes without holding the store's lock between batches.
+        """
+
+        yield from self._read_batches(self._snapshot_query(snapshot), batch_size)
+
+    def _read_batches(self, query: str, batch_size: int) -> Iterator[Any]:
+        if batch_size < 1:
+            raise ValueError(f"batch_size must be positive: {batch_size}")
+        if self._database.closed:
+            raise RuntimeError(f"State store is closed: {self.path}")
+        reader = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        try:
+            reader.execute("PRAGMA query_only = ON")
+            cursor = reader.execute(query, (self._search,))
+            while rows := cursor.fetchmany(batch_size):
+                for row in rows:
+                    yield row[0]
+        finally:
+            reader.close()
+
+    def get_current_listing_ids(self) -> set[int]:
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT listing_id FROM listing_history "
+                "WHERE search_id = ? AND removed_poll IS NULL",
+                (self._search,),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_listing_urls(self, listing_ids: Sequence[int]) -> list[str]:
+        """Return the URLs of ``listing_ids`` in the same order."""
+
+        if not listing_ids:
+            return []
+        with self._connection() as connection:
+            rows = connection.execute(
+                SELECT_LISTING_URLS_SQL, (json.dumps(list(listing_ids)),)
+            ).fetchall()
+        urls = dict(rows)
+        return [urls[number] for number in listing_ids if number in urls]
+
+    def update_current_listings(self, urls: Sequence[str]) -> list[str]:
+        return self.get_listing_urls(self.replace_current_listings(urls).added)
+
+    def replace_current_listings(self, urls: Sequence[str]) -> ListingDiff:
+        """Record ``urls`` as the search's next poll and diff it against the last.
+
+        Works like the DuckDB backend: the batch is staged in a temporary
+        table, upserted into ``listing_history`` and diffed in SQL.
+        """
+
+        batch: dict[int, tuple[str, int]] = {}
+        for position, url in enumerate(urls):
+            batch.setdefault(listing_id(url), (url, position))
+        # Timestamps are stored as UTC ISO strings, matching DuckDB's naive UTC.
+        now = datetime.now(UTC).replace(tzinfo=None).isoformat(sep=" ")
+
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT poll FROM search_polls WHERE search_id = ?", (self._search,)
+            ).fetchone()
+            poll = (row[0] if row else 0) + 1
+
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS listing_batch ("
+                "listing_id INTEGER PRIMARY KEY, url TEXT NOT NULL, "
+                "position INTEGER NOT NULL)"
+            )
+            connection.execute("DELETE FROM listing_batch")
+            connection.executemany(
+                "INSERT INTO listing_batch (listing_id, url, position) "
+                "VALUES (?, ?, ?)",
+                [(number, url, position) for number, (url, position) in batch.items()],
+            )
+            connection.execute(STORE_URLS_SQL)
+            connection.execute(MARK_REMOVED_SQL, (self._search, poll, now))
+            connection.execute(UPSERT_POLL_SQL, (self._search, poll, now))
+            connection.execute(UPSERT_BATCH_SQL, (self._search, poll, now))
+            rows = connection.execute(DIFF_POLL_SQL, (self._search, poll)).fetchall()
+
+        diff = ListingDiff()
+        for kind, number in rows:
+            getattr(diff, kind).append(number)
+        return diff
+
+    def iterate_seen_listing_ids(
+        self, *, batch_size: int = DEFAULT_FETCH_SIZE
+    ) -> Iterator[int]:
+        """Yield the ids the search has seen, on a separate read-only connection."""
+
+        yield from self._read_batches(
+            "SELECT listing_id FROM seen_listings WHERE search_id = ?", batch_size
+        )
+
+    def get_seen_listing_ids(self, listing_ids: Sequence[int]) -> set[int]:
+        if not listing_ids:
+            return set()
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT listing_id FROM seen_listings WHERE search_id = ? "
+                "AND listing_id IN (SELECT value FROM json_each(?))",
+                (self._search, json.dumps(list(listing_ids))),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def add_seen_listing_ids(self, listing_ids: Iterable[int]) -> None:
+        values = [int(number) for number in listing_ids]
+        if not values:
+            return
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO seen_listings (search_id, listing_id) "
+                "SELECT ?, value FROM json_each(?)",
+                (self._search, json.dumps(values)),
+            )
+
+    def get_stable_listing_numbers(self) -> set[int]:
+        """Return listing numbers previously verified as genuine."""
+
+        with self._connection() as connection:
+            rows = connection.execute("SELECT number FROM stable_listings").fetchall()
+        return {row[0] for row in rows}
+
+    def add_stable_listing_numbers(self, numbers: Iterable[int]) -> None:
+        """Persist listing numbers that survived dummy-listing verification."""
+
+        values = [int(number) for number in numbers]
+        if not values:
+            return
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR IGNORE INTO stable_listings (number) "
+                "SELECT value FROM json_each(?)",
+                (json.dumps(values),),
+            )
+
+    def add_notifications(
+        self, messages: Iterable[str], *, channels: Sequence[str]
+    ) -> None:
+        values = list(messages)
+        if not values or not channels:
+            return
+        now = datetime.now(UTC).replace(tzinfo=None).isoformat(sep=" ")
+        with self._transaction() as connection:
+            connection.executemany(
+                "INSERT INTO notification_outbox "
+                "(search_id, channel, message, created_at, next_attempt_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [
+                    (self._search, channel, message, now, now)
+                    for message in values
+                    for channel in channels
+                ],
+            )
+
+    def get_due_notifications(
+        self, now: datetime, *, channel: str, limit: int
+    ) -> list[OutboxMessage]:
+        with self._connection() as connection:
+            rows = connection.execute(
+                "SELECT id, message, created_at, attempts FROM notification_outbox "
+                "WHERE channel = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+                (channel, now.isoformat(sep=" "), limit),
+            ).fetchall()
+        return [
+            OutboxMessage(number, message, datetime.fromisoformat(created), attempts)
+            for number, message, created, attempts in rows
+        ]
+
+    def prune_notifications(self, channels: Sequence[str]) -> int:
+        targets = json.dumps(list(channels))
+        with self._transaction() as connection:
+            dropped = connection.execute(
+                "DELETE FROM notification_outbox "
+                "WHERE channel NOT IN (SELECT value FROM json_each(?))",
+                (targets,),
+            ).rowcount
+        return dropped
+
+    def count_notifications(self) -> int:
+        with self._connection() as connection:
+            (count,) = connection.execute(
+                "SELECT count(*) FROM notification_outbox"
+            ).fetchone()
+        return int(count)
+
+    def complete_notifications(self, ids: Sequence[int]) -> None:
+        if not ids:
+            return
+        with self._transaction() as connection:
+            connection.execute(
+                "DELETE FROM notification_outbox "
+                "WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(ids)),),
+            )
+
+    def retry_notifications(self, ids: Sequence[int], next_attempt: datetime) -> None:
+        if not ids:
+            return
+        with self._transaction() as connection:
+            connection.execute(
+                "UPDATE notification_outbox "
+                "SET attempts = attempts + 1, next_attempt_at = ? "
+                "WHERE id IN (SELECT value FROM json_each(?))",
+                (next_attempt.isoformat(sep=" "), json.dumps(list(ids))),
+            )
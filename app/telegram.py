@@ -1,25 +1,159 @@
 import json
 import logging
+import threading
 
 import requests
 
+from app.http_client import HttpClient, get_http_client
+from app.metrics import telegram_rate_limited_total, telegram_throttled_seconds_total
+from app.rate_limit import TokenBucket
+
+API_URL = "https://api.telegram.org/bot{token}/sendMessage"
+# Longest message text the Bot API accepts.
+MAX_MESSAGE_LENGTH = 4096
+# Telegram's documented limits: about 30 messages per second overall, one per
+# second to a private chat and 20 per minute to a group.
+GLOBAL_RATE = 30.0
+CHAT_RATE = 1.0
+GROUP_RATE = 20 / 60
+# Times a message is retried after a 429 before giving up.
+MAX_RATE_LIMIT_RETRIES = 5
+DEFAULT_RETRY_AFTER = 1.0
+
 logger = logging.getLogger(__name__)
 
 
-def send_message(token: str, chat_id: str, text: str) -> None:
-    """Send a message via the Telegram Bot API."""
+def split_message(text: str, limit: int = MAX_MESSAGE_LENGTH) -> list[str]:
+    """Split ``text`` into chunks of at most ``limit`` characters.
+
+    Chunks break at line ends where possible; longer lines are cut.
+    """
+
+    chunks: list[str] = []
+    current = ""
+    for line in text.splitlines(keepends=True):
+        while len(line) > limit:
+            if current:
+                chunks.append(current)
+                current = ""
+            chunks.append(line[:limit])
+            line = line[limit:]
+        if len(current) + len(line) > limit:
+            chunks.append(current)
+            current = ""
+        current += line
+    if current or not chunks:
+        chunks.append(current)
+    return [chunk.rstrip("\n") or chunk for chunk in chunks]
+
+
+def _retry_after(response: requests.Response) -> float:
+    try:
+        return float(response.json()["parameters"]["retry_after"])
+    except (ValueError, KeyError, TypeError):
+        pass
+    try:
+        return float(response.headers.get("Retry-After", DEFAULT_RETRY_AFTER))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+class TelegramClient:
+    """Send Bot API messages within Telegram's rate limits.
+
+    Every message takes a token from a bucket for its chat and from one shared
+    by all chats before it is sent, so bursts are spread out instead of being
+    rejected. A ``429 Too Many Requests`` pauses the chat for the
+    ``retry_after`` Telegram asks for, then the message is sent again. Safe to
+    share between threads.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        *,
+        client: HttpClient | None = None,
+        global_rate: float = GLOBAL_RATE,
+        chat_rate: float = CHAT_RATE,
+        group_rate: float = GROUP_RATE,
+        max_retries: int = MAX_RATE_LIMIT_RETRIES,
+    ) -> None:
+        self.url = API_URL.format(token=token)
+        self.client = client
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self._global = TokenBucket(global_rate, capacity=global_rate)
+        self._chats: dict[str, TokenBucket] = {}
+        self._lock = threading.Lock()
+
+    def _chat_bucket(self, chat_id: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._chats.get(chat_id)
+            if bucket is None:
+                # Private chats have positive ids; groups and channels have
+                # negative ids or are addressed as ``@channelusername``.
+                rate = self.chat_rate if chat_id.isdigit() else self.group_rate
+                bucket = self._chats[chat_id] = TokenBucket(rate)
+            return bucket
+
+    def send_message(
+        self, chat_id: str, text: str, *, timeout: float | None = None
+    ) -> None:
+        """Send ``text``, split into several messages if it is too long.
+
+        Raises ``requests.RequestException`` if a request fails, Telegram
+        rejects it, or it is still rate limited after ``max_retries`` retries.
+        ``timeout`` applies to each request and defaults to the HTTP client's.
+        """
+
+        logger.info("Sending message to chat_id %s: %s", chat_id, text)
+        for chunk in split_message(text):
+            self._send(chat_id, chunk, timeout)
+
+    def _send(self, chat_id: str, text: str, timeout: float | None) -> None:
+        client = self.client or get_http_client()
+        data = json.dumps({"chat_id": chat_id, "text": text}).encode("utf-8")
+        chat = self._chat_bucket(chat_id)
+        for _ in range(self.max_retries + 1):
+            waited = chat.acquire() + self._global.acquire()
+            if waited:
+                telegram_throttled_seconds_total.inc(waited)
+            response = client.post(
+                self.url,
+                data=data,
+                headers={"Content-Type": "application/json"},
+                timeout=timeout or client.timeout,
+            )
+            logger.debug("Response: %s %s", response.status_code, response.text)
+            if response.status_code != 429:
+                response.raise_for_status()
+                return
+            retry_after = _retry_after(response)
+            telegram_rate_limited_total.inc()
+            logger.warning(
+                "Telegram rate limited chat_id %s; retrying in %.0fs",
+                chat_id,
+                retry_after,
+            )
+            chat.pause(retry_after)
+        response.raise_for_status()
+
+
+def send_message(
+    token: str,
+    chat_id: str,
+    text: str,
+    client: HttpClient | None = None,
+    timeout: float | None = None,
+) -> None:
+    """Send a message via the Telegram Bot API.
+
+    A one-off :class:`TelegramClient` send; long-running callers should keep
+    a client so its rate limits apply across messages.
+    """
 
-    logger.info("Sending message to chat_id %s: %s", chat_id, text)
-    payload = {
-        "chat_id": chat_id,
-        "text": text,
-    }
-    data = json.dumps(payload).encode("utf-8")
-    url = f"https://api.telegram.org/bot{token}/sendMessage"
-    response = requests.post(
-        url, data=data, headers={"Content-Type": "application/json"}
-    )
-    logger.debug("Response: %s %s", response.status_code, response.text)
+    TelegramClient(token, client=client).send_message(chat_id, text, timeout=timeout)
 
 
 if __name__ == "__main__":
@@ -29,11 +163,9 @@ if __name__ == "__main__":
     configure_logging("INFO")
     settings = MonitorSettings()
 
-    if not settings.telegram_token or not settings.telegram_chat_id:
+    if not settings.telegram_token or not settings.telegram_chat_ids:
         raise RuntimeError("TELEGRAM_TOKEN and TELEGRAM_CHAT_ID must be set")
 
-    send_message(
-        token=settings.telegram_token,
-        chat_id=settings.telegram_chat_id,
-        text="Hello, World!",
-    )
+    telegram = TelegramClient(settings.telegram_token)
+    for chat_id in settings.telegram_chat_ids:
+        telegram.send_message(chat_id, "Hello, World!")
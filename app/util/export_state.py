@@ -0,0 +1,70 @@
+"""Export listing snapshots and history from the state file to Parquet or CSV."""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import duckdb
+
+from app.state import DEFAULT_STATE_FILE
+from app.state_duckdb import EXPORT_FORMATS, SNAPSHOT_VIEWS, DuckDBStateStore
+
+TABLES = ("history", *SNAPSHOT_VIEWS)
+
+
+def _parse_args(argv: list[str]) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(
+        description=(
+            "Write a listing snapshot or the full listing history of a search to "
+            "a Parquet or CSV file. Stop the monitor first: DuckDB lets only one "
+            "process open the state file."
+        )
+    )
+    parser.add_argument("table", choices=TABLES, help="What to export")
+    parser.add_argument(
+        "output",
+        type=Path,
+        help="File to write; the format is taken from its .parquet/.csv suffix",
+    )
+    parser.add_argument(
+        "--state-file",
+        type=Path,
+        default=Path(os.environ.get("P24_STATE_FILE") or DEFAULT_STATE_FILE),
+        help="DuckDB state file (default: $P24_STATE_FILE or data/state.duckdb)",
+    )
+    parser.add_argument(
+        "--search-id",
+        help="Search id in multi-search mode (default: the P24_PAYLOAD_FILE search)",
+    )
+    parser.add_argument(
+        "--format",
+        choices=EXPORT_FORMATS,
+        help="Output format, overriding the output file's suffix",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = _parse_args(sys.argv[1:] if argv is None else argv)
+    if not args.state_file.exists():
+        print(f"State file not found: {args.state_file}", file=sys.stderr)
+        return 1
+
+    try:
+        with DuckDBStateStore(path=args.state_file) as store:
+            store.for_search(args.search_id).export(
+                args.table, args.output, file_format=args.format
+            )
+    except (ValueError, duckdb.Error) as exc:
+        print(f"Export failed: {exc}", file=sys.stderr)
+        return 1
+
+    print(f"Wrote {args.table} to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,33 @@
+import json
+import logging
+from urllib.parse import urlsplit
+
+from app.http_client import HttpClient, get_http_client
+
+logger = logging.getLogger(__name__)
+
+
+def send_message(
+    url: str,
+    message: str,
+    client: HttpClient | None = None,
+    timeout: float | None = None,
+) -> None:
+    """POST ``message`` to a webhook as ``{"text": message}``.
+
+    The ``text`` field is what Slack, Mattermost and most chat webhooks read.
+    Raises ``requests.RequestException`` if the request fails or the server
+    rejects it. ``timeout`` defaults to the HTTP client's timeout.
+    """
+
+    # Webhook URLs often carry a secret token, so only the host is logged.
+    logger.info("Sending message to webhook at %s: %s", urlsplit(url).netloc, message)
+    client = client or get_http_client()
+    response = client.post(
+        url,
+        data=json.dumps({"text": message}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        timeout=timeout or client.timeout,
+    )
+    logger.info("Response status code: %s", response.status_code)
+    response.raise_for_status()
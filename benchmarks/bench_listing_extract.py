@@ -0,0 +1,105 @@
+"""Micro-benchmark for listing extraction from Property24 result pages.
+
+Compares the original triple regex scan over decoded text with the single-pass
+byte-level scanner. Pass recorded result pages (saved HTML files) as arguments,
+or run without arguments to use synthetic pages of a similar shape:
+
+    uv run python benchmarks/bench_listing_extract.py data/pages/*.html
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.property24 import (  # noqa: E402
+    BASE_URL,
+    _extract_listing_urls,
+    _scan_listing_page,
+)
+
+LEGACY_NUMBER_PATTERN = re.compile(r'data-listing-number="(\d+)"')
+LEGACY_HREF_PATTERN = re.compile(r'href="(?P<path>/to-rent/[^"?#]+/(?P<number>\d+))"')
+
+
+def _legacy_extract(content1: bytes, content2: bytes) -> list[str]:
+    text1 = content1.decode("utf-8")
+    text2 = content2.decode("utf-8")
+    numbers = set(LEGACY_NUMBER_PATTERN.findall(text1)) & set(
+        LEGACY_NUMBER_PATTERN.findall(text2)
+    )
+    urls: list[str] = []
+    for match in LEGACY_HREF_PATTERN.finditer(text2):
+        if numbers and match.group("number") not in numbers:
+            continue
+        absolute = f"{BASE_URL}{match.group('path')}"
+        if absolute not in urls:
+            urls.append(absolute)
+    return urls
+
+
+def _single_pass_extract(content1: bytes, content2: bytes) -> list[str]:
+    numbers1, _ = _scan_listing_page(content1)
+    numbers2, links2 = _scan_listing_page(content2)
+    return _extract_listing_urls(links2, numbers1 & numbers2)
+
+
+def _synthetic_page(seed: int, listings: int = 20) -> bytes:
+    rng = random.Random(seed)
+    filler = '<div class="p24_price" id="x"><span>R 12 500</span></div>' * 100
+    parts = ["<html><head>", "<script>var x = 1;</script>" * 4000, "</head><body>"]
+    for _ in range(listings):
+        number = rng.randint(110_000_000, 119_999_999)
+        path = f"/to-rent/stellenbosch-central/stellenbosch/{seed}/{number}"
+        parts.append(
+            f'<div class="p24_regularTile" data-listing-number="{number}">'
+            f'<a href="{path}">Listing</a>{filler}<a href="{path}">Photos</a></div>'
+        )
+    parts.append("</body></html>")
+    return "".join(parts).encode("utf-8")
+
+
+def _throughput(
+    extract: object, pages: list[bytes], repeat: int
+) -> tuple[float, list[list[str]]]:
+    assert callable(extract)
+    total_bytes = sum(len(page) for page in pages) * 2 * repeat
+    results: list[list[str]] = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        results = [extract(page, page) for page in pages]
+    elapsed = time.perf_counter() - start
+    return total_bytes / elapsed / 1_000_000, results
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("pages", nargs="*", type=Path, help="Recorded HTML pages")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    if args.pages:
+        pages = [path.read_bytes() for path in args.pages]
+    else:
+        pages = [_synthetic_page(seed) for seed in range(20)]
+
+    legacy_rate, legacy_results = _throughput(_legacy_extract, pages, args.repeat)
+    single_rate, single_results = _throughput(_single_pass_extract, pages, args.repeat)
+    if legacy_results != single_results:
+        raise SystemExit("Extractors disagree on the listing URLs")
+
+    size_mb = sum(len(page) for page in pages) / 1_000_000
+    print(f"pages: {len(pages)} ({size_mb:.2f} MB)")
+    print(f"triple regex scan (decoded text): {legacy_rate:8.1f} MB/s")
+    print(f"single-pass byte scan:            {single_rate:8.1f} MB/s")
+    print(f"speedup: {single_rate / legacy_rate:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Benchmark the state store work done by one monitor poll.
+
+A poll with a count change reads the property count, loads the previous
+snapshot, records the new one, writes the count and loads the verified listing
+numbers. The same sequence runs against a store that opens a new DuckDB
+connection for every call (the original behaviour) and against the
+persistent-connection store:
+
+    uv run python benchmarks/bench_state.py --listings 500 --polls 50
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+import duckdb
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.state_duckdb import DuckDBStateStore  # noqa: E402
+
+
+class ReconnectingStateStore(DuckDBStateStore):
+    """Store that connects and disconnects around every operation."""
+
+    def __init__(self, path: Path) -> None:
+        super().__init__(path=path)
+        self.close()
+
+    @contextmanager
+    def _cursor(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        connection = duckdb.connect(str(self.path))
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+
+def _poll(store: DuckDBStateStore, poll: int, listings: int) -> None:
+    store.get_property_count()
+    store.get_previous_listings()
+    urls = [
+        f"https://www.property24.com/to-rent/area/city/{poll * 10 + index}"
+        for index in range(listings)
+    ]
+    store.update_current_listings(urls)
+    store.set_property_count(listings + poll)
+    store.get_stable_listing_numbers()
+
+
+def _run(store: DuckDBStateStore, polls: int, listings: int) -> float:
+    _poll(store, 0, listings)
+    started = time.perf_counter()
+    for poll in range(1, polls + 1):
+        _poll(store, poll, listings)
+    return (time.perf_counter() - started) / polls
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=200)
+    parser.add_argument("--polls", type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        legacy = ReconnectingStateStore(Path(directory) / "legacy.duckdb")
+        legacy_seconds = _run(legacy, args.polls, args.listings)
+
+        with DuckDBStateStore(path=Path(directory) / "state.duckdb") as store:
+            persistent_seconds = _run(store, args.polls, args.listings)
+
+    print(f"listings per poll:     {args.listings}")
+    print(f"connect per call:      {legacy_seconds * 1000:8.2f} ms/poll")
+    print(f"persistent connection: {persistent_seconds * 1000:8.2f} ms/poll")
+    print(f"speedup:               {legacy_seconds / persistent_seconds:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Compare poll latency and file size of the state backends.
+
+Every backend records the same sequence of polls, each replacing a share of
+the listings (``--churn``), as a monitor with a count change would:
+
+    uv run python benchmarks/bench_state_backends.py --listings 1000 --polls 50
+
+``--cache`` puts the write-behind cache in front of the file backends, flushing
+every ``--flush-every`` polls, to show the latency it takes off the poll loop.
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.state import StateStore, open_state_store  # noqa: E402
+from app.state_cache import CachedStateStore  # noqa: E402
+
+BACKENDS = ("duckdb", "sqlite", "memory")
+
+
+def _urls(poll: int, listings: int, churn: float) -> list[str]:
+    first = int(poll * listings * churn)
+    return [
+        f"https://www.property24.com/to-rent/area/city/{number}"
+        for number in range(first, first + listings)
+    ]
+
+
+def _poll(store: StateStore, poll: int, listings: int, churn: float) -> None:
+    store.get_property_count()
+    known = store.get_current_listing_ids()
+    diff = store.replace_current_listings(_urls(poll, listings, churn))
+    store.get_listing_urls(diff.added[:10])
+    store.set_property_count(listings + len(known))
+
+
+def _file_size(path: Path) -> int:
+    return sum(
+        candidate.stat().st_size
+        for candidate in path.parent.glob(f"{path.name}*")
+        if candidate.is_file()
+    )
+
+
+def _run(
+    backend: str,
+    directory: Path,
+    polls: int,
+    listings: int,
+    churn: float,
+    flush_every: int | None,
+) -> tuple[list[float], int]:
+    path = directory / f"state.{backend}"
+    store = open_state_store(backend, path)
+    if flush_every is not None and backend != "memory":
+        store = CachedStateStore(store, durability="interval", flush_interval=3600)
+    timings: list[float] = []
+    with store:
+        _poll(store, 0, listings, churn)
+        for poll in range(1, polls + 1):
+            started = time.perf_counter()
+            _poll(store, poll, listings, churn)
+            timings.append(time.perf_counter() - started)
+            if flush_every and poll % flush_every == 0:
+                store.flush()
+        store.ensure_file()
+    return timings, _file_size(path)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--listings", type=int, default=1000)
+    parser.add_argument("--polls", type=int, default=30)
+    parser.add_argument("--churn", type=float, default=0.1)
+    parser.add_argument("--backend", action="append", choices=BACKENDS)
+    parser.add_argument("--cache", action="store_true")
+    parser.add_argument("--flush-every", type=int, default=10)
+    args = parser.parse_args()
+    flush_every = args.flush_every if args.cache else None
+
+    print(f"listings per poll: {args.listings}, churn: {args.churn:.0%}")
+    print(f"{'backend':<8} {'mean ms':>9} {'p95 ms':>9} {'file KiB':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for backend in args.backend or BACKENDS:
+            timings, size = _run(
+                backend,
+                Path(directory),
+                args.polls,
+                args.listings,
+                args.churn,
+                flush_every,
+            )
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else 0
+            print(
+                f"{backend:<8} {statistics.mean(timings) * 1000:9.2f} "
+                f"{p95 * 1000:9.2f} {size / 1024:10.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,7 @@
+"""Helpers shared by the test modules."""
+
+
+def example_urls(*numbers: int) -> list[str]:
+    """Return listing URLs ending in ``numbers``, as stored by the state stores."""
+
+    return [f"https://example.com/listing/{number}" for number in numbers]
@@ -0,0 +1,110 @@
+from pathlib import Path
+
+import pytest
+from helpers import example_urls
+
+from app.bloom import BloomFilter, ScalableBloomFilter, SeenListingIndex
+from app.property24 import ListingPage, ListingTracker
+from app.state_duckdb import DuckDBStateStore
+from app.state_memory import MemoryStateStore
+
+
+def test_bloom_filter_has_no_false_negatives() -> None:
+    bloom = BloomFilter(capacity=10_000, error_rate=0.01)
+    for number in range(0, 20_000, 2):
+        bloom.add(number)
+
+    assert all(number in bloom for number in range(0, 20_000, 2))
+    false_positives = sum(number in bloom for number in range(1, 20_000, 2))
+    assert false_positives < 10_000 * 0.02
+    assert bloom.nbytes == 11_982
+
+
+def test_bloom_filter_rejects_bad_sizes() -> None:
+    with pytest.raises(ValueError, match="capacity"):
+        BloomFilter(capacity=0, error_rate=0.01)
+    with pytest.raises(ValueError, match="error_rate"):
+        BloomFilter(capacity=10, error_rate=1)
+
+
+def test_scalable_bloom_filter_adds_layers() -> None:
+    bloom = ScalableBloomFilter(capacity=1_000, error_rate=0.01)
+    for number in range(5_000):
+        bloom.add(number)
+
+    assert [layer.capacity for layer in bloom.layers] == [1_000, 2_000, 4_000]
+    assert all(number in bloom for number in range(5_000))
+    false_positives = sum(number in bloom for number in range(5_000, 25_000))
+    assert false_positives < 20_000 * 0.02
+    assert not bloom.add(1)
+
+
+def test_seen_index_confirms_hits_in_the_store() -> None:
+    store = MemoryStateStore()
+    store.add_seen_listing_ids([1, 2])
+    # A tiny filter answers "maybe" for almost everything.
+    index = SeenListingIndex(store, capacity=1, error_rate=0.5)
+    index.add([3])
+
+    assert index.unseen([1, 3, 4, 5]) == [4, 5]
+    assert store.get_seen_listing_ids([3]) == {3}
+
+
+def test_tracker_does_not_report_relisted_listings(tmp_path: Path) -> None:
+    with DuckDBStateStore(path=tmp_path / "state.duckdb") as store:
+        tracker = ListingTracker(store, seen_index=SeenListingIndex(store))
+        assert tracker.record(example_urls(1, 2)) == [1, 2]
+        assert tracker.record(example_urls(2)) == []
+        assert tracker.record(example_urls(1, 2, 3)) == [3]
+
+    with DuckDBStateStore(path=tmp_path / "state.duckdb") as store:
+        tracker = ListingTracker(store, seen_index=SeenListingIndex(store))
+        assert tracker.record(example_urls(3)) == []
+        assert tracker.record_recent(example_urls(2, 4)) == [4]
+
+
+def test_tracker_filters_relisted_listings_per_page() -> None:
+    store = MemoryStateStore()
+    tracker = ListingTracker(store, seen_index=SeenListingIndex(store))
+    tracker.record(example_urls(1, 2))
+    tracker.record(example_urls(2))
+
+    pages = [
+        ListingPage(
+            page=1,
+            numbers=frozenset(),
+            urls=tuple(example_urls(1, 3)),
+            requests=1,
+            elapsed=0,
+        ),
+        ListingPage(
+            page=2,
+            numbers=frozenset(),
+            urls=tuple(example_urls(2, 4)),
+            requests=1,
+            elapsed=0,
+        ),
+    ]
+    new_ids = [ids for _, ids in tracker.record_pages(pages)]
+
+    assert new_ids == [[3], [4]]
+    assert store.get_seen_listing_ids([1, 2, 3, 4]) == {1, 2, 3, 4}
+
+
+def test_seen_index_is_sized_from_the_stored_ids() -> None:
+    small = MemoryStateStore()
+    small.add_seen_listing_ids(range(10))
+    large = small.for_search("large")
+    large.add_seen_listing_ids(range(5_000))
+
+    small_index = SeenListingIndex(small)
+    large_index = SeenListingIndex(large)
+    small_index.unseen([1])
+    large_index.unseen([1])
+
+    assert small_index._filter is not None and large_index._filter is not None
+    assert [layer.capacity for layer in small_index._filter.layers] == [1_000]
+    assert [layer.capacity for layer in large_index._filter.layers] == [10_000]
+    # A search that outgrows its filter gains a layer rather than more errors.
+    small_index.add(range(10, 2_000))
+    assert [layer.capacity for layer in small_index._filter.layers] == [1_000, 2_000]
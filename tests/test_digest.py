@@ -0,0 +1,78 @@
+"""Tests for the notification digest window."""
+
+from __future__ import annotations
+
+from app.digest import Digest, ListingDigest
+from app.state import PendingDigest
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_digest_collects_polls_until_window_closes() -> None:
+    clock = FakeClock()
+    digest = ListingDigest(60.0, 50, clock=clock)
+    assert not digest.pending
+    assert digest.close_reason() is None
+
+    digest.add(11, [1, 2])
+    clock.now = 30.0
+    digest.add(12, [3])
+    assert digest.pending
+    assert digest.close_reason() is None
+
+    clock.now = 60.0
+    assert digest.close_reason() == "window"
+    assert digest.take() == Digest(12, [1, 2, 3], polls=2)
+    assert not digest.pending
+    assert digest.take() is None
+
+
+def test_digest_closes_early_at_max_listings() -> None:
+    clock = FakeClock()
+    digest = ListingDigest(3600.0, 3, clock=clock)
+
+    digest.add(12, [1, 2])
+    assert digest.close_reason() is None
+    digest.add(14, [3, 4])
+
+    assert digest.close_reason() == "size"
+    assert digest.take() == Digest(14, [1, 2, 3, 4], polls=2)
+
+
+def test_window_opens_with_the_next_increase() -> None:
+    clock = FakeClock()
+    digest = ListingDigest(60.0, 50, clock=clock)
+    digest.add(11, [1])
+    clock.now = 100.0
+    digest.take()
+
+    clock.now = 500.0
+    digest.add(12, [])
+
+    assert digest.close_reason() is None
+    clock.now = 560.0
+    assert digest.take() == Digest(12, [], polls=1)
+
+
+def test_pending_state_reopens_the_window() -> None:
+    clock = FakeClock()
+    digest = ListingDigest(60.0, 50, clock=clock)
+    assert digest.pending_state() is None
+    clock.now = 10.0
+    digest.add(11, [1, 2])
+
+    state = digest.pending_state()
+    assert state == PendingDigest(11, [1, 2], 1, 10.0)
+    restored = ListingDigest(60.0, 50, clock=clock)
+    assert state is not None
+    restored.restore(state)
+
+    clock.now = 70.0
+    assert restored.close_reason() == "window"
+    assert restored.take() == Digest(11, [1, 2], polls=1)
@@ -0,0 +1,30 @@
+from pathlib import Path
+
+from app.http_cache import ResponseCache, content_digest
+
+
+def test_response_cache_round_trips_validators(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / "cache")
+    cache.store("https://example.com/p1", b"<html>1</html>", etag='"abc"')
+
+    entry = ResponseCache(tmp_path / "cache").lookup("https://example.com/p1")
+
+    assert entry is not None
+    assert entry.body == b"<html>1</html>"
+    assert entry.digest == content_digest(b"<html>1</html>")
+    assert entry.conditional_headers() == {"If-None-Match": '"abc"'}
+
+
+def test_response_cache_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = ResponseCache(tmp_path / "cache", max_bytes=20)
+    cache.store("https://example.com/p1", b"a" * 8)
+    cache.store("https://example.com/p2", b"b" * 8)
+    assert cache.lookup("https://example.com/p1") is not None
+
+    cache.store("https://example.com/p3", b"c" * 8)
+
+    assert cache.total_bytes == 16
+    assert cache.lookup("https://example.com/p2") is None
+    assert cache.lookup("https://example.com/p1") is not None
+    assert cache.lookup("https://example.com/p3") is not None
+    assert len(list((tmp_path / "cache").glob("*.body"))) == 2
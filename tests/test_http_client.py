@@ -0,0 +1,71 @@
+"""Tests for the shared HTTP client."""
+
+from __future__ import annotations
+
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING
+
+import pytest
+from prometheus_client import REGISTRY
+
+from app.http_client import HttpClient
+
+if TYPE_CHECKING:
+    from collections.abc import Generator
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        body = self.headers.get("Accept-Encoding", "").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:
+        """Silence request logging."""
+
+
+@pytest.fixture()
+def keep_alive_server() -> Generator[str, None, None]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _sample(name: str, host: str) -> float:
+    return REGISTRY.get_sample_value(name, {"host": host}) or 0.0
+
+
+def test_http_client_reuses_connections(keep_alive_server: str) -> None:
+    client = HttpClient(pool_connections=1, pool_maxsize=1, timeout=5)
+    requests_before = _sample("property24_http_requests_total", "127.0.0.1")
+    opened_before = _sample("property24_http_connections_opened_total", "127.0.0.1")
+
+    try:
+        responses = [client.get(f"{keep_alive_server}/{index}") for index in range(3)]
+    finally:
+        client.close()
+
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert _sample("property24_http_requests_total", "127.0.0.1") - requests_before == 3
+    assert (
+        _sample("property24_http_connections_opened_total", "127.0.0.1") - opened_before
+        == 1
+    )
+
+
+def test_http_client_negotiates_compression(keep_alive_server: str) -> None:
+    client = HttpClient(timeout=5)
+    try:
+        response = client.get(keep_alive_server)
+    finally:
+        client.close()
+
+    assert response.text == "gzip, deflate"
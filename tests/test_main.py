@@ -1,3 +1,346 @@
+"""Tests for the search monitor's poll loop."""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from typing import Sequence
+
+import pytest
+
+from app.config import MonitorSettings
+from app.main import PROPERTY_COUNTER_URL, SearchMonitor, flush_digests
+from app.notifications import NotificationChannel, NotificationDispatcher, Notifier
+from app.property24 import BASE_URL, NEWEST_SORT, SearchPlan
+from app.state import PendingDigest, StateStore
+from app.state_cache import CachedStateStore
+from app.state_memory import MemoryStateStore
+from app.state_sqlite import SQLiteStateStore
+
+PAYLOAD = {
+    "autoCompleteItems": [
+        {"normalizedName": "Stellenbosch", "parentName": "Western Cape", "id": 459}
+    ],
+    "propertyTypes": [4, 5, 6],
+}
+LISTING_PATH = "/to-rent/stellenbosch/western-cape/459"
+
+
+def listing_urls(*numbers: int) -> list[str]:
+    return [f"{BASE_URL}{LISTING_PATH}/{number}" for number in numbers]
+
+
+class FakeResponse:
+    def __init__(self, content: bytes = b"", data: object = None) -> None:
+        self.content = content
+        self.data = data
+        self.status_code = 200
+        self.headers: dict[str, str] = {}
+
+    def json(self) -> object:
+        return self.data
+
+    def raise_for_status(self) -> None:
+        """Pretend the response is successful."""
+
+
+class FakeProperty24:
+    """HTTP client serving one search's count and its listings, newest first.
+
+    All listings are on the first page; later pages are empty.
+    """
+
+    timeout = 10.0
+
+    def __init__(self, *numbers: int) -> None:
+        self.listings = list(numbers)
+        self.page_urls: list[str] = []
+        self.session = self
+
+    def post(self, url: str, **kwargs: object) -> FakeResponse:
+        assert url == PROPERTY_COUNTER_URL
+        return FakeResponse(data={"count": len(self.listings)})
+
+    def get(
+        self, url: str, timeout: float, headers: dict[str, str] | None = None
+    ) -> FakeResponse:
+        self.page_urls.append(url)
+        page = int(url.split("/p")[-1].split("?")[0])
+        numbers = self.listings if page == 1 else []
+        html = "".join(
+            f'<div data-listing-number="{number}"></div>'
+            f'<a href="{LISTING_PATH}/{number}">Listing {number}</a>'
+            for number in numbers
+        )
+        return FakeResponse(html.encode("utf-8"))
+
+
+@pytest.fixture(autouse=True)
+def ntfy_topic(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("NTFY_TOPIC", "listings")
+
+
+@pytest.fixture()
+def digest_window(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("P24_NOTIFICATION_DIGEST_WINDOW", "60")
+    monkeypatch.setenv("P24_NOTIFICATION_DIGEST_MAX_LISTINGS", "3")
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture()
+def site(monkeypatch: pytest.MonkeyPatch) -> FakeProperty24:
+    site = FakeProperty24(1, 2)
+    for module in ("app.main", "app.property24"):
+        monkeypatch.setattr(f"{module}.get_http_client", lambda: site)
+    return site
+
+
+def start_monitor(
+    state_store: StateStore, sent: list[str], *, outbox: bool = False
+) -> SearchMonitor:
+    channel = NotificationChannel(
+        "test", lambda message, timeout: sent.append(message), method="test"
+    )
+    notifier = Notifier(
+        [NotificationDispatcher(channel, outbox=state_store if outbox else None)]
+    )
+    return SearchMonitor(
+        MonitorSettings(),
+        SearchPlan.from_payload(PAYLOAD),
+        state_store,
+        location_name="Stellenbosch",
+        notifier=notifier,
+    )
+
+
+def start_digest_monitor(
+    state_store: StateStore, sent: list[str], clock: FakeClock
+) -> SearchMonitor:
+    monitor = start_monitor(state_store, sent)
+    assert monitor.digest is not None
+    monitor.digest.clock = clock
+    return monitor
+
+
+def seed(state_store: StateStore, numbers: Sequence[int]) -> None:
+    state_store.set_property_count(len(numbers))
+    state_store.replace_current_listings(listing_urls(*numbers))
+
+
 def test_dummy_pass() -> None:
     """Ensure testing harness is wired up."""
     assert 1 + 1 == 2
+
+
+def test_outbox_message_commits_with_its_listings(
+    site: FakeProperty24, monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+) -> None:
+    monkeypatch.setenv("P24_STATE_DURABILITY", "interval")
+    backend = SQLiteStateStore(tmp_path / "state.sqlite3")
+    backend.ensure_file()
+    seed(backend, [1, 2])
+    failures = [sqlite3.OperationalError("disk I/O error")]
+    add_notifications = SQLiteStateStore.add_notifications
+
+    def add_notifications_once_failing(
+        self: SQLiteStateStore, messages: Sequence[str], *, channels: Sequence[str]
+    ) -> None:
+        if failures:
+            raise failures.pop()
+        add_notifications(self, messages, channels=channels)
+
+    monkeypatch.setattr(
+        SQLiteStateStore, "add_notifications", add_notifications_once_failing
+    )
+    sent: list[str] = []
+    # The timer would only flush in an hour; notifying flushes right away.
+    store = CachedStateStore(backend, durability="interval", flush_interval=3600)
+    monitor = start_monitor(store, sent, outbox=True)
+    assert monitor.settings.state_durability == "interval"
+
+    site.listings.insert(0, 3)
+    monitor.poll()
+
+    # Storing the message failed, so the listings it announces were not
+    # recorded either and are announced once the flush succeeds.
+    assert backend.get_property_count() == 2
+    assert backend.get_current_listings() == listing_urls(1, 2)
+    assert backend.count_notifications() == 0
+
+    store.flush()
+    assert backend.get_property_count() == 3
+    assert backend.get_current_listings() == listing_urls(3, 1, 2)
+    monitor.notifier.wake()
+
+    site.listings.insert(0, 4)
+    monitor.poll()
+    monitor.notifier.close()
+    assert backend.count_notifications() == 0
+    store.close()
+
+    assert sent == [
+        f"New property added in Stellenbosch. Count: 3\nNew listings:\n"
+        f"{listing_urls(3)[0]}",
+        f"New property added in Stellenbosch. Count: 4\nNew listings:\n"
+        f"{listing_urls(4)[0]}",
+    ]
+
+
+def test_count_increase_crawls_and_notifies(site: FakeProperty24) -> None:
+    store = MemoryStateStore()
+    seed(store, [1, 2])
+    sent: list[str] = []
+    monitor = start_monitor(store, sent)
+
+    site.listings.insert(0, 3)
+    monitor.poll()
+    monitor.notifier.close()
+
+    plan = monitor.plan
+    assert set(site.page_urls) == {plan.page_url(1)}
+    assert store.get_property_count() == 3
+    assert store.get_current_listings() == listing_urls(3, 1, 2)
+    assert sent == [
+        f"New property added in Stellenbosch. Count: 3\nNew listings:\n"
+        f"{listing_urls(3)[0]}"
+    ]
+
+
+def test_delta_mode_only_crawls_the_newest_pages(
+    site: FakeProperty24, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setenv("P24_CRAWL_MODE", "delta")
+    store = MemoryStateStore()
+    seed(store, [1, 2])
+    sent: list[str] = []
+    monitor = start_monitor(store, sent)
+
+    site.listings.insert(0, 3)
+    monitor.poll()
+    monitor.notifier.close()
+
+    # The first page holds the new listing, the empty second one ends the crawl.
+    plan = monitor.plan
+    assert set(site.page_urls) == {
+        plan.page_url(1, NEWEST_SORT),
+        plan.page_url(2, NEWEST_SORT),
+    }
+    assert store.get_current_listings() == listing_urls(3, 1, 2)
+    assert len(sent) == 1
+    assert sent[0].endswith(listing_urls(3)[0])
+
+
+def test_count_decrease_prunes_without_notifying(site: FakeProperty24) -> None:
+    store = MemoryStateStore()
+    seed(store, [1, 2])
+    sent: list[str] = []
+    monitor = start_monitor(store, sent)
+
+    site.listings.remove(2)
+    monitor.poll()
+    monitor.notifier.close()
+
+    assert store.get_property_count() == 1
+    assert store.get_current_listings() == listing_urls(1)
+    assert sent == []
+
+
+@pytest.mark.usefixtures("digest_window")
+def test_digest_closes_after_its_window(site: FakeProperty24) -> None:
+    store = MemoryStateStore()
+    seed(store, [1, 2])
+    sent: list[str] = []
+    clock = FakeClock()
+    monitor = start_digest_monitor(store, sent, clock)
+
+    site.listings.insert(0, 3)
+    monitor.poll()
+    clock.now += 30
+    site.listings.insert(0, 4)
+    monitor.poll()
+    assert store.get_pending_digest() == PendingDigest(4, [3, 4], 2, 1000.0)
+
+    # The window is checked on the next poll, even without a count change.
+    clock.now += 30
+    monitor.poll()
+    monitor.notifier.close()
+
+    assert store.get_pending_digest() is None
+    assert sent == [
+        "New properties added in Stellenbosch over 2 polls. Count: 4\n"
+        "New listings:\n" + "\n".join(listing_urls(3, 4))
+    ]
+
+
+@pytest.mark.usefixtures("digest_window")
+def test_digest_closes_early_at_max_listings(site: FakeProperty24) -> None:
+    store = MemoryStateStore()
+    seed(store, [1, 2])
+    sent: list[str] = []
+    monitor = start_digest_monitor(store, sent, FakeClock())
+
+    site.listings[:0] = [4, 3]
+    monitor.poll()
+    site.listings.insert(0, 5)
+    monitor.poll()
+    monitor.notifier.close()
+
+    assert store.get_pending_digest() is None
+    assert sent == [
+        "New properties added in Stellenbosch over 2 polls. Count: 5\n"
+        "New listings:\n" + "\n".join(listing_urls(4, 3, 5))
+    ]
+
+
+@pytest.mark.usefixtures("digest_window")
+def test_digest_is_sent_on_shutdown(site: FakeProperty24) -> None:
+    store = MemoryStateStore()
+    seed(store, [1, 2])
+    sent: list[str] = []
+    monitor = start_digest_monitor(store, sent, FakeClock())
+
+    site.listings.insert(0, 3)
+    monitor.poll()
+    assert sent == []
+    flush_digests([monitor])
+    monitor.notifier.close()
+
+    assert store.get_pending_digest() is None
+    assert sent == [
+        f"New property added in Stellenbosch. Count: 3\nNew listings:\n"
+        f"{listing_urls(3)[0]}"
+    ]
+
+
+@pytest.mark.usefixtures("digest_window")
+def test_open_digest_survives_a_restart(site: FakeProperty24, tmp_path: Path) -> None:
+    path = tmp_path / "state.sqlite3"
+    sent: list[str] = []
+    clock = FakeClock()
+    with SQLiteStateStore(path) as store:
+        store.ensure_file()
+        seed(store, [1, 2])
+        monitor = start_digest_monitor(store, sent, clock)
+        site.listings.insert(0, 3)
+        monitor.poll()
+        # The process dies without flushing the digest.
+        monitor.notifier.close()
+
+    clock.now += 60
+    with SQLiteStateStore(path) as store:
+        monitor = start_digest_monitor(store, sent, clock)
+        monitor.poll()
+        monitor.notifier.close()
+        assert store.get_pending_digest() is None
+
+    assert sent == [
+        f"New property added in Stellenbosch. Count: 3\nNew listings:\n"
+        f"{listing_urls(3)[0]}"
+    ]
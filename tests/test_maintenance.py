@@ -0,0 +1,43 @@
+from datetime import timedelta
+from pathlib import Path
+
+from helpers import example_urls
+
+from app.maintenance import StateMaintenance, state_file_size
+from app.metrics import state_file_size_bytes, state_history_pruned_total
+from app.state_sqlite import SQLiteStateStore
+
+
+def test_maintenance_prunes_and_vacuums(tmp_path: Path) -> None:
+    path = tmp_path / "state.sqlite3"
+    with SQLiteStateStore(path=path) as store:
+        store.update_current_listings(example_urls(*range(1, 20001)))
+        store.update_current_listings(example_urls(1))
+        store.update_current_listings(example_urls(1))
+        store.compact()
+        size = state_file_size(path)
+        pruned_before = state_history_pruned_total._value.get()
+
+        maintenance = StateMaintenance(
+            store, interval=3600, retention=timedelta(days=-1)
+        )
+        maintenance.run_once()
+
+        assert state_history_pruned_total._value.get() - pruned_before == 19999
+        assert state_file_size(path) < size / 2
+        assert state_file_size_bytes._value.get() == state_file_size(path)
+        assert store.get_current_listings() == example_urls(1)
+
+
+def test_maintenance_without_retention_keeps_history(tmp_path: Path) -> None:
+    with SQLiteStateStore(path=tmp_path / "state.sqlite3") as store:
+        store.update_current_listings(example_urls(1, 2))
+        store.update_current_listings(example_urls(2))
+        store.update_current_listings(example_urls(2))
+
+        maintenance = StateMaintenance(store, interval=0.01, retention=None)
+        maintenance.start()
+        maintenance.stop()
+        maintenance.run_once()
+
+        assert store.get_listing_urls([1]) == example_urls(1)
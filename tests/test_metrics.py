@@ -94,7 +94,9 @@ def test_metrics_contain_expected_metrics(metrics_server: int) -> None:
     property_count_gauge.labels(location="TestLocation").set(42)
     listings_new_total.labels(location="TestLocation").inc(5)
     fetch_errors_total.labels(error_type="test_error").inc(2)
-    notifications_sent_total.labels(method="ntfy", status="success").inc(3)
+    notifications_sent_total.labels(
+        method="ntfy", channel="ntfy-test", status="success"
+    ).inc(3)
     app_info.labels(version="0.1.0", notification_method="ntfy").set(1)
 
     conn = HTTPConnection("localhost", metrics_server)
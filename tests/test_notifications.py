@@ -0,0 +1,368 @@
+"""Tests for the notification channels and dispatchers."""
+
+from __future__ import annotations
+
+import threading
+import time
+from dataclasses import replace
+from datetime import UTC, datetime
+
+import pytest
+import requests
+from prometheus_client import REGISTRY
+
+from app.config import MonitorSettings
+from app.notifications import (
+    NotificationChannel,
+    NotificationDispatcher,
+    Notifier,
+    channel_name,
+    create_channels,
+)
+from app.state_memory import MemoryStateStore
+
+
+class RecordingChannel:
+    """Channel whose sends fail ``failures`` times, then block until released."""
+
+    def __init__(self, name: str, failures: int = 0) -> None:
+        self.name = name
+        self.failures = failures
+        self.sent: list[str] = []
+        self.timeouts: list[float] = []
+        self.release = threading.Event()
+        self.release.set()
+
+    def send(self, message: str, timeout: float) -> None:
+        self.timeouts.append(timeout)
+        if self.failures:
+            self.failures -= 1
+            raise requests.ConnectionError("unreachable")
+        self.release.wait(5)
+        self.sent.append(message)
+
+    def channel(
+        self, retries: int = 3, max_length: int | None = None
+    ) -> NotificationChannel:
+        return NotificationChannel(
+            self.name,
+            self.send,
+            method="test",
+            timeout=2.5,
+            retries=retries,
+            max_length=max_length,
+        )
+
+
+def _sample(name: str, **labels: str) -> float:
+    # Recording channels report the ``test`` method.
+    return REGISTRY.get_sample_value(name, {"method": "test", **labels}) or 0.0
+
+
+def test_submit_does_not_wait_for_delivery() -> None:
+    recorder = RecordingChannel("slow")
+    recorder.release.clear()
+    dispatcher = NotificationDispatcher(recorder.channel(), workers=1)
+
+    started = time.perf_counter()
+    assert dispatcher.submit("first")
+    assert dispatcher.submit("second")
+    assert time.perf_counter() - started < 0.1
+    assert recorder.sent == []
+
+    recorder.release.set()
+    dispatcher.close()
+
+    assert recorder.sent == ["first", "second"]
+    assert recorder.timeouts == [2.5, 2.5]
+    assert (
+        _sample("property24_notification_delivery_seconds_count", channel="slow") == 2
+    )
+
+
+def test_queued_notifications_are_batched() -> None:
+    recorder = RecordingChannel("batched")
+    recorder.release.clear()
+    dispatcher = NotificationDispatcher(recorder.channel(max_length=12), workers=1)
+    dispatcher.submit("first")
+    deadline = time.monotonic() + 5
+    while not recorder.timeouts and time.monotonic() < deadline:
+        time.sleep(0.01)
+    for message in ("a", "b", "c", "too long to merge"):
+        dispatcher.submit(message)
+
+    recorder.release.set()
+    dispatcher.close()
+
+    assert recorder.sent == ["first", "a\n\nb\n\nc", "too long to merge"]
+    assert _sample("property24_notifications_batched_total", channel="batched") == 2
+    assert (
+        _sample(
+            "property24_notifications_sent_total", channel="batched", status="success"
+        )
+        == 5
+    )
+
+
+def test_failed_sends_are_retried() -> None:
+    recorder = RecordingChannel("flaky", failures=2)
+    with NotificationDispatcher(recorder.channel(), retry_backoff=0.01) as dispatcher:
+        dispatcher.submit("hello")
+
+    assert recorder.sent == ["hello"]
+    assert _sample("property24_notification_retries_total", channel="flaky") == 2
+    assert (
+        _sample(
+            "property24_notifications_sent_total", channel="flaky", status="success"
+        )
+        == 1
+    )
+
+
+def test_notification_is_dropped_after_last_retry() -> None:
+    recorder = RecordingChannel("down", failures=10)
+    with NotificationDispatcher(
+        recorder.channel(retries=1), retry_backoff=0.01
+    ) as dispatcher:
+        dispatcher.submit("hello")
+
+    assert recorder.sent == []
+    assert len(recorder.timeouts) == 2
+    assert (
+        _sample(
+            "property24_notifications_dropped_total", channel="down", reason="failed"
+        )
+        == 1
+    )
+
+
+def test_full_queue_drops_new_notifications() -> None:
+    recorder = RecordingChannel("busy")
+    recorder.release.clear()
+    dispatcher = NotificationDispatcher(recorder.channel(), workers=1, max_queue=1)
+    dispatcher.submit("in flight")
+    # Wait for the worker to take the first job off the queue.
+    deadline = time.monotonic() + 5
+    while not recorder.timeouts and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert dispatcher.submit("queued")
+    assert not dispatcher.submit("dropped")
+    assert (
+        _sample(
+            "property24_notifications_dropped_total",
+            channel="busy",
+            reason="queue_full",
+        )
+        == 1
+    )
+
+    recorder.release.set()
+    dispatcher.close()
+    assert recorder.sent == ["in flight", "queued"]
+    assert not dispatcher.submit("late")
+
+
+def test_close_gives_up_after_drain_timeout() -> None:
+    recorder = RecordingChannel("stuck")
+    recorder.release.clear()
+    dispatcher = NotificationDispatcher(recorder.channel(), workers=1)
+    dispatcher.submit("in flight")
+    dispatcher.submit("never sent")
+
+    started = time.perf_counter()
+    dispatcher.close(timeout=0.1)
+
+    assert time.perf_counter() - started < 1
+    recorder.release.set()
+    deadline = time.monotonic() + 5
+    while (
+        not _sample(
+            "property24_notifications_dropped_total", channel="stuck", reason="shutdown"
+        )
+        and time.monotonic() < deadline
+    ):
+        time.sleep(0.01)
+    assert recorder.sent == ["in flight"]
+
+
+def test_outbox_messages_are_sent_and_removed() -> None:
+    store = MemoryStateStore()
+    store.add_notifications(["stored before start"], channels=["outbox"])
+    recorder = RecordingChannel("outbox")
+    with NotificationDispatcher(
+        recorder.channel(), workers=1, outbox=store
+    ) as dispatcher:
+        store.add_notifications(["stored later"], channels=["outbox"])
+        dispatcher.wake()
+
+    assert recorder.sent == ["stored before start", "stored later"]
+    assert store.count_notifications() == 0
+    assert (
+        _sample(
+            "property24_notifications_sent_total", channel="outbox", status="success"
+        )
+        == 2
+    )
+
+
+def test_failed_outbox_send_is_retried_from_the_outbox() -> None:
+    store = MemoryStateStore()
+    store.add_notifications(["hello"], channels=["outbox-flaky"])
+    recorder = RecordingChannel("outbox-flaky", failures=1)
+    with NotificationDispatcher(
+        recorder.channel(), workers=1, outbox=store, retry_backoff=0, poll_interval=0.01
+    ):
+        deadline = time.monotonic() + 5
+        while not recorder.sent and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    assert recorder.sent == ["hello"]
+    assert len(recorder.timeouts) == 2
+    assert store.count_notifications() == 0
+    assert _sample("property24_notification_retries_total", channel="outbox-flaky") == 1
+
+
+def test_failed_outbox_send_waits_for_backoff() -> None:
+    store = MemoryStateStore()
+    store.add_notifications(["hello"], channels=["outbox-down"])
+    recorder = RecordingChannel("outbox-down", failures=1)
+    with NotificationDispatcher(
+        recorder.channel(), workers=1, outbox=store, retry_backoff=60
+    ):
+        pass
+
+    assert recorder.sent == []
+    now = datetime.now(UTC).replace(tzinfo=None)
+    assert store.get_due_notifications(now, channel="outbox-down", limit=1) == []
+    (row,) = store.get_due_notifications(datetime.max, channel="outbox-down", limit=1)
+    assert (row.message, row.attempts) == ("hello", 1)
+    assert (
+        _sample(
+            "property24_notifications_dropped_total",
+            channel="outbox-down",
+            reason="failed",
+        )
+        == 0
+    )
+
+
+def test_notifier_sends_to_channels_concurrently() -> None:
+    first = RecordingChannel("first")
+    second = RecordingChannel("second")
+    for recorder in (first, second):
+        recorder.release.clear()
+    notifier = Notifier(
+        [
+            NotificationDispatcher(first.channel(), workers=1),
+            NotificationDispatcher(second.channel(), workers=1),
+        ]
+    )
+
+    assert notifier.channels == ["first", "second"]
+    assert notifier.submit("hello")
+    # Both channels are sending at once rather than one after the other.
+    deadline = time.monotonic() + 5
+    while not (first.timeouts and second.timeouts) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert first.timeouts and second.timeouts
+
+    for recorder in (first, second):
+        recorder.release.set()
+    notifier.close()
+
+    assert first.sent == second.sent == ["hello"]
+
+
+def test_failing_channel_does_not_hold_back_others() -> None:
+    down = RecordingChannel("fanout-down", failures=10)
+    up = RecordingChannel("fanout-up")
+    store = MemoryStateStore()
+    with Notifier(
+        [
+            NotificationDispatcher(down.channel(), outbox=store, retry_backoff=60),
+            NotificationDispatcher(up.channel(), outbox=store),
+        ]
+    ) as notifier:
+        store.add_notifications(["hello"], channels=notifier.channels)
+        notifier.wake()
+
+    assert up.sent == ["hello"]
+    assert down.sent == []
+    # Only the failed channel's copy stays in the outbox for a retry.
+    (row,) = store.get_due_notifications(datetime.max, channel="fanout-down", limit=1)
+    assert (row.message, row.attempts) == ("hello", 1)
+    assert store.count_notifications() == 1
+
+
+def test_create_channels_uses_settings(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("P24_NOTIFICATION_METHOD", "Telegram")
+    monkeypatch.setenv("TELEGRAM_TOKEN", "token")
+    monkeypatch.setenv("TELEGRAM_CHAT_ID", "1")
+    monkeypatch.setenv("P24_NOTIFICATION_TIMEOUT", "0.1")
+    monkeypatch.setenv("P24_NOTIFICATION_RETRIES", "-1")
+
+    (channel,) = create_channels(MonitorSettings())
+
+    assert channel.name == channel_name("telegram", "1")
+    assert channel.timeout == 1.0
+    assert channel.retries == 0
+
+
+def test_create_channels_for_each_method_and_target(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.setenv("P24_NOTIFICATION_METHOD", "ntfy, webhook")
+    monkeypatch.setenv("NTFY_TOPIC", "alerts,backup,alerts")
+    monkeypatch.setenv("P24_WEBHOOK_URL", "https://hooks.example.com/secret")
+    monkeypatch.setenv("P24_NOTIFICATION_TIMEOUT", "5")
+    monkeypatch.setenv("P24_WEBHOOK_TIMEOUT", "20")
+
+    channels = create_channels(MonitorSettings())
+
+    assert [channel.name for channel in channels] == [
+        channel_name("ntfy", "https://ntfy.sh/alerts"),
+        channel_name("ntfy", "https://ntfy.sh/backup"),
+        channel_name("webhook", "https://hooks.example.com/secret"),
+    ]
+    assert [channel.timeout for channel in channels] == [5.0, 5.0, 20.0]
+    assert not any("secret" in channel.name for channel in channels)
+
+
+def test_channel_names_follow_their_target(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("NTFY_TOPIC", "alerts,backup")
+    before = {channel.name for channel in create_channels(MonitorSettings())}
+    monkeypatch.setenv("NTFY_TOPIC", "backup")
+    (after,) = create_channels(MonitorSettings())
+
+    assert after.name in before
+    assert after.name == channel_name("ntfy", "https://ntfy.sh/backup")
+    assert after.name.startswith("ntfy-") and len(after.name) == len("ntfy-") + 8
+
+
+def test_metrics_keep_the_method_label(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setenv("NTFY_TOPIC", "metrics")
+    (channel,) = create_channels(MonitorSettings())
+    recorder = RecordingChannel(channel.name)
+    before = _sample(
+        "property24_notifications_sent_total",
+        method="ntfy",
+        channel=channel.name,
+        status="success",
+    )
+
+    with NotificationDispatcher(replace(channel, send=recorder.send)) as dispatcher:
+        dispatcher.submit("hello")
+
+    assert recorder.sent == ["hello"]
+    # Dashboards and alerts select on the plain method name.
+    assert channel.labels == {"method": "ntfy", "channel": channel.name}
+    assert (
+        _sample(
+            "property24_notifications_sent_total",
+            method="ntfy",
+            channel=channel.name,
+            status="success",
+        )
+        == before + 1
+    )
@@ -1,14 +1,33 @@
+import threading
+import time
 from urllib.parse import urlencode
 
 import pytest
 
-from app.property24 import BASE_URL, ListingTracker, fetch_listing_urls
-from app.state import DuckDBStateStore
+from app.http_cache import ResponseCache
+from app.property24 import (
+    BASE_URL,
+    ListingTracker,
+    ListingVerifier,
+    SearchPlan,
+    fetch_listing_urls,
+    fetch_recent_listing_urls,
+    iter_listing_pages,
+)
+from app.state_duckdb import DuckDBStateStore
 
 
 class DummyResponse:
-    def __init__(self, text: str) -> None:
+    def __init__(
+        self,
+        text: str,
+        status_code: int = 200,
+        headers: dict[str, str] | None = None,
+    ) -> None:
         self.text = text
+        self.content = text.encode("utf-8")
+        self.status_code = status_code
+        self.headers = headers or {}
 
     def raise_for_status(self) -> None:  # noqa: D401 - simple stub
         """Pretend the response is successful."""
@@ -39,6 +58,68 @@ class DummySessionWithVariableResponses:
         return DummyResponse(response_text)
 
 
+class DummyPagedSession:
+    """Session that serves a distinct listing per page, slowest page first."""
+
+    def __init__(self, total_pages: int) -> None:
+        self.total_pages = total_pages
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.called_urls: list[str] = []
+
+    def get(self, url: str, timeout: int) -> DummyResponse:
+        page = int(url.split("/p")[-1].split("?")[0])
+        self.called_urls.append(url)
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Earlier pages respond slower so completion order differs from page order.
+        time.sleep(0.01 * (self.total_pages - page + 1))
+        with self.lock:
+            self.in_flight -= 1
+        number = 10000 + page
+        return DummyResponse(
+            f'<div data-listing-number="{number}"></div>'
+            f'<a href="/to-rent/stellenbosch/western-cape/459/{number}">x</a>'
+        )
+
+
+class SlowPagedSession:
+    """Session that serves a distinct listing per page after a fixed delay."""
+
+    def __init__(self, delay: float) -> None:
+        self.delay = delay
+        self.called_urls: list[str] = []
+
+    def get(self, url: str, timeout: int) -> DummyResponse:
+        page = int(url.split("/p")[-1].split("?")[0])
+        self.called_urls.append(url)
+        time.sleep(self.delay)
+        number = 10000 + page
+        return DummyResponse(
+            f'<div data-listing-number="{number}"></div>'
+            f'<a href="/to-rent/stellenbosch/western-cape/459/{number}">x</a>'
+        )
+
+
+class DummyConditionalSession:
+    """Session that honours If-None-Match against a fixed ETag."""
+
+    def __init__(self, response_text: str, etag: str) -> None:
+        self.response_text = response_text
+        self.etag = etag
+        self.request_headers: list[dict[str, str]] = []
+
+    def get(
+        self, url: str, timeout: int, headers: dict[str, str] | None = None
+    ) -> DummyResponse:
+        self.request_headers.append(headers or {})
+        if headers and headers.get("If-None-Match") == self.etag:
+            return DummyResponse("", status_code=304)
+        return DummyResponse(self.response_text, headers={"ETag": self.etag})
+
+
 @pytest.fixture()
 def sample_payload() -> dict[str, object]:
     return {
@@ -122,7 +203,8 @@ def test_listing_tracker_records_new_urls(
     first_urls = ["https://example.com/1", "https://example.com/2"]
     recorded_first = tracker.record(first_urls)
 
-    assert recorded_first == first_urls
+    assert recorded_first == [1, 2]
+    assert tracker.listing_urls(recorded_first) == first_urls
     assert state_store.get_current_listings() == first_urls
     assert state_store.get_new_listings() == first_urls
     assert state_store.get_previous_listings() == []
@@ -130,7 +212,7 @@ def test_listing_tracker_records_new_urls(
     second_urls = ["https://example.com/2", "https://example.com/3"]
     recorded_second = tracker.record(second_urls)
 
-    assert recorded_second == ["https://example.com/3"]
+    assert recorded_second == [3]
     assert state_store.get_current_listings() == second_urls
     assert state_store.get_new_listings() == ["https://example.com/3"]
     assert state_store.get_previous_listings() == first_urls
@@ -166,3 +248,294 @@ def test_fetch_listing_urls_filters_out_dummy_listings(
     assert urls == [
         "https://www.property24.com/to-rent/stellenbosch/western-cape/459/12345",
     ]
+
+
+def test_fetch_listing_urls_concurrent_preserves_page_order(
+    sample_payload: dict[str, object],
+) -> None:
+    session = DummyPagedSession(total_pages=5)
+
+    urls = fetch_listing_urls(
+        sample_payload,
+        count=100,
+        session=session,  # type: ignore[arg-type]
+        max_concurrency=3,
+    )
+
+    assert urls == [
+        f"{BASE_URL}/to-rent/stellenbosch/western-cape/459/{10000 + page}"
+        for page in range(1, 6)
+    ]
+    assert 1 < session.max_in_flight <= 3
+
+
+def test_fetch_recent_listing_urls_stops_at_known_page(
+    sample_payload: dict[str, object],
+) -> None:
+    session = DummyPagedSession(total_pages=5)
+    listing_base = f"{BASE_URL}/to-rent/stellenbosch/western-cape/459"
+
+    urls = fetch_recent_listing_urls(
+        sample_payload,
+        delta=45,
+        known_ids={10002},
+        session=session,  # type: ignore[arg-type]
+    )
+
+    assert urls == [f"{listing_base}/10001", f"{listing_base}/10002"]
+    assert len(session.called_urls) == 4
+    assert all("sp=so%3DNewest" in url for url in session.called_urls)
+
+
+def test_fetch_recent_listing_urls_limits_pages_to_delta(
+    sample_payload: dict[str, object],
+) -> None:
+    session = DummyPagedSession(total_pages=5)
+
+    urls = fetch_recent_listing_urls(
+        sample_payload,
+        delta=1,
+        known_ids=set(),
+        session=session,  # type: ignore[arg-type]
+        margin_pages=1,
+    )
+
+    assert len(urls) == 2
+    assert len(session.called_urls) == 4
+
+
+def test_listing_tracker_record_recent_merges_snapshot(
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    state_path = tmp_path_factory.mktemp("state") / "state.duckdb"
+    state_store = DuckDBStateStore(path=state_path)
+    tracker = ListingTracker(state_store=state_store)
+    tracker.record(["https://example.com/2", "https://example.com/1"])
+
+    recorded = tracker.record_recent(["https://example.com/3", "https://example.com/2"])
+
+    assert recorded == [3]
+    assert state_store.get_current_listings() == [
+        "https://example.com/3",
+        "https://example.com/2",
+        "https://example.com/1",
+    ]
+
+
+def test_fetch_listing_urls_skips_second_fetch_for_stable_pages(
+    sample_payload: dict[str, object],
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    state_path = tmp_path_factory.mktemp("state") / "state.duckdb"
+    state_store = DuckDBStateStore(path=state_path)
+    html = """
+    <div data-listing-number="12345"></div>
+    <a href="/to-rent/stellenbosch/western-cape/459/12345">Listing 12345</a>
+    """
+
+    first_session = DummySession(response_text=html)
+    first_urls = fetch_listing_urls(
+        sample_payload,
+        count=1,
+        session=first_session,  # type: ignore[arg-type]
+        verifier=ListingVerifier(state_store=state_store),
+    )
+    assert len(first_session.called_urls) == 2
+    assert state_store.get_stable_listing_numbers() == {12345}
+
+    second_session = DummySession(response_text=html)
+    second_urls = fetch_listing_urls(
+        sample_payload,
+        count=1,
+        session=second_session,  # type: ignore[arg-type]
+        verifier=ListingVerifier(state_store=state_store),
+    )
+    assert len(second_session.called_urls) == 1
+    assert second_urls == first_urls
+
+
+def test_fetch_listing_urls_verifies_pages_with_unseen_listings(
+    sample_payload: dict[str, object],
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    state_path = tmp_path_factory.mktemp("state") / "state.duckdb"
+    state_store = DuckDBStateStore(path=state_path)
+    state_store.add_stable_listing_numbers([12345])
+    first_response = """
+    <div data-listing-number="12345"></div>
+    <a href="/to-rent/stellenbosch/western-cape/459/12345">Listing 12345</a>
+    <div data-listing-number="99999"></div>
+    <a href="/to-rent/stellenbosch/western-cape/459/99999">Dummy 99999</a>
+    """
+    second_response = """
+    <div data-listing-number="12345"></div>
+    <a href="/to-rent/stellenbosch/western-cape/459/12345">Listing 12345</a>
+    """
+    session = DummySessionWithVariableResponses(
+        responses=[first_response, second_response]
+    )
+
+    urls = fetch_listing_urls(
+        sample_payload,
+        count=2,
+        session=session,  # type: ignore[arg-type]
+        verifier=ListingVerifier(state_store=state_store),
+    )
+
+    assert session.call_count == 2
+    assert urls == [f"{BASE_URL}/to-rent/stellenbosch/western-cape/459/12345"]
+    assert state_store.get_stable_listing_numbers() == {12345}
+
+
+def test_second_fetches_run_concurrently_with_a_verifier(
+    sample_payload: dict[str, object],
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    state_path = tmp_path_factory.mktemp("state") / "state.duckdb"
+    verifier = ListingVerifier(state_store=DuckDBStateStore(path=state_path))
+    session = SlowPagedSession(delay=0.1)
+
+    started = time.perf_counter()
+    urls = fetch_listing_urls(
+        sample_payload,
+        count=200,
+        session=session,  # type: ignore[arg-type]
+        max_concurrency=4,
+        verifier=verifier,
+    )
+    elapsed = time.perf_counter() - started
+
+    # 20 requests over 4 workers take 5 delays; fetching the second copies one
+    # page at a time would take more than 10.
+    assert len(urls) == 10
+    assert len(session.called_urls) == 20
+    assert elapsed < 0.8
+
+
+def test_iter_listing_pages_yields_pages_in_order(
+    sample_payload: dict[str, object],
+) -> None:
+    session = DummyPagedSession(total_pages=3)
+
+    pages = list(
+        iter_listing_pages(
+            sample_payload,
+            count=60,
+            session=session,  # type: ignore[arg-type]
+            max_concurrency=2,
+        )
+    )
+
+    assert [listing_page.page for listing_page in pages] == [1, 2, 3]
+    assert pages[0].numbers == frozenset({10001})
+    assert pages[0].listing_ids == (10001,)
+    assert pages[0].urls == (f"{BASE_URL}/to-rent/stellenbosch/western-cape/459/10001",)
+    assert all(listing_page.requests == 2 for listing_page in pages)
+    assert all(listing_page.elapsed >= 0 for listing_page in pages)
+
+
+def test_iter_listing_pages_stops_fetching_when_closed_early(
+    sample_payload: dict[str, object],
+) -> None:
+    session = DummyPagedSession(total_pages=10)
+
+    pages = iter_listing_pages(
+        sample_payload,
+        count=200,
+        session=session,  # type: ignore[arg-type]
+    )
+    first_page = next(pages)
+    pages.close()
+
+    assert first_page.page == 1
+    assert len(session.called_urls) == 2
+
+
+def test_listing_tracker_record_pages_streams_new_urls(
+    sample_payload: dict[str, object],
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    state_path = tmp_path_factory.mktemp("state") / "state.duckdb"
+    state_store = DuckDBStateStore(path=state_path)
+    tracker = ListingTracker(state_store=state_store)
+    listing_base = f"{BASE_URL}/to-rent/stellenbosch/western-cape/459"
+    tracker.record([f"{listing_base}/10001"])
+
+    session = DummyPagedSession(total_pages=2)
+    pages = iter_listing_pages(
+        sample_payload,
+        count=40,
+        session=session,  # type: ignore[arg-type]
+    )
+    recorded = tracker.record_pages(pages)
+
+    first_page, first_new = next(recorded)
+    assert first_page.page == 1
+    assert first_new == []
+    assert state_store.get_current_listings() == [f"{listing_base}/10001"]
+
+    remaining = list(recorded)
+    assert [new_ids for _, new_ids in remaining] == [[10002]]
+    assert state_store.get_current_listings() == [
+        f"{listing_base}/10001",
+        f"{listing_base}/10002",
+    ]
+
+
+def test_search_plan_builds_page_urls(sample_payload: dict[str, object]) -> None:
+    plan = SearchPlan.from_payload(sample_payload)
+
+    assert plan.categories == "House,ApartmentOrFlat,Townhouse"
+    assert plan.page_url(3) == (
+        f"{BASE_URL}/to-rent/stellenbosch/western-cape/459"
+        "/p3?PropertyCategory=House%2CApartmentOrFlat%2CTownhouse"
+    )
+    assert plan.page_url(1, sort="Newest") == (
+        f"{BASE_URL}/to-rent/stellenbosch/western-cape/459"
+        "/p1?sp=so%3DNewest&PropertyCategory=House%2CApartmentOrFlat%2CTownhouse"
+    )
+
+
+def test_search_plan_adds_page_parameter_for_advanced_search() -> None:
+    plan = SearchPlan.from_payload({"autoCompleteItems": [{"id": 1}, {"id": 2}]})
+
+    assert plan.page_url(1) == (
+        f"{BASE_URL}/to-rent/advanced-search/results?{urlencode([('sp', 's=1,2')])}"
+    )
+    assert plan.page_url(2) == f"{plan.page_url(1)}&Page=2"
+
+
+def test_search_plan_rejects_invalid_payload() -> None:
+    with pytest.raises(RuntimeError, match="autoCompleteItems"):
+        SearchPlan.from_payload({"propertyTypes": [4]})
+
+
+def test_fetch_listing_urls_reuses_unchanged_cached_pages(
+    sample_payload: dict[str, object],
+    tmp_path_factory: pytest.TempPathFactory,
+) -> None:
+    cache = ResponseCache(tmp_path_factory.mktemp("cache"))
+    html = """
+    <div data-listing-number="12345"></div>
+    <a href="/to-rent/stellenbosch/western-cape/459/12345">Listing 12345</a>
+    """
+    session = DummyConditionalSession(response_text=html, etag='"v1"')
+
+    first_urls = fetch_listing_urls(
+        sample_payload,
+        count=1,
+        session=session,  # type: ignore[arg-type]
+        cache=cache,
+    )
+    second_urls = fetch_listing_urls(
+        sample_payload,
+        count=1,
+        session=session,  # type: ignore[arg-type]
+        cache=cache,
+    )
+
+    assert first_urls == second_urls
+    assert first_urls == [f"{BASE_URL}/to-rent/stellenbosch/western-cape/459/12345"]
+    # First crawl: plain request plus verification copy. Second crawl: a single
+    # conditional request answered with 304 and no verification copy.
+    assert session.request_headers == [{}, {}, {"If-None-Match": '"v1"'}]
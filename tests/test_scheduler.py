@@ -0,0 +1,69 @@
+import threading
+import time
+
+from app.scheduler import SearchScheduler
+
+
+def test_scheduler_runs_jobs_by_due_time() -> None:
+    scheduler = SearchScheduler(max_workers=1)
+    calls: list[str] = []
+    done = threading.Event()
+
+    def job(name: str) -> None:
+        calls.append(name)
+        if "slow" in calls and calls.count("fast") >= 3:
+            scheduler.stop()
+            done.set()
+
+    scheduler.add("slow", lambda: job("slow"), interval=60, delay=0.05)
+    scheduler.add("fast", lambda: job("fast"), interval=0.01)
+
+    runner = threading.Thread(target=scheduler.run)
+    runner.start()
+    assert done.wait(timeout=5)
+    runner.join(timeout=5)
+
+    assert calls[0] == "fast"
+    assert "slow" in calls
+    assert calls.count("slow") == 1
+
+
+def test_scheduler_survives_failing_jobs() -> None:
+    scheduler = SearchScheduler(max_workers=2)
+    calls: list[str] = []
+
+    def failing() -> None:
+        calls.append("failing")
+        raise RuntimeError("boom")
+
+    scheduler.add("failing", failing, interval=0.01)
+    scheduler.add("ok", lambda: calls.append("ok"), interval=0.01)
+
+    runner = threading.Thread(target=scheduler.run)
+    runner.start()
+    time.sleep(0.2)
+    scheduler.stop()
+    runner.join(timeout=5)
+
+    assert not runner.is_alive()
+    assert calls.count("failing") > 1
+    assert calls.count("ok") > 1
+
+
+def test_scheduler_run_once_runs_every_job() -> None:
+    scheduler = SearchScheduler(max_workers=3)
+    calls: list[str] = []
+    lock = threading.Lock()
+
+    for name in ("a", "b", "c", "d"):
+
+        def job(name: str = name) -> None:
+            with lock:
+                calls.append(name)
+
+        scheduler.add(name, job, interval=60)
+
+    scheduler.run_once()
+
+    assert sorted(calls) == ["a", "b", "c", "d"]
+    assert len(scheduler) == 4
@@ -0,0 +1,54 @@
+import json
+from pathlib import Path
+
+import pytest
+
+from app.searches import load_searches
+
+PAYLOAD = {
+    "propertyTypes": [4],
+    "autoCompleteItems": [{"id": 9238, "name": "Stellenbosch", "type": 2}],
+}
+
+
+def test_load_searches_from_directory(tmp_path: Path) -> None:
+    (tmp_path / "b-plain.json").write_text(json.dumps(PAYLOAD))
+    (tmp_path / "a-wrapped.json").write_text(
+        json.dumps(
+            {
+                "id": "stellenbosch",
+                "location_name": "Stellenbosch",
+                "poll_interval": 120,
+                "payload": PAYLOAD,
+            }
+        )
+    )
+    (tmp_path / "notes.txt").write_text("ignored")
+
+    searches = load_searches(tmp_path, default_poll_interval=60)
+
+    assert [search.search_id for search in searches] == ["stellenbosch", "b-plain"]
+    assert searches[0].location_name == "Stellenbosch"
+    assert searches[0].poll_interval == 120
+    assert searches[1].location_name == "b-plain"
+    assert searches[1].poll_interval == 60
+    assert searches[1].plan.payload == PAYLOAD
+
+
+def test_load_searches_rejects_duplicate_ids(tmp_path: Path) -> None:
+    first = tmp_path / "one.json"
+    second = tmp_path / "two.json"
+    first.write_text(json.dumps({"id": "same", "payload": PAYLOAD}))
+    second.write_text(json.dumps({"id": "same", "payload": PAYLOAD}))
+
+    with pytest.raises(RuntimeError, match="Duplicate search id"):
+        load_searches(f"{first},{second}", default_poll_interval=60)
+
+
+def test_load_searches_clamps_poll_interval(tmp_path: Path) -> None:
+    path = tmp_path / "fast.json"
+    path.write_text(json.dumps({"poll_interval": 1, "payload": PAYLOAD}))
+
+    (search,) = load_searches(path, default_poll_interval=60)
+
+    assert search.poll_interval == 10
@@ -1,5 +1,10 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime
 from pathlib import Path
 
+import duckdb
+import pytest
+
 from app.state import DuckDBStateStore
 
 
@@ -31,3 +36,228 @@ def test_state_store_updates_listings(tmp_path: Path) -> None:
     assert store.get_current_listings() == second_urls
     assert store.get_previous_listings() == first_urls
     assert store.get_new_listings() == ["https://example.com/3"]
+
+
+def test_state_store_scopes_rows_by_search(tmp_path: Path) -> None:
+    store = DuckDBStateStore(path=tmp_path / "state.duckdb")
+    north = store.for_search("north")
+    south = store.for_search("south")
+
+    store.set_property_count(1)
+    north.set_property_count(2)
+    south.set_property_count(3)
+    north.update_current_listings(["https://example.com/north/101"])
+    south.update_current_listings(["https://example.com/south/102"])
+
+    assert store.get_property_count() == 1
+    assert north.get_property_count() == 2
+    assert south.get_property_count() == 3
+    assert store.get_current_listings() == []
+    assert north.get_current_listings() == ["https://example.com/north/101"]
+    assert south.get_current_listings() == ["https://example.com/south/102"]
+
+
+def test_state_store_shares_connection_across_threads(tmp_path: Path) -> None:
+    with DuckDBStateStore(path=tmp_path / "state.duckdb") as store:
+        stores = [store.for_search(f"search-{index}") for index in range(8)]
+
+        def poll(scoped: DuckDBStateStore) -> None:
+            for count in range(5):
+                scoped.set_property_count(count)
+                scoped.update_current_listings([f"https://example.com/{count}"])
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(poll, stores))
+
+        assert [scoped.get_property_count() for scoped in stores] == [4] * 8
+        assert stores[0].get_current_listings() == ["https://example.com/4"]
+
+    with pytest.raises(RuntimeError, match="closed"):
+        stores[0].get_property_count()
+
+
+def test_state_store_bulk_snapshot_round_trip(tmp_path: Path) -> None:
+    store = DuckDBStateStore(path=tmp_path / "state.duckdb")
+    urls = [f"https://example.com/{index}" for index in range(5000)]
+    urls.append('https://example.com/quote"é\\path/5001')
+
+    assert store.update_current_listings(urls) == urls
+    assert store.update_current_listings(urls[1:]) == []
+
+    assert store.get_current_listings() == urls[1:]
+    assert store.get_previous_listings() == urls
+    assert store.get_new_listings() == []
+
+
+def test_state_store_migrates_keyed_listings_table(tmp_path: Path) -> None:
+    state_path = tmp_path / "state.duckdb"
+    connection = duckdb.connect(str(state_path))
+    connection.execute(
+        """
+        CREATE TABLE listings (
+            snapshot TEXT,
+            position INTEGER,
+            url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (snapshot, position)
+        )
+        """
+    )
+    connection.execute(
+        "CREATE INDEX listings_snapshot_position_idx ON listings (snapshot, position)"
+    )
+    connection.execute(
+        "INSERT INTO listings (snapshot, position, url) VALUES "
+        "('current', 0, 'https://example.com/1'), "
+        "('current', 1, 'https://example.com/2')"
+    )
+    connection.close()
+
+    with DuckDBStateStore(path=state_path) as store:
+        assert store.get_current_listings() == [
+            "https://example.com/1",
+            "https://example.com/2",
+        ]
+        assert store.update_current_listings(["https://example.com/3"]) == [
+            "https://example.com/3"
+        ]
+
+
+def test_state_store_diffs_snapshots(tmp_path: Path) -> None:
+    store = DuckDBStateStore(path=tmp_path / "state.duckdb")
+    store.update_current_listings(["https://example.com/1", "https://example.com/2"])
+
+    diff = store.replace_current_listings(
+        ["https://example.com/3", "https://example.com/2", "https://example.com/4"]
+    )
+
+    assert diff.added == [3, 4]
+    assert diff.removed == [1]
+    assert diff.retained == [2]
+    assert store.get_new_listings() == store.get_listing_urls(diff.added)
+
+
+def test_state_store_keeps_listing_history(tmp_path: Path) -> None:
+    store = DuckDBStateStore(path=tmp_path / "state.duckdb")
+    a, b, c = (f"https://example.com/{number}" for number in (1, 2, 3))
+
+    store.update_current_listings([a, b])
+    store.update_current_listings([c, a])  # b removed, a moved, c added
+    assert store.get_previous_listings() == [a, b]
+    assert store.get_current_listings() == [c, a]
+    assert store.get_new_listings() == [c]
+
+    diff = store.replace_current_listings([b, c, a])  # b returns
+    assert diff.added == [2]
+    assert diff.retained == [3, 1]
+    assert store.get_previous_listings() == [c, a]
+
+    with store._cursor() as cursor:
+        rows = cursor.execute(
+            "SELECT listing_id, added_poll, removed_poll, removed_at IS NULL, "
+            "first_seen <= last_seen FROM listing_history ORDER BY listing_id"
+        ).fetchall()
+    assert rows == [
+        (1, 1, None, True, True),
+        (2, 3, None, True, True),
+        (3, 2, None, True, True),
+    ]
+
+
+def test_state_store_keys_listings_by_number(tmp_path: Path) -> None:
+    store = DuckDBStateStore(path=tmp_path / "state.duckdb")
+    store.update_current_listings(
+        ["https://example.com/a/30", "https://example.com/b/10/"]
+    )
+
+    assert store.get_current_listing_ids() == {10, 30}
+    assert store.get_listing_urls([10, 30, 99]) == [
+        "https://example.com/b/10/",
+        "https://example.com/a/30",
+    ]
+    with pytest.raises(ValueError, match="no listing number"):
+        store.update_current_listings(["https://example.com/no-number"])
+
+
+def test_state_store_streams_snapshot_in_batches(tmp_path: Path) -> None:
+    store = DuckDBStateStore(path=tmp_path / "state.duckdb")
+    urls = [f"https://example.com/{number}" for number in range(1, 2501)]
+    store.update_current_listings(urls)
+
+    streamed = store.iterate_snapshot("current", batch_size=1000)
+    assert next(streamed) == urls[0]
+    assert [urls[0], *streamed] == urls
+    assert list(store.iterate_snapshot("new", batch_size=7)) == urls
+    with pytest.raises(ValueError):
+        list(store.iterate_snapshot("current", batch_size=0))
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "csv"])
+def test_state_store_exports_snapshots_and_history(
+    tmp_path: Path, file_format: str
+) -> None:
+    store = DuckDBStateStore(path=tmp_path / "state.duckdb")
+    store.update_current_listings(["https://example.com/1", "https://example.com/2"])
+    store.update_current_listings(["https://example.com/2", "https://example.com/3"])
+
+    current = tmp_path / "export" / f"current.{file_format}"
+    history = tmp_path / "export" / f"history.{file_format}"
+    store.export("current", current)
+    store.export("history", history)
+
+    reader = duckdb.connect()
+    assert reader.execute(f"SELECT listing_id, url FROM '{current}'").fetchall() == [
+        (2, "https://example.com/2"),
+        (3, "https://example.com/3"),
+    ]
+    assert reader.execute(
+        f"SELECT listing_id, removed_at IS NOT NULL FROM '{history}' "
+        "ORDER BY listing_id"
+    ).fetchall() == [(1, True), (2, False), (3, False)]
+    with pytest.raises(ValueError, match="format"):
+        store.export("current", tmp_path / "current.json")
+    with pytest.raises(ValueError, match="snapshot"):
+        store.export("stable", tmp_path / "stable.csv")
+
+
+def test_state_store_prunes_and_compacts(tmp_path: Path) -> None:
+    path = tmp_path / "state.duckdb"
+    store = DuckDBStateStore(path=path)
+    north = store.for_search("north")
+    padding = "x" * 200
+    north.update_current_listings(
+        [f"https://example.com/{padding}/{number}" for number in range(1, 50001)]
+    )
+    north.update_current_listings(["https://example.com/1"])
+    north.update_current_listings(["https://example.com/1"])
+    store.add_stable_listing_numbers([1, 2])
+    store.ensure_file()
+    size = path.stat().st_size
+
+    pruned = store.prune_history(datetime.now(UTC).replace(tzinfo=None))
+    store.add_stable_listing_numbers([3])
+    store.compact()
+
+    assert pruned == 49999
+    assert path.stat().st_size <= size * 0.75
+    assert north.get_current_listings() == ["https://example.com/1"]
+    assert north.get_listing_urls([1, 2]) == ["https://example.com/1"]
+    assert store.get_stable_listing_numbers() == {1, 3}
+    assert north.update_current_listings(["https://example.com/2"]) == [
+        "https://example.com/2"
+    ]
+    store.close()
+
+
+def test_state_store_rewrite_waits_for_open_cursors(tmp_path: Path) -> None:
+    with DuckDBStateStore(path=tmp_path / "state.duckdb") as store:
+        store.update_current_listings(["https://example.com/1"])
+        streamed = store.iterate_snapshot("current")
+        assert next(streamed) == "https://example.com/1"
+
+        assert not store._database.rewrite(timeout=0.05, min_saving=0)
+
+        assert list(streamed) == []
+        store._database.connection.execute("CHECKPOINT")
+        assert store._database.rewrite(timeout=0.05, min_saving=0)
+        assert store.get_current_listings() == ["https://example.com/1"]
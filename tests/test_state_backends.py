@@ -0,0 +1,331 @@
+"""Behaviour every state backend must share."""
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import UTC, datetime, timedelta
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+from helpers import example_urls
+
+from app.config import MonitorSettings
+from app.state import PendingDigest, StateStore, open_state_store
+from app.state_cache import CachedStateStore
+
+# ``cached`` is the write-behind cache over SQLite, flushed only on close.
+BACKENDS = ("duckdb", "sqlite", "memory", "cached")
+PERSISTENT_BACKENDS = ("duckdb", "sqlite", "cached")
+
+
+def _open(backend: str, path: Path) -> StateStore:
+    if backend == "cached":
+        return CachedStateStore(
+            open_state_store("sqlite", path), durability="interval", flush_interval=3600
+        )
+    return open_state_store(backend, path)
+
+
+@pytest.fixture(params=BACKENDS)
+def store(request: pytest.FixtureRequest, tmp_path: Path) -> Iterator[StateStore]:
+    with _open(request.param, tmp_path / "state.db") as state_store:
+        yield state_store
+
+
+def test_open_state_store_rejects_unknown_backend(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="Unknown state backend"):
+        open_state_store("redis", tmp_path / "state.db")
+
+
+def test_settings_select_backend_and_default_file(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    monkeypatch.chdir(Path(__file__).parent)
+    monkeypatch.setenv("NTFY_TOPIC", "test")
+    monkeypatch.setenv("P24_STATE_BACKEND", "SQLite")
+    assert MonitorSettings().state_backend == "sqlite"
+    assert MonitorSettings().state_file == Path("data/state.sqlite3")
+
+    monkeypatch.setenv("P24_STATE_FILE", "custom.db")
+    assert MonitorSettings().state_file == Path("custom.db")
+
+    monkeypatch.setenv("P24_STATE_BACKEND", "redis")
+    with pytest.raises(ValueError, match="Invalid state backend"):
+        MonitorSettings()
+
+
+@pytest.mark.parametrize("backend", PERSISTENT_BACKENDS)
+def test_state_persists_across_reopen(backend: str, tmp_path: Path) -> None:
+    path = tmp_path / "state.db"
+    with _open(backend, path) as state_store:
+        state_store.ensure_file()
+        state_store.set_property_count(7)
+        state_store.update_current_listings(example_urls(1, 2))
+        state_store.for_search("north").update_current_listings(example_urls(3))
+        state_store.add_stable_listing_numbers([1])
+        state_store.add_seen_listing_ids([1, 2])
+        state_store.set_pending_digest(PendingDigest(7, [2], 1, 1000.0))
+
+    assert path.exists()
+    with _open(backend, path) as reopened:
+        assert reopened.get_property_count() == 7
+        assert reopened.get_current_listings() == example_urls(1, 2)
+        assert reopened.for_search("north").get_current_listings() == example_urls(3)
+        assert reopened.get_stable_listing_numbers() == {1}
+        assert reopened.get_seen_listing_ids([1, 3]) == {1}
+        assert reopened.get_pending_digest() == PendingDigest(7, [2], 1, 1000.0)
+        assert reopened.update_current_listings(example_urls(2, 4)) == example_urls(4)
+
+
+def test_property_count(store: StateStore) -> None:
+    assert store.get_property_count() == 0
+    store.set_property_count(5)
+    assert store.get_property_count() == 5
+
+
+def test_pending_digest(store: StateStore) -> None:
+    digest = PendingDigest(12, [3, 1], 2, 1000.5)
+    assert store.get_pending_digest() is None
+
+    store.set_pending_digest(digest)
+    assert store.get_pending_digest() == digest
+    assert store.for_search("north").get_pending_digest() is None
+
+    store.set_pending_digest(None)
+    assert store.get_pending_digest() is None
+
+
+def test_snapshots_follow_polls(store: StateStore) -> None:
+    assert store.get_current_listings() == []
+    assert store.update_current_listings(example_urls(1, 2)) == example_urls(1, 2)
+    assert store.get_previous_listings() == []
+    assert store.get_new_listings() == example_urls(1, 2)
+
+    assert store.update_current_listings(example_urls(2, 3)) == example_urls(3)
+    assert store.get_current_listings() == example_urls(2, 3)
+    assert store.get_previous_listings() == example_urls(1, 2)
+    assert store.get_new_listings() == example_urls(3)
+    assert store.get_current_listing_ids() == {2, 3}
+
+
+def test_diff_is_ordered_by_position(store: StateStore) -> None:
+    store.replace_current_listings(example_urls(1, 2, 3))
+    diff = store.replace_current_listings(example_urls(5, 3, 4, 1))
+
+    assert diff.added == [5, 4]
+    assert diff.removed == [2]
+    assert diff.retained == [3, 1]
+    assert store.get_previous_listings() == example_urls(1, 2, 3)
+    assert store.get_current_listings() == example_urls(5, 3, 4, 1)
+
+
+def test_returning_listing_is_new_again(store: StateStore) -> None:
+    store.replace_current_listings(example_urls(1, 2))
+    store.replace_current_listings(example_urls(2))
+    store.replace_current_listings(example_urls(2))
+
+    diff = store.replace_current_listings(example_urls(1, 2))
+    assert diff.added == [1]
+    assert store.get_new_listings() == example_urls(1)
+    assert store.get_previous_listings() == example_urls(2)
+
+
+def test_duplicate_listing_keeps_first_position(store: StateStore) -> None:
+    urls = [*example_urls(1, 2), "https://example.com/other/1"]
+
+    assert store.replace_current_listings(urls).added == [1, 2]
+    assert store.get_current_listings() == example_urls(1, 2)
+
+
+def test_listing_urls_keep_requested_order(store: StateStore) -> None:
+    store.update_current_listings(example_urls(10, 20, 30))
+
+    assert store.get_listing_urls([30, 10, 99]) == example_urls(30, 10)
+    assert store.get_listing_urls([]) == []
+
+
+def test_url_without_number_is_rejected(store: StateStore) -> None:
+    store.update_current_listings(example_urls(1))
+
+    with pytest.raises(ValueError, match="no listing number"):
+        store.update_current_listings(["https://example.com/listing/new"])
+    assert store.get_current_listings() == example_urls(1)
+    assert store.get_new_listings() == example_urls(1)
+
+
+def test_unknown_snapshot_is_rejected(store: StateStore) -> None:
+    with pytest.raises(ValueError, match="Unknown listing snapshot"):
+        list(store.iterate_snapshot("stable"))
+
+
+def test_iterate_snapshot_streams_all_rows(store: StateStore) -> None:
+    urls = example_urls(*range(1, 2501))
+    store.update_current_listings(urls)
+
+    assert list(store.iterate_snapshot("current", batch_size=1000)) == urls
+    assert list(store.iterate_snapshot("new", batch_size=7)) == urls
+    with pytest.raises(ValueError):
+        list(store.iterate_snapshot("current", batch_size=0))
+
+
+def test_searches_are_isolated(store: StateStore) -> None:
+    north = store.for_search("north")
+    south = store.for_search("south")
+    north.set_property_count(3)
+    north.update_current_listings(example_urls(1))
+    south.update_current_listings(example_urls(1, 2))
+
+    assert store.get_property_count() == 0
+    assert store.get_current_listings() == []
+    assert north.get_property_count() == 3
+    assert north.get_current_listings() == example_urls(1)
+    assert south.get_current_listings() == example_urls(1, 2)
+    assert south.get_new_listings() == example_urls(1, 2)
+
+
+def test_concurrent_searches(store: StateStore) -> None:
+    def poll(search_id: str) -> list[str]:
+        search = store.for_search(search_id)
+        for start in range(5):
+            search.update_current_listings(example_urls(*range(start, start + 20)))
+        return search.get_current_listings()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        results = list(pool.map(poll, [f"search-{n}" for n in range(4)]))
+
+    assert results == [example_urls(*range(4, 24))] * 4
+
+
+def test_stable_listing_numbers(store: StateStore) -> None:
+    store.add_stable_listing_numbers([])
+    store.add_stable_listing_numbers([3, 1])
+    store.add_stable_listing_numbers([1, 2])
+
+    assert store.get_stable_listing_numbers() == {1, 2, 3}
+    assert store.for_search("north").get_stable_listing_numbers() == {1, 2, 3}
+
+
+def test_seen_listing_ids(store: StateStore) -> None:
+    north = store.for_search("north")
+    store.add_seen_listing_ids([])
+    store.add_seen_listing_ids([3, 1, 3])
+    store.add_seen_listing_ids([1, 2])
+    north.add_seen_listing_ids([9])
+
+    assert sorted(store.iterate_seen_listing_ids(batch_size=2)) == [1, 2, 3]
+    assert store.get_seen_listing_ids([2, 5, 9]) == {2}
+    assert store.get_seen_listing_ids([]) == set()
+    assert north.get_seen_listing_ids([1, 9]) == {9}
+
+
+def test_seen_listing_ids_survive_pruning(store: StateStore) -> None:
+    store.update_current_listings(example_urls(1, 2))
+    store.add_seen_listing_ids([1, 2])
+    store.update_current_listings(example_urls(2))
+    store.update_current_listings(example_urls(2))
+
+    store.prune_history(datetime.now(UTC).replace(tzinfo=None) + timedelta(days=1))
+
+    assert store.get_seen_listing_ids([1, 2]) == {1, 2}
+
+
+def test_notification_outbox(store: StateStore) -> None:
+    now = datetime.now(UTC).replace(tzinfo=None) + timedelta(seconds=1)
+    store.add_notifications([], channels=["ntfy"])
+    store.add_notifications(["first", "second\nline"], channels=["ntfy"])
+    store.for_search("north").add_notifications(["third"], channels=["ntfy"])
+    store.flush()
+
+    first, second, third = store.get_due_notifications(now, channel="ntfy", limit=10)
+    assert [first.message, second.message, third.message] == [
+        "first",
+        "second\nline",
+        "third",
+    ]
+    assert first.id < second.id < third.id
+    assert store.get_due_notifications(now, channel="ntfy", limit=1) == [first]
+    assert store.count_notifications() == 3
+
+    store.retry_notifications([first.id], now + timedelta(minutes=1))
+    store.complete_notifications([second.id])
+
+    assert store.get_due_notifications(now, channel="ntfy", limit=10) == [third]
+    (retried,) = store.get_due_notifications(
+        now + timedelta(minutes=1), channel="ntfy", limit=1
+    )
+    assert (retried.id, retried.attempts) == (first.id, 1)
+    assert store.count_notifications() == 2
+
+
+def test_notification_outbox_per_channel(store: StateStore) -> None:
+    now = datetime.now(UTC).replace(tzinfo=None) + timedelta(seconds=1)
+    store.add_notifications(["hello"], channels=["ntfy", "webhook"])
+    store.flush()
+
+    (ntfy,) = store.get_due_notifications(now, channel="ntfy", limit=10)
+    (webhook,) = store.get_due_notifications(now, channel="webhook", limit=10)
+    assert ntfy.message == webhook.message == "hello"
+
+    store.complete_notifications([ntfy.id])
+
+    assert store.get_due_notifications(now, channel="ntfy", limit=10) == []
+    assert store.get_due_notifications(now, channel="webhook", limit=10) == [webhook]
+    assert store.prune_notifications(["ntfy", "telegram"]) == 1
+    assert store.count_notifications() == 0
+
+
+@pytest.mark.parametrize("backend", ("duckdb", "sqlite"))
+def test_atomic_rolls_back_every_write(backend: str, tmp_path: Path) -> None:
+    with open_state_store(backend, tmp_path / "state.db") as store:
+        with pytest.raises(RuntimeError), store.atomic():
+            store.set_property_count(5)
+            store.update_current_listings(example_urls(1))
+            store.for_search("north").add_notifications(["lost"], channels=["ntfy"])
+            raise RuntimeError("crashed mid-poll")
+
+        assert store.get_property_count() == 0
+        assert store.get_current_listings() == []
+        assert store.count_notifications() == 0
+
+        with store.atomic():
+            store.update_current_listings(example_urls(1))
+            store.add_notifications(["kept"], channels=["ntfy"])
+
+        assert store.get_current_listings() == example_urls(1)
+        assert store.count_notifications() == 1
+
+
+def test_reset_clears_everything(store: StateStore) -> None:
+    store.set_property_count(4)
+    store.update_current_listings(example_urls(1))
+    store.add_stable_listing_numbers([1])
+    store.add_seen_listing_ids([1])
+    store.add_notifications(["sent"], channels=["ntfy"])
+
+    store.reset()
+
+    assert store.get_property_count() == 0
+    assert store.get_current_listings() == []
+    assert store.get_stable_listing_numbers() == set()
+    assert store.get_seen_listing_ids([1]) == set()
+    assert store.count_notifications() == 0
+    assert store.update_current_listings(example_urls(1)) == example_urls(1)
+
+
+def test_closed_store_raises(store: StateStore) -> None:
+    store.close()
+
+    with pytest.raises(RuntimeError, match="closed"):
+        store.get_property_count()
+
+
+def test_prune_history_keeps_snapshots(store: StateStore) -> None:
+    store.update_current_listings(example_urls(1, 2))
+    store.update_current_listings(example_urls(2, 3))
+    store.update_current_listings(example_urls(3, 4))
+
+    store.prune_history(datetime.now(UTC).replace(tzinfo=None) + timedelta(days=1))
+    store.compact()
+
+    assert store.get_current_listings() == example_urls(3, 4)
+    assert store.get_previous_listings() == example_urls(2, 3)
+    assert store.update_current_listings(example_urls(1, 3, 4)) == example_urls(1)
@@ -0,0 +1,170 @@
+from datetime import datetime
+from pathlib import Path
+from typing import Sequence
+
+import pytest
+from helpers import example_urls
+
+from app.state import ListingDiff
+from app.state_cache import CachedStateStore
+from app.state_sqlite import SQLiteStateStore
+
+
+class FlakyStore(SQLiteStateStore):
+    """Store whose next snapshot write fails once."""
+
+    fail_next = False
+
+    def replace_current_listings(self, urls: Sequence[str]) -> ListingDiff:
+        if FlakyStore.fail_next:
+            FlakyStore.fail_next = False
+            raise OSError("disk unavailable")
+        return super().replace_current_listings(urls)
+
+    def for_search(self, search_id: str | None) -> "FlakyStore":
+        return FlakyStore(path=self.path, search_id=search_id, _database=self._database)
+
+
+def _cached(
+    backend: SQLiteStateStore, durability: str = "interval"
+) -> CachedStateStore:
+    return CachedStateStore(backend, durability=durability, flush_interval=3600)
+
+
+def test_writes_stay_in_memory_until_flushed(tmp_path: Path) -> None:
+    backend = SQLiteStateStore(path=tmp_path / "state.db")
+    store = _cached(backend)
+
+    store.set_property_count(3)
+    store.update_current_listings(example_urls(1, 2))
+    store.update_current_listings(example_urls(2, 3))
+    store.add_stable_listing_numbers([2])
+
+    assert store.get_current_listings() == example_urls(2, 3)
+    assert store.get_previous_listings() == example_urls(1, 2)
+    assert backend.get_property_count() == 0
+    assert backend.get_current_listings() == []
+
+    store.flush()
+
+    # Only the latest snapshot reaches the backend.
+    assert backend.get_property_count() == 3
+    assert backend.get_current_listings() == example_urls(2, 3)
+    assert backend.get_previous_listings() == []
+    assert backend.get_stable_listing_numbers() == {2}
+    store.close()
+
+
+def test_always_durability_writes_through(tmp_path: Path) -> None:
+    backend = SQLiteStateStore(path=tmp_path / "state.db")
+    store = _cached(backend, durability="always")
+
+    store.for_search("north").update_current_listings(example_urls(1))
+
+    assert backend.for_search("north").get_current_listings() == example_urls(1)
+    store.close()
+
+
+def test_close_flushes_and_reopen_loads_state(tmp_path: Path) -> None:
+    path = tmp_path / "state.db"
+    with _cached(SQLiteStateStore(path=path)) as store:
+        store.set_property_count(2)
+        store.update_current_listings(example_urls(1, 2))
+        store.update_current_listings(example_urls(2, 3))
+
+    with _cached(SQLiteStateStore(path=path)) as store:
+        assert store.get_property_count() == 2
+        assert store.get_current_listing_ids() == {2, 3}
+        # The two polls were coalesced into one snapshot.
+        assert store.get_previous_listings() == []
+        assert store.get_new_listings() == example_urls(2, 3)
+        assert store.update_current_listings(example_urls(3, 4)) == example_urls(4)
+
+    with _cached(SQLiteStateStore(path=path)) as store:
+        assert store.get_previous_listings() == example_urls(2, 3)
+        assert store.get_new_listings() == example_urls(4)
+
+
+def test_listing_urls_fall_back_to_backend(tmp_path: Path) -> None:
+    backend = SQLiteStateStore(path=tmp_path / "state.db")
+    for urls in (example_urls(1, 2), example_urls(2), example_urls(2)):
+        backend.update_current_listings(urls)
+
+    with _cached(backend) as store:
+        store.update_current_listings(example_urls(2, 5))
+
+        assert store.get_listing_urls([5, 1, 2]) == example_urls(5, 1, 2)
+
+
+def test_prune_history_forgets_mirrored_urls(tmp_path: Path) -> None:
+    backend = SQLiteStateStore(path=tmp_path / "state.db")
+    with _cached(backend) as store:
+        for numbers in ((1, 2), (2, 3), (3,)):
+            store.update_current_listings(example_urls(*numbers))
+
+        store.prune_history(datetime.min)
+
+        assert store._cache.memory._database.urls.keys() == {2, 3}
+        assert store.get_previous_listings() == example_urls(2, 3)
+
+
+def test_failed_flush_keeps_writes(tmp_path: Path) -> None:
+    backend = FlakyStore(path=tmp_path / "state.db")
+    store = _cached(backend)
+    store.update_current_listings(example_urls(1))
+
+    FlakyStore.fail_next = True
+    with pytest.raises(OSError):
+        store.flush()
+    store.update_current_listings(example_urls(1, 2))
+    store.set_property_count(2)
+    store.flush()
+
+    assert backend.get_current_listings() == example_urls(1, 2)
+    assert backend.get_property_count() == 2
+    store.close()
+
+
+def test_failed_flush_writes_nothing_of_the_search(tmp_path: Path) -> None:
+    backend = FlakyStore(path=tmp_path / "state.db")
+    store = _cached(backend)
+    store.set_property_count(1)
+    store.update_current_listings(example_urls(1))
+    store.add_notifications(["New listing"], channels=["ntfy"])
+
+    FlakyStore.fail_next = True
+    with pytest.raises(OSError):
+        store.flush()
+
+    assert backend.get_property_count() == 0
+    assert backend.count_notifications() == 0
+    store.flush()
+    assert backend.get_current_listings() == example_urls(1)
+    assert backend.count_notifications() == 1
+    store.close()
+
+
+def test_atomic_holds_writes_back_from_flushes(tmp_path: Path) -> None:
+    backend = SQLiteStateStore(path=tmp_path / "state.db")
+    store = _cached(backend)
+    north = store.for_search("north")
+
+    with store.atomic():
+        store.update_current_listings(example_urls(1))
+        north.set_property_count(4)
+        store.flush()
+
+        assert backend.for_search("north").get_property_count() == 4
+        assert backend.get_current_listings() == []
+        store.add_notifications(["New listing"], channels=["ntfy"])
+
+    store.flush()
+    assert backend.get_current_listings() == example_urls(1)
+    (row,) = store.get_due_notifications(datetime.max, channel="ntfy", limit=10)
+    assert row.message == "New listing"
+    store.close()
+
+
+def test_rejects_unknown_durability(tmp_path: Path) -> None:
+    with pytest.raises(ValueError, match="durability"):
+        _cached(SQLiteStateStore(path=tmp_path / "state.db"), durability="never")
@@ -0,0 +1,127 @@
+"""Tests for the rate-limited Telegram client."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+import requests
+from prometheus_client import REGISTRY
+
+from app.rate_limit import TokenBucket
+from app.telegram import TelegramClient, send_message, split_message
+
+
+class FakeClock:
+    def __init__(self) -> None:
+        self.now = 0.0
+        self.sleeps: list[float] = []
+
+    def __call__(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class FakeClient:
+    """HTTP client answering with queued ``(status, body)`` responses."""
+
+    timeout = 15.0
+
+    def __init__(self, *responses: tuple[int, dict[str, object]]) -> None:
+        self.responses = list(responses)
+        self.requests: list[dict[str, object]] = []
+
+    def post(self, url: str, **kwargs: object) -> requests.Response:
+        self.requests.append(kwargs)
+        status, body = self.responses.pop(0) if self.responses else (200, {})
+        response = requests.Response()
+        response.status_code = status
+        response.url = url
+        response._content = json.dumps(body).encode("utf-8")
+        return response
+
+    def texts(self) -> list[str]:
+        return [
+            json.loads(str(request["data"], "utf-8"))["text"]
+            for request in self.requests
+            if isinstance(request["data"], bytes)
+        ]
+
+
+def test_token_bucket_spaces_out_requests() -> None:
+    clock = FakeClock()
+    bucket = TokenBucket(2.0, capacity=2, clock=clock, sleep=clock.sleep)
+
+    waits = [bucket.acquire() for _ in range(4)]
+
+    assert waits == [0.0, 0.0, 0.5, 0.5]
+    bucket.pause(3)
+    assert bucket.acquire() == 3.0
+
+
+def test_split_message_keeps_lines_together() -> None:
+    assert split_message("short") == ["short"]
+
+    lines = [f"https://example.com/listing/{number}" for number in range(300)]
+    chunks = split_message("\n".join(lines), limit=1000)
+
+    assert all(len(chunk) <= 1000 for chunk in chunks)
+    assert "\n".join(chunks).splitlines() == lines
+    assert split_message("x" * 25, limit=10) == ["x" * 10, "x" * 10, "x" * 5]
+
+
+def test_client_retries_after_rate_limit() -> None:
+    client = FakeClient(
+        (429, {"ok": False, "parameters": {"retry_after": 0.05}}), (200, {"ok": True})
+    )
+    telegram = TelegramClient("token", client=client)  # type: ignore[arg-type]
+    limited_before = (
+        REGISTRY.get_sample_value("property24_telegram_rate_limited_total") or 0
+    )
+
+    telegram.send_message("1", "hello", timeout=3.0)
+
+    assert client.texts() == ["hello", "hello"]
+    assert client.requests[0]["timeout"] == 3.0
+    assert REGISTRY.get_sample_value("property24_telegram_rate_limited_total") == (
+        limited_before + 1
+    )
+
+
+def test_client_gives_up_when_still_rate_limited() -> None:
+    limited = (429, {"ok": False, "parameters": {"retry_after": 0.01}})
+    client = FakeClient(limited, limited)
+    telegram = TelegramClient("token", client=client, max_retries=1)  # type: ignore[arg-type]
+
+    with pytest.raises(requests.HTTPError):
+        telegram.send_message("1", "hello")
+    assert len(client.requests) == 2
+
+
+def test_groups_and_channels_get_the_group_rate() -> None:
+    telegram = TelegramClient("token", chat_rate=1.0, group_rate=0.5)
+
+    assert telegram._chat_bucket("12345").rate == 1.0
+    assert telegram._chat_bucket("-100123").rate == 0.5
+    assert telegram._chat_bucket("@listings").rate == 0.5
+
+
+def test_client_splits_long_messages() -> None:
+    client = FakeClient()
+    telegram = TelegramClient("token", client=client, chat_rate=1000)  # type: ignore[arg-type]
+
+    telegram.send_message("1", "\n".join(["x" * 3000] * 3))
+
+    assert [len(text) for text in client.texts()] == [3000, 3000, 3000]
+
+
+def test_send_message_raises_on_error() -> None:
+    client = FakeClient((502, {"ok": False}))
+
+    with pytest.raises(requests.HTTPError):
+        send_message("token", "1", "hi", client=client, timeout=3.0)  # type: ignore[arg-type]
+
+    assert client.requests[0]["timeout"] == 3.0
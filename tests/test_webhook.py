@@ -0,0 +1,49 @@
+"""Tests for the generic webhook channel."""
+
+from __future__ import annotations
+
+import json
+
+import pytest
+import requests
+
+from app.webhook import send_message
+
+
+class FakeClient:
+    """HTTP client answering every request with ``status``."""
+
+    timeout = 15.0
+
+    def __init__(self, status: int = 200) -> None:
+        self.status = status
+        self.requests: list[tuple[str, dict[str, object]]] = []
+
+    def post(self, url: str, **kwargs: object) -> requests.Response:
+        self.requests.append((url, kwargs))
+        response = requests.Response()
+        response.status_code = self.status
+        response.url = url
+        return response
+
+
+def test_send_message_posts_json_text() -> None:
+    client = FakeClient()
+
+    send_message("https://hooks.example.com/abc", "New listing", client=client)  # type: ignore[arg-type]
+
+    ((url, request),) = client.requests
+    assert url == "https://hooks.example.com/abc"
+    assert isinstance(request["data"], bytes)
+    assert json.loads(request["data"]) == {"text": "New listing"}
+    assert request["headers"] == {"Content-Type": "application/json"}
+    assert request["timeout"] == 15.0
+
+
+def test_send_message_raises_when_rejected() -> None:
+    client = FakeClient(status=500)
+
+    with pytest.raises(requests.HTTPError):
+        send_message("https://hooks.example.com/abc", "hi", client=client, timeout=3)  # type: ignore[arg-type]
+
+    assert client.requests[0][1]["timeout"] == 3